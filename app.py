@@ -10,16 +10,73 @@ import time
 import streamlit as st
 from dotenv import load_dotenv
 
-from lib.parser import parse_file
+from lib.cache import InsightCache, ParseCache
+from lib.checkpoint import CheckpointStore
+from lib.parser import parse_files
+from lib.pipeline import ParsePipeline
+from lib.planner import plan_run
+from lib.scheduler import RequestScheduler
 from lib.synthesizer import Synthesizer, SynthesisError
 from lib.output import generate_markdown_report
 from components.upload import render_upload_section
 from components.outcomes import render_outcomes_input
-from components.progress import create_progress_container
+from components.plan import render_run_plan
+from components.progress import create_progress_container, create_insight_callback
 from components.results import render_results
 from components.visualizations import render_visualization_section
 
 
+@st.cache_resource
+def get_insight_cache() -> InsightCache:
+    """One Level 2 insight cache per server process, shared by all sessions."""
+    return InsightCache()
+
+
+@st.cache_resource
+def get_parse_cache() -> ParseCache:
+    """Parsed uploads shared by all sessions, so unchanged files skip parsing."""
+    return ParseCache()
+
+
+@st.cache_resource
+def get_scheduler() -> RequestScheduler:
+    """One rate-limit budget for every session sharing this server's API key."""
+    return RequestScheduler()
+
+
+@st.cache_resource
+def get_checkpoint_store() -> CheckpointStore:
+    """Run checkpoints, so a failed synthesis can resume where it stopped."""
+    return CheckpointStore()
+
+
+def _warn_parse_errors(parse_errors: list[str]):
+    if parse_errors:
+        st.warning(
+            f"Could not parse {len(parse_errors)} file(s):\n"
+            + "\n".join(f"- {err}" for err in parse_errors)
+        )
+
+
+def _estimate_run(uploaded_files: dict[str, list]):
+    """Parse the uploads and store a pre-flight RunPlan for them in session state."""
+    report = parse_files(uploaded_files, cache=get_parse_cache())
+    # Rewind so the synthesis run can read the uploads again
+    for files in uploaded_files.values():
+        for uploaded_file in files:
+            uploaded_file.seek(0)
+    _warn_parse_errors(report.errors)
+    st.session_state["run_plan"] = (
+        _upload_signature(uploaded_files), plan_run(report.sources, insight_cache=get_insight_cache())
+    )
+
+
+def _upload_signature(uploaded_files: dict[str, list]) -> tuple:
+    return tuple(
+        (category, f.name, f.size) for category, files in uploaded_files.items() for f in files
+    )
+
+
 def main():
     st.set_page_config(
         page_title="Product Insight Synthesizer",
@@ -75,39 +132,39 @@ def main():
         )
         st.stop()
 
-    if st.button("🔍 Synthesize Insights", type="primary", use_container_width=True):
-        # Parse all uploaded files
-        sources = []
-        parse_errors = []
-
-        for category, files in uploaded_files.items():
-            for i, uploaded_file in enumerate(files):
-                try:
-                    source = parse_file(uploaded_file, category, i)
-                    sources.append(source)
-                except Exception as e:
-                    parse_errors.append(f"{uploaded_file.name}: {e}")
-
-        if parse_errors:
-            st.warning(
-                f"Could not parse {len(parse_errors)} file(s):\n"
-                + "\n".join(f"- {err}" for err in parse_errors)
-            )
+    if st.button("🧮 Estimate Cost and Time", use_container_width=True):
+        with st.spinner("Parsing uploads and planning the run..."):
+            _estimate_run(uploaded_files)
+    saved_plan = st.session_state.get("run_plan")
+    if saved_plan and saved_plan[0] == _upload_signature(uploaded_files):
+        render_run_plan(saved_plan[1])
 
-        if not sources:
-            st.error("No files could be parsed. Please check your uploads.")
-            st.stop()
+    if st.button("🔍 Synthesize Insights", type="primary", use_container_width=True):
+        # Parse uploads on a background thread; Level 2 starts on the first
+        # parsed sources while later files are still being extracted.
+        pipeline = ParsePipeline(uploaded_files, parse_cache=get_parse_cache()).start()
 
         # Run synthesis
         st.divider()
         _, progress_bar, status_container, progress_callback = create_progress_container()
+        insight_callback = create_insight_callback(progress_bar, status_container)
 
-        synthesizer = Synthesizer(api_key)
+        synthesizer = Synthesizer(
+            api_key,
+            insight_cache=get_insight_cache(),
+            checkpoints=get_checkpoint_store(),
+            scheduler=get_scheduler(),
+        )
         start_time = time.time()
 
         try:
-            result = synthesizer.run(sources, desired_outcomes, progress_callback)
+            result = synthesizer.run(
+                pipeline, desired_outcomes, progress_callback, insight_callback,
+                resume_run_id=st.session_state.get("failed_run_id"),
+            )
             result.processing_time_seconds = time.time() - start_time
+            result.stage_stats["parse"] = pipeline.stats()
+            sources = pipeline.sources
 
             # Generate markdown report
             markdown_report = generate_markdown_report(result, sources)
@@ -117,14 +174,29 @@ def main():
             st.session_state["result"] = result
             st.session_state["markdown_report"] = markdown_report
             st.session_state["sources"] = sources
+            st.session_state.pop("failed_run_id", None)
 
         except SynthesisError as e:
+            _warn_parse_errors(pipeline.errors)
+            if not pipeline.sources:
+                st.error("No files could be parsed. Please check your uploads.")
+                st.stop()
+            st.session_state["failed_run_id"] = synthesizer.run_id
             st.error(f"Synthesis failed: {e}")
-            st.caption("Try with fewer sources or check your API key.")
+            st.caption(
+                "Completed steps were saved — click Synthesize again to resume "
+                "from where this run stopped. Otherwise, try with fewer sources "
+                "or check your API key."
+            )
             st.stop()
         except Exception as e:
+            st.session_state["failed_run_id"] = synthesizer.run_id
             st.error(f"An unexpected error occurred: {e}")
             st.stop()
+        finally:
+            pipeline.close()
+
+        _warn_parse_errors(pipeline.errors)
 
     # ---- Display Results (persisted in session state) ----
     if "result" in st.session_state:
@@ -0,0 +1,112 @@
+"""Benchmark Level 3 pre-clustering of Level 2 insight items.
+
+Generates synthetic Level 2 insights whose items are drawn from a fixed
+number of themes (reworded a little per source, over a Zipfian
+vocabulary), clusters them with cluster_insights, and compares the Level 3
+prompt with and without clustering: groups, chars, estimated tokens, and
+the time to cluster and encode. With clustering the prompt should grow
+with the number of themes rather than the number of sources.
+
+Usage:
+    python benchmarks/bench_insight_clustering.py [--sources 100 1000 5000]
+                                                  [--themes 300]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import INPUT_CATEGORIES  # noqa: E402
+from lib.clustering import cluster_insights  # noqa: E402
+from lib.models import ExtractedInsight  # noqa: E402
+from lib.tokens import TokenEstimator  # noqa: E402
+from lib.xml_builder import build_insights_xml, build_insight_clusters_xml  # noqa: E402
+
+_VOCABULARY = 6000
+
+
+class ThemeGenerator:
+    """Item texts drawn from a fixed set of themes, lightly reworded."""
+
+    def __init__(self, themes: int, seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.words = np.array([f"w{i}" for i in range(_VOCABULARY)])
+        p = 1 / np.arange(1, _VOCABULARY + 1)
+        self.p = p / p.sum()
+        self.themes = [list(self.rng.choice(self.words, self.rng.integers(8, 15), p=self.p)) for _ in range(themes)]
+
+    def text(self) -> str:
+        words = list(self.themes[self.rng.integers(len(self.themes))])
+        for _ in range(self.rng.integers(0, 3)):
+            words[self.rng.integers(len(words))] = str(self.rng.choice(self.words, p=self.p))
+        return " ".join(words).capitalize()
+
+
+def make_insights(count: int, themes: int, seed: int = 0) -> list[ExtractedInsight]:
+    generator = ThemeGenerator(themes, seed)
+    rng = generator.rng
+    categories = list(INPUT_CATEGORIES)
+    counters = dict.fromkeys(categories, 0)
+    insights = []
+    for _ in range(count):
+        category = categories[rng.integers(len(categories))]
+        source_id = f"{category}_{counters[category]:03d}"
+        counters[category] += 1
+        insights.append(ExtractedInsight(
+            source_id=source_id,
+            category=category,
+            problems=[
+                {"description": generator.text(), "severity": str(rng.choice(["high", "medium", "low"])),
+                 "evidence": generator.text()}
+                for _ in range(rng.integers(1, 5))
+            ],
+            jobs_to_be_done=[generator.text() for _ in range(rng.integers(1, 3))],
+            pain_points=[
+                {"description": generator.text(), "severity": str(rng.choice(["high", "medium", "low"]))}
+                for _ in range(rng.integers(1, 4))
+            ],
+            desired_outcomes=[generator.text() for _ in range(rng.integers(1, 3))],
+            solution_requests=[generator.text() for _ in range(rng.integers(0, 3))],
+        ))
+    return insights
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, nargs="+", default=[100, 1_000, 5_000])
+    parser.add_argument("--themes", type=int, default=300)
+    args = parser.parse_args()
+
+    # Uncalibrated, so runs are comparable across machines
+    estimator = TokenEstimator(path=None)
+    print(f"{'sources':>8}  {'items':>7}  {'groups':>7}  {'cluster ms':>10}  "
+          f"{'xml tokens':>11}  {'clustered':>10}  {'ratio':>6}")
+    for count in args.sources:
+        insights = make_insights(count, args.themes)
+        items = sum(
+            len(i.problems) + len(i.jobs_to_be_done) + len(i.pain_points)
+            + len(i.desired_outcomes) + len(i.solution_requests)
+            for i in insights
+        )
+        clusters, seconds = timed(lambda: cluster_insights(insights))
+        plain = estimator.count(build_insights_xml(insights))
+        clustered = estimator.count(build_insight_clusters_xml(clusters))
+        print(
+            f"{count:>8,}  {items:>7,}  {len(clusters):>7,}  {seconds * 1000:>10.0f}  "
+            f"{plain:>11,}  {clustered:>10,}  {clustered / plain:>6.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
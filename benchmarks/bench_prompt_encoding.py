@@ -0,0 +1,194 @@
+"""Benchmark the compact insight/pattern encoding against the XML one.
+
+Generates synthetic Level 2 insights and Level 3 patterns and compares,
+for each encoding, the prompt size in chars and estimated tokens and the
+time to build it. With --live (needs ANTHROPIC_API_KEY), exact input
+tokens come from the token counting endpoint, and one Level 3 call per
+encoding is timed on a smaller corpus.
+
+Usage:
+    python benchmarks/bench_prompt_encoding.py [--insights 100 1000 5000]
+                                               [--live] [--live-insights 60]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import INPUT_CATEGORIES, MODEL_ID  # noqa: E402
+from lib.models import ExtractedInsight, Pattern, Source  # noqa: E402
+from lib.prompts import LEVEL_3_SYSTEM, LEVEL_3_USER, build_level_3_context  # noqa: E402
+from lib.tokens import TokenEstimator  # noqa: E402
+from lib.xml_builder import (  # noqa: E402
+    SourceIdTable, build_insights_xml, build_insights_compact,
+    build_patterns_xml, build_patterns_compact,
+)
+
+_WORDS = (
+    "report export fleet vehicle compliance emissions mobile offline sync "
+    "dashboard invoice error slow login template state federal audit driver "
+    "manual spreadsheet deadline customer renewal onboarding integration"
+).split()
+
+
+def _sentence(rng, words: int) -> str:
+    return " ".join(rng.choice(_WORDS, words)).capitalize()
+
+
+def make_insights(count: int, seed: int = 0) -> list[ExtractedInsight]:
+    """Insights shaped like real Level 2 output (1-4 items per list)."""
+    rng = np.random.default_rng(seed)
+    categories = list(INPUT_CATEGORIES)
+    counters = dict.fromkeys(categories, 0)
+    insights = []
+    for _ in range(count):
+        category = categories[rng.integers(len(categories))]
+        source_id = f"{category}_{counters[category]:03d}"
+        counters[category] += 1
+        severities = rng.choice(["high", "medium", "low"], 8)
+        insights.append(ExtractedInsight(
+            source_id=source_id,
+            category=category,
+            problems=[
+                {
+                    "description": _sentence(rng, 12),
+                    "severity": str(severities[i]),
+                    "evidence": _sentence(rng, 18),
+                    **({"ticket_count": int(rng.integers(2, 400))} if category == "support_tickets" else {}),
+                }
+                for i in range(rng.integers(1, 5))
+            ],
+            jobs_to_be_done=[
+                f"When {_sentence(rng, 5).lower()}, I want to {_sentence(rng, 5).lower()}, "
+                f"so I can {_sentence(rng, 5).lower()}"
+                for _ in range(rng.integers(1, 3))
+            ],
+            pain_points=[
+                {"description": _sentence(rng, 10), "severity": str(severities[4 + i])}
+                for i in range(rng.integers(1, 4))
+            ],
+            desired_outcomes=[_sentence(rng, 9) for _ in range(rng.integers(1, 3))],
+            solution_requests=[_sentence(rng, 8) for _ in range(rng.integers(0, 3))],
+        ))
+    return insights
+
+
+def make_patterns(insights: list[ExtractedInsight], count: int, seed: int = 0) -> list[Pattern]:
+    """Patterns citing 2-12 of the given insights' sources each."""
+    rng = np.random.default_rng(seed)
+    patterns = []
+    for _ in range(count):
+        cited = rng.choice(len(insights), min(len(insights), rng.integers(2, 13)), replace=False)
+        evidence = [
+            {
+                "source_id": insights[i].source_id,
+                "category": insights[i].category,
+                "weight": INPUT_CATEGORIES[insights[i].category]["weight"],
+                "quote": _sentence(rng, 14),
+            }
+            for i in cited
+        ]
+        breakdown = {}
+        for e in evidence:
+            breakdown[e["category"]] = breakdown.get(e["category"], 0) + 1
+        patterns.append(Pattern(
+            name=_sentence(rng, 4),
+            description=_sentence(rng, 20),
+            frequency=len(evidence),
+            severity=str(rng.choice(["high", "medium", "low"])),
+            weighted_score=sum(e["weight"] for e in evidence),
+            business_impact=_sentence(rng, 12),
+            cross_org_signal=len(breakdown) >= 2,
+            evidence=evidence,
+            source_categories=breakdown,
+        ))
+    return patterns
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def compare_sizes(sizes: list[int], estimator: TokenEstimator):
+    print(f"{'insights':>9}  {'encoding':>9}  {'chars':>11}  {'est. tokens':>12}  {'build ms':>9}  {'tokens':>7}")
+    for count in sizes:
+        insights = make_insights(count)
+        patterns = make_patterns(insights, max(count // 10, 5))
+        for label, encode in (
+            ("xml", lambda: build_insights_xml(insights) + build_patterns_xml(patterns)),
+            ("compact", lambda: (
+                build_insights_compact(insights, ids := SourceIdTable())
+                + build_patterns_compact(patterns, ids)
+            )),
+        ):
+            text, seconds = timed(encode)
+            tokens = estimator.count(text)
+            if label == "xml":
+                baseline = tokens
+            print(
+                f"{count:>9,}  {label:>9}  {len(text):>11,}  {tokens:>12,}  "
+                f"{seconds * 1000:>9.1f}  {tokens / baseline:>6.0%}"
+            )
+
+
+def compare_live(count: int):
+    """Exact input tokens and Level 3 latency per encoding (makes API calls)."""
+    import anthropic
+    from dotenv import load_dotenv
+    from lib.synthesizer import Synthesizer
+
+    load_dotenv()
+    api_key = os.getenv("ANTHROPIC_API_KEY", "")
+    if not api_key:
+        raise SystemExit("--live needs ANTHROPIC_API_KEY")
+    client = anthropic.Anthropic(api_key=api_key)
+
+    insights = make_insights(count, seed=1)
+    sources = [
+        Source(id=i.source_id, filename=f"{i.source_id}.txt", category=i.category,
+               content="", weight=INPUT_CATEGORIES[i.category]["weight"])
+        for i in insights
+    ]
+    category_counts = {}
+    for s in sources:
+        category_counts[s.category] = category_counts.get(s.category, 0) + 1
+
+    print(f"\nLevel 3 on {count} insights ({MODEL_ID})")
+    print(f"{'encoding':>9}  {'input tokens':>13}  {'output tokens':>14}  {'seconds':>8}  {'patterns':>9}")
+    for encoding in ("xml", "compact"):
+        synthesizer = Synthesizer(api_key, prompt_encoding={"level_3": encoding}, precluster=False)
+        context = build_level_3_context(len(sources), category_counts, synthesizer._encode_insights(insights))
+        request = synthesizer._build_request(LEVEL_3_SYSTEM, LEVEL_3_USER, context)
+        request.pop("max_tokens")
+        input_tokens = client.messages.count_tokens(**request).input_tokens
+
+        synthesizer._usage = {"output_tokens": 0}
+        patterns, seconds = timed(lambda: synthesizer._find_patterns(sources, insights, category_counts))
+        print(
+            f"{encoding:>9}  {input_tokens:>13,}  {synthesizer._usage['output_tokens']:>14,}  "
+            f"{seconds:>8.1f}  {len(patterns):>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--insights", type=int, nargs="+", default=[100, 1_000, 5_000])
+    parser.add_argument("--live", action="store_true", help="also count tokens and time Level 3 via the API")
+    parser.add_argument("--live-insights", type=int, default=60)
+    args = parser.parse_args()
+
+    # Uncalibrated, so runs are comparable across machines
+    compare_sizes(args.insights, TokenEstimator(path=None))
+    if args.live:
+        compare_live(args.live_insights)
+
+
+if __name__ == "__main__":
+    main()
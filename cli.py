@@ -0,0 +1,130 @@
+"""Product Insight Synthesizer — headless command-line entry point.
+
+Synthesize a folder tree laid out like sample_data/ (one subfolder per
+input category) or a zip archive of one, without the Streamlit UI:
+
+    python cli.py sample_data --outcome "Reduce churn" --output report.md
+    python cli.py exports.zip --bulk --pdf report.pdf
+    python cli.py exports.zip --plan     # estimate calls, tokens, cost; no API calls
+
+Reads ANTHROPIC_API_KEY from the environment or a .env file.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from config import MAX_DESIRED_OUTCOMES, PARSE_MAX_WORKERS
+from lib.bulk import AnthropicBatchBackend
+from lib.cache import InsightCache
+from lib.checkpoint import CheckpointStore
+from lib.ingest import BulkIngest
+from lib.planner import plan_run
+from lib.synthesizer import Synthesizer, SynthesisError
+from lib.output import generate_markdown_report, generate_pdf_report
+
+
+def _log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Synthesize a folder or zip of product signals.")
+    parser.add_argument("path", help="folder tree or .zip archive (subfolder = input category)")
+    parser.add_argument(
+        "--outcome", action="append", default=[],
+        help=f"desired outcome (repeat up to {MAX_DESIRED_OUTCOMES}x; default: derived by the AI)",
+    )
+    parser.add_argument("--output", default="ost_report.md", help="Markdown report path")
+    parser.add_argument("--pdf", help="also write a PDF report to this path")
+    parser.add_argument(
+        "--bulk", action="store_true",
+        help="run Level 2 as message batch jobs (cheaper, can take hours)",
+    )
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="print the expected calls, tokens, cost and time, then exit without calling the API",
+    )
+    parser.add_argument("--resume", metavar="RUN_ID", help="resume a failed run from its checkpoints")
+    parser.add_argument("--workers", type=int, default=PARSE_MAX_WORKERS, help="parser processes")
+    args = parser.parse_args(argv)
+
+    try:
+        ingest = BulkIngest(args.path, max_workers=args.workers)
+    except ValueError as e:
+        _log(str(e))
+        return 2
+    if args.plan:
+        _print_plan(plan_run(ingest, bulk=args.bulk, insight_cache=InsightCache()))
+        for error in ingest.errors:
+            _log(f"Could not parse {error}")
+        return 0
+
+    load_dotenv()
+    api_key = os.getenv("ANTHROPIC_API_KEY", "")
+    if not api_key:
+        _log("ANTHROPIC_API_KEY is not set (environment or .env).")
+        return 2
+    if len(args.outcome) > MAX_DESIRED_OUTCOMES:
+        _log(f"At most {MAX_DESIRED_OUTCOMES} desired outcomes are supported.")
+        return 2
+
+    synthesizer = Synthesizer(api_key, insight_cache=InsightCache(), checkpoints=CheckpointStore())
+    if args.bulk:
+        synthesizer.bulk_backend = AnthropicBatchBackend(synthesizer.client)
+
+    def progress(stage: str, percent: int):
+        _log(f"[{percent:3d}%] {stage}")
+
+    start_time = time.time()
+    try:
+        result = synthesizer.run(ingest, args.outcome, progress, resume_run_id=args.resume)
+    except SynthesisError as e:
+        for error in ingest.errors:
+            _log(f"Could not parse {error}")
+        _log(f"Synthesis failed: {e}")
+        if synthesizer.run_id:
+            _log(f"Resume with: --resume {synthesizer.run_id}")
+        return 1
+    finally:
+        ingest.close()
+    result.processing_time_seconds = time.time() - start_time
+
+    for error in ingest.errors:
+        _log(f"Could not parse {error}")
+    if ingest.skipped:
+        _log(f"Skipped {len(ingest.skipped)} unsupported file(s).")
+
+    markdown_report = generate_markdown_report(result, ingest.sources)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(markdown_report)
+    _log(f"Wrote {args.output}")
+    if args.pdf:
+        with open(args.pdf, "wb") as f:
+            f.write(generate_pdf_report(markdown_report))
+        _log(f"Wrote {args.pdf}")
+    return 0
+
+
+def _print_plan(plan):
+    print(f"{plan.sources} sources in {plan.batches} Level 2 batches")
+    for name, stage in plan.stages.items():
+        seconds = "?" if stage.seconds is None else f"{stage.seconds:.0f}s"
+        print(
+            f"{name}: {stage.calls} calls, {stage.input_tokens:,} in / {stage.output_tokens:,} out tokens, "
+            f"${stage.cost_usd:.2f}, {seconds}"
+        )
+    seconds = "unknown (bulk)" if plan.seconds is None else f"{plan.seconds:.0f}s"
+    print(
+        f"total: {plan.calls} calls, {plan.input_tokens:,} in / {plan.output_tokens:,} out tokens, "
+        f"${plan.cost_usd:.2f}, {seconds}"
+    )
+    for note in plan.notes:
+        print(note)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Pre-flight run plan display component."""
+
+import streamlit as st
+
+from lib.planner import RunPlan
+
+STAGE_LABELS = {
+    "level_2": "Level 2 — Categorization",
+    "level_3": "Level 3 — Patterns",
+    "level_4": "Level 4 — Opportunities",
+}
+
+
+def render_run_plan(plan: RunPlan):
+    """Render the expected calls, tokens, cost and time of a run."""
+    st.subheader("Run Estimate")
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("API Calls", plan.calls)
+    col2.metric("Input Tokens", f"{plan.input_tokens:,}")
+    col3.metric("Estimated Cost", f"${plan.cost_usd:,.2f}")
+    col4.metric("Estimated Time", format_duration(plan.seconds))
+
+    st.dataframe(
+        [
+            {
+                "Stage": STAGE_LABELS.get(name, name),
+                "Calls": stage.calls,
+                "Input tokens": stage.input_tokens,
+                "Output tokens": stage.output_tokens,
+                "Cost (USD)": round(stage.cost_usd, 2),
+                "Time": format_duration(stage.seconds),
+            }
+            for name, stage in plan.stages.items()
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+    st.caption(
+        f"{plan.sources} sources in {plan.batches} Level 2 batches. "
+        "Estimates are calibrated from the token usage of earlier runs; "
+        "remove or split large files to bring the run down."
+    )
+    for note in plan.notes:
+        st.caption(note)
+
+
+def format_duration(seconds: float | None) -> str:
+    """Format seconds as e.g. "45s" or "3m 20s" ("—" if unknown)."""
+    if seconds is None:
+        return "—"
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
@@ -44,3 +44,17 @@ def create_progress_container():
             status.update(label="Synthesis complete!", state="complete")
 
     return container, progress_bar, status, progress_callback
+
+
+def create_insight_callback(progress_bar, status, start: int = 10, end: int = 40):
+    """Return an insight_callback for Synthesizer.run() that advances the bar.
+
+    Moves the progress bar from start to end percent as Level 2 insights
+    arrive, and shows the running count in the status label.
+    """
+    def insight_callback(insight, done: int, total: int):
+        percent = start + (end - start) * done // max(total, 1)
+        progress_bar.progress(percent / 100)
+        status.update(label=f"Categorized {done}/{total} sources (latest: {insight.source_id})")
+
+    return insight_callback
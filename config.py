@@ -3,6 +3,30 @@
 MODEL_ID = "claude-sonnet-4-5-20250929"
 MAX_TOKENS_OUTPUT = 16384
 
+# Max Claude requests in flight at once (Level 2 batches run in parallel)
+MAX_CONCURRENT_REQUESTS = 4
+
+# Client-side rate budgets shared by all Claude calls. Set these to your
+# organization's limits for MODEL_ID (see the Anthropic console).
+RATE_LIMIT_RPM = 1000
+RATE_LIMIT_INPUT_TPM = 450000
+RATE_LIMIT_OUTPUT_TPM = 90000
+
+# Retries for 429/5xx/529 and network errors (exponential backoff, full jitter)
+RETRY_MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = 1.0   # seconds
+RETRY_MAX_DELAY = 60.0   # seconds
+
+# Offline bulk mode (Message Batches API) polling
+BULK_POLL_INTERVAL = 30.0           # seconds between status checks
+BULK_MAX_WAIT_SECONDS = 24 * 3600   # batches expire after 24 hours
+# Level 2 contexts per bulk job; larger runs are split into several jobs
+# (the service caps a batch at 256 MB, and one job's bodies are held in memory)
+BULK_MAX_JOB_BYTES = 128 * 1024 * 1024
+
+# Stream Level 2 responses and parse each source's insights as soon as it closes
+STREAM_LEVEL_2 = True
+
 # Input categories with display metadata and synthesis weights.
 # Higher weight = more influence on pattern scoring and opportunity ranking.
 INPUT_CATEGORIES = {
@@ -47,11 +71,125 @@ SUPPORTED_EXTENSIONS = ["txt", "docx", "pdf", "csv"]
 
 MAX_DESIRED_OUTCOMES = 3
 
-# Token budget per source (rough: 4 chars ≈ 1 token)
+# Rough chars-per-token ratio for English prose; lib/tokens.py starts from
+# these per-kind ratios and calibrates them against response.usage
+CHARS_PER_TOKEN = 4
+TOKEN_CHARS_PER_TOKEN = {
+    "prose": CHARS_PER_TOKEN,
+    "table": 2.5,       # delimited/aligned rows, IDs, dates
+    "non_latin": 1.5,   # CJK, Cyrillic, Arabic, ...
+}
+TOKEN_CALIBRATION_PATH = ".cache/token_calibration.json"
+TOKEN_CALIBRATION_ALPHA = 0.2  # EWMA weight of each new observation
+
+# Parse cap per uploaded document; longer documents are truncated
+MAX_CHARS_PER_DOCUMENT = 200000  # ~50K tokens
+
+# Token budget per source (rough: 4 chars ≈ 1 token). Documents longer than
+# this are split into overlapping chunk sub-sources of at most this size
+# ("customer_calls_001#2") whose Level 2 insights are merged back afterwards.
 MAX_CHARS_PER_SOURCE = 16000  # ~4000 tokens
+CHUNK_OVERLAP_CHARS = 800
+
+# CSV exports are read CSV_CHUNK_ROWS rows at a time and only the rows that fit
+# MAX_CHARS_PER_DOCUMENT are kept. CSV_ROW_SELECTION picks which rows:
+#   "first"      - rows in file order (stops reading once the budget is met)
+#   "recent"     - newest created_at/date first
+#   "priority"   - highest priority column value first
+#   "stratified" - round-robin across category/status values
+CSV_CHUNK_ROWS = 5000
+CSV_ROW_SELECTION = "first"
+
+# Support-ticket clustering: CSV exports in these categories are read in full
+# and grouped into at most TICKET_CLUSTERS_MAX clusters of similar tickets
+# (hashed TF-IDF + mini-batch k-means); one representative per cluster goes to
+# Level 2 with its cluster size, instead of the rows CSV_ROW_SELECTION picks.
+TICKET_CLUSTER_CATEGORIES = ("support_tickets",)  # () = off
+TICKET_CLUSTERS_MAX = 200
+TICKET_CLUSTER_FEATURES = 4096  # hashed TF-IDF dimensions
+TICKET_KMEANS_ITERATIONS = 50
+TICKET_KMEANS_BATCH = 1024
+
+# Parallel file parsing: uploads are fanned out to a process pool when their
+# combined size reaches PARSE_PARALLEL_MIN_BYTES (smaller sets parse inline,
+# where pool start-up would cost more than it saves).
+PARSE_MAX_WORKERS = None  # None = os.cpu_count()
+PARSE_PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+# Workers are started fresh ("spawn"): the app and CLI run threads (Streamlit,
+# the request pool), and a forked child can inherit a lock another thread held.
+PARSE_START_METHOD = "spawn"
+
+# Near-duplicate sources (re-exported transcripts, duplicate tickets) are
+# collapsed before Level 2: MinHash over DEDUP_SHINGLE_WORDS-word shingles,
+# LSH with DEDUP_BANDS bands, duplicate at estimated Jaccard >= DEDUP_THRESHOLD.
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.8
+DEDUP_NUM_PERM = 128
+DEDUP_BANDS = 32
+DEDUP_SHINGLE_WORDS = 5
+
+# Strip timestamp lines, join/leave notices, repeated speaker labels and
+# blank-line runs from transcripts before Level 2 (utterances are kept verbatim)
+NORMALIZE_TRANSCRIPTS = True
 
 # Total token budget before batching kicks in
 MAX_TOTAL_CHARS = 600000  # ~150K tokens
 
+# Level 2 batch planning. Expected output per source is modelled as
+# BASE + PER_INPUT_TOKEN * input tokens (capped at MAX); a 16K-char transcript
+# comes out around 850 tokens, a one-line ticket around 260. Batches are
+# packed up to HEADROOM of MAX_TOKENS_OUTPUT to leave room for estimate error.
+L2_OUTPUT_TOKENS_BASE = 250
+L2_OUTPUT_TOKENS_PER_INPUT_TOKEN = 0.15
+L2_OUTPUT_TOKENS_MAX = 1500
+L2_OUTPUT_HEADROOM = 0.75
+L2_MAX_BATCH_SOURCES = 50
+
+# Pre-flight run planning (lib/planner.py). Output tokens per Level 3/4 call
+# and generation speed are starting points; both are calibrated from past runs.
+PLAN_OUTPUT_TOKENS_PER_CALL = {"level_3": 6000, "level_4": 8000}
+PLAN_SECONDS_PER_OUTPUT_TOKEN = 0.02
+# USD per million tokens for MODEL_ID; bulk (Message Batches) jobs bill half
+PRICE_PER_MTOK = {"input": 3.00, "output": 15.00}
+BULK_PRICE_FACTOR = 0.5
+# Level 3 insight encoding size relative to plain XML, per prompt encoding
+# (see lib/tokens.level_3_encoding_key). Starting points for planning; runs
+# calibrate them, which is how the savings of pre-clustering are learned.
+PLAN_LEVEL_3_SCALE = {"xml": 1.0, "compact": 0.62, "xml+clustered": 1.0, "compact+clustered": 0.62}
+
+# How insights and patterns are written into each level's prompt: "xml"
+# (tagged, verbose) or "compact" (one-letter tags, short interned source ids,
+# category legend; roughly half the tokens). "level_3" covers shard and
+# merge prompts too.
+PROMPT_ENCODING = {"level_3": "xml", "level_4": "xml"}
+
+# Level 3 pre-clustering: near-identical Level 2 items of the same kind
+# (TF-IDF cosine >= INSIGHT_CLUSTER_THRESHOLD to the first item of a group)
+# are grouped locally, and Level 3 sees one representative per group with
+# its mention count and sources (at most INSIGHT_CLUSTER_LISTED_SOURCES ids,
+# the rest as a count). Patterns that cite a group get evidence from all
+# of its sources.
+INSIGHT_CLUSTERING = True
+INSIGHT_CLUSTER_THRESHOLD = 0.7
+INSIGHT_CLUSTER_LISTED_SOURCES = 20
+
+# Level 3 sharding: when the insights XML exceeds this many chars, patterns are
+# found per shard in parallel and merged in a reduce tree of MERGE_FAN_IN.
+L3_SHARD_MAX_CHARS = 240000  # ~60K tokens
+L3_MERGE_FAN_IN = 4
+
+# Persistent Level 2 insight cache (content-addressed, LRU-evicted by size)
+INSIGHT_CACHE_PATH = ".cache/insights.sqlite3"
+INSIGHT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Persistent cache of parsed uploads (disk LRU plus an in-memory layer)
+PARSE_CACHE_PATH = ".cache/parsed.sqlite3"
+PARSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+PARSE_CACHE_MEMORY_BYTES = 32 * 1024 * 1024
+
+# Per-run checkpoints for resuming failed syntheses
+CHECKPOINT_DIR = ".cache/checkpoints"
+CHECKPOINT_MAX_RUNS = 20
+
 CATEGORY_COLORS = {k: v["color"] for k, v in INPUT_CATEGORIES.items()}
 CATEGORY_LABELS = {k: v["label"] for k, v in INPUT_CATEGORIES.items()}
@@ -0,0 +1,136 @@
+"""Level 2 batch planning: pack sources by estimated token cost."""
+
+from collections.abc import Callable, Iterator, Sequence
+
+from config import (
+    CHARS_PER_TOKEN, MAX_TOKENS_OUTPUT, MAX_TOTAL_CHARS, L3_SHARD_MAX_CHARS,
+    L2_OUTPUT_TOKENS_BASE, L2_OUTPUT_TOKENS_PER_INPUT_TOKEN,
+    L2_OUTPUT_TOKENS_MAX, L2_OUTPUT_HEADROOM, L2_MAX_BATCH_SOURCES,
+)
+from lib.models import Source
+from lib.tokens import TokenEstimator, get_estimator
+from lib.xml_builder import write_xml
+
+# Tokens added around each source's content by iter_sources_xml
+# (<source ...> wrapper, attributes, escaping slack).
+_SOURCE_XML_OVERHEAD_TOKENS = 60
+
+
+def estimate_tokens(text: str, estimator: TokenEstimator | None = None) -> int:
+    """Token count for a piece of text from the (calibrated) estimator."""
+    return (estimator or get_estimator()).count(text)
+
+
+def estimate_input_tokens(source: Source, estimator: TokenEstimator | None = None) -> int:
+    """Approximate tokens this source contributes to a Level 2 prompt."""
+    return estimate_tokens(source.content, estimator) + _SOURCE_XML_OVERHEAD_TOKENS
+
+
+def estimate_output_tokens(source: Source, estimator: TokenEstimator | None = None) -> int:
+    """Approximate Level 2 JSON output tokens for a single source."""
+    estimator = estimator or get_estimator()
+    input_tokens = estimator.count(source.content)
+    estimate = L2_OUTPUT_TOKENS_BASE + L2_OUTPUT_TOKENS_PER_INPUT_TOKEN * input_tokens
+    return estimator.scale_output("level_2", min(estimate, L2_OUTPUT_TOKENS_MAX))
+
+
+class BatchPlanner:
+    """Greedy, order-preserving packer for Level 2 batches.
+
+    Sources are added one at a time; a batch is closed as soon as the next
+    source would push it past the output-token, input-token or source-count
+    limit, or when it is a chunk of a document that already has a chunk in
+    the batch (so a long document's chunks are extracted in parallel).
+    Sources are never reordered, so insights come back in source order. A
+    single source that exceeds a limit on its own still gets a batch of
+    one.
+    """
+
+    def __init__(
+        self,
+        max_output_tokens: int = int(MAX_TOKENS_OUTPUT * L2_OUTPUT_HEADROOM),
+        max_input_tokens: int = MAX_TOTAL_CHARS // CHARS_PER_TOKEN,
+        max_sources: int = L2_MAX_BATCH_SOURCES,
+        estimator: TokenEstimator | None = None,
+    ):
+        self.max_output_tokens = max_output_tokens
+        self.max_input_tokens = max_input_tokens
+        self.max_sources = max_sources
+        self.estimator = estimator or get_estimator()
+        self._batch: list[Source] = []
+        self._parents: set[str] = set()
+        self._output_tokens = 0
+        self._input_tokens = 0
+
+    def add(self, source: Source) -> list[Source] | None:
+        """Add a source; return the previous batch if this source closed it."""
+        output_tokens = estimate_output_tokens(source, self.estimator)
+        input_tokens = estimate_input_tokens(source, self.estimator)
+        parent_id = source.metadata.get("parent_id")
+
+        closed = None
+        if self._batch and (
+            self._output_tokens + output_tokens > self.max_output_tokens
+            or self._input_tokens + input_tokens > self.max_input_tokens
+            or len(self._batch) >= self.max_sources
+            or parent_id in self._parents
+        ):
+            closed = self.flush()
+
+        self._batch.append(source)
+        if parent_id:
+            self._parents.add(parent_id)
+        self._output_tokens += output_tokens
+        self._input_tokens += input_tokens
+        return closed
+
+    def flush(self) -> list[Source] | None:
+        """Close and return the batch in progress, if any."""
+        if not self._batch:
+            return None
+        batch = self._batch
+        self._batch = []
+        self._parents = set()
+        self._output_tokens = 0
+        self._input_tokens = 0
+        return batch
+
+
+def plan_batches(sources: list[Source], **limits) -> list[list[Source]]:
+    """Split sources into Level 2 batches using BatchPlanner."""
+    planner = BatchPlanner(**limits)
+    batches = []
+    for source in sources:
+        closed = planner.add(source)
+        if closed:
+            batches.append(closed)
+    last = planner.flush()
+    if last:
+        batches.append(last)
+    return batches
+
+
+def plan_level_3_shards(
+    items: Sequence,
+    encode: Callable[[Sequence], Iterator[str]],
+    max_chars: int = L3_SHARD_MAX_CHARS,
+) -> list[list]:
+    """Split Level 3 insights (or groups) into shards whose encoding fits max_chars.
+
+    encode writes a list of items as they appear in the prompt; its
+    header (and legend) is counted once per shard. Items are never
+    reordered, and an item larger than max_chars gets a shard of its own.
+    """
+    shards = []
+    wrapper = write_xml(encode([])).chars
+    shard, shard_chars = [], wrapper
+    for item in items:
+        chars = write_xml(encode([item])).chars - wrapper
+        if shard and shard_chars + chars > max_chars:
+            shards.append(shard)
+            shard, shard_chars = [], wrapper
+        shard.append(item)
+        shard_chars += chars
+    if shard:
+        shards.append(shard)
+    return shards
@@ -0,0 +1,58 @@
+"""Offline bulk execution of Level 2 via a message batch service."""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one request in a message batch."""
+    custom_id: str
+    message: object = None      # messages API response when the request succeeded
+    error: str = ""             # why it did not succeed, otherwise
+
+
+class BatchBackend(ABC):
+    """Interface to a message batch service.
+
+    Synthesizer only talks to the batch service through these three
+    methods, so tests can drive bulk mode with a local fake backend.
+    Synthesizer retries each call through its RequestScheduler, so
+    implementations should not retry on their own.
+    """
+
+    @abstractmethod
+    def submit(self, requests: list[dict]) -> str:
+        """Submit requests ({"custom_id": str, "params": dict}); return a batch id."""
+
+    @abstractmethod
+    def is_done(self, batch_id: str) -> bool:
+        """Whether every request in the batch has finished processing."""
+
+    @abstractmethod
+    def results(self, batch_id: str):
+        """Yield a BatchResult for every request in a finished batch."""
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """BatchBackend backed by the Anthropic Message Batches API."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests: list[dict]) -> str:
+        return self.client.messages.batches.create(requests=requests).id
+
+    def is_done(self, batch_id: str) -> bool:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return batch.processing_status == "ended"
+
+    def results(self, batch_id: str):
+        for entry in self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                yield BatchResult(entry.custom_id, message=result.message)
+            elif result.type == "errored":
+                yield BatchResult(entry.custom_id, error=f"errored: {result.error}")
+            else:
+                yield BatchResult(entry.custom_id, error=result.type)
@@ -0,0 +1,261 @@
+"""Persistent content-addressed caches backed by SQLite."""
+
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, replace
+
+from config import (
+    MODEL_ID, INSIGHT_CACHE_PATH, INSIGHT_CACHE_MAX_BYTES, INPUT_CATEGORIES,
+    PARSE_CACHE_PATH, PARSE_CACHE_MAX_BYTES, PARSE_CACHE_MEMORY_BYTES,
+    MAX_CHARS_PER_DOCUMENT, CSV_CHUNK_ROWS, CSV_ROW_SELECTION,
+    TICKET_CLUSTER_CATEGORIES, TICKET_CLUSTERS_MAX, TICKET_CLUSTER_FEATURES,
+    TICKET_KMEANS_ITERATIONS, TICKET_KMEANS_BATCH,
+)
+from lib.models import Source, ExtractedInsight
+from lib.parser import PARSER_VERSION
+from lib.prompts import LEVEL_2_SYSTEM, LEVEL_2_USER, build_level_2_context
+from lib.xml_builder import build_sources_xml
+
+
+def content_hash(*parts) -> str:
+    """Hash an ordered sequence of values into a hex digest.
+
+    Each part is length-prefixed so ("ab", "c") and ("a", "bc") differ.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview, mmap.mmap)):
+            data = part
+        else:
+            data = str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class SqliteLRUCache:
+    """Key/value store of text blobs with size-bounded LRU eviction.
+
+    Safe to share between threads. Hit/miss counters cover the lifetime
+    of this object, not the lifetime of the database file.
+
+    With memory_max_bytes > 0, recently used values are also kept in an
+    in-process LRU of that size in front of SQLite. Memory hits do not
+    refresh the entry's on-disk access time.
+    """
+
+    def __init__(self, path: str, max_bytes: int, memory_max_bytes: int = 0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        """Return the stored value for key (marking it recently used), or None."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            self._remember(key, row[0], len(row[0].encode("utf-8")))
+            return row[0]
+
+    def put(self, key: str, value: str):
+        """Store value under key, evicting least recently used entries if needed."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+            self._remember(key, value, size)
+
+    def _remember(self, key: str, value: str, size: int):
+        """Keep value in the in-memory LRU, evicting older values to fit."""
+        if size > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous.encode("utf-8"))
+        self._memory[key] = value
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_bytes -= len(dropped.encode("utf-8"))
+
+    def _evict(self):
+        """Drop least recently used entries until the store fits max_bytes."""
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        doomed = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access ASC"
+        ):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+        for (key,) in doomed:
+            value = self._memory.pop(key, None)
+            if value is not None:
+                self._memory_bytes -= len(value.encode("utf-8"))
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and current store size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "memory_bytes": self._memory_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class InsightCache(SqliteLRUCache):
+    """Per-source cache of Level 2 insights.
+
+    Keyed by everything the Level 2 output depends on: the model, the
+    Level 2 prompts and the source as it appears in the Level 2 context
+    (content, category, weight, chunk part), rendered by the same code
+    that builds the request so a change to that format is a miss. Source
+    ids and filenames are blanked out first so an unchanged document is a
+    hit even when a rerun numbers it differently.
+    """
+
+    def __init__(
+        self,
+        path: str = INSIGHT_CACHE_PATH,
+        max_bytes: int = INSIGHT_CACHE_MAX_BYTES,
+    ):
+        super().__init__(path, max_bytes)
+
+    @staticmethod
+    def key_for(source: Source) -> str:
+        context = build_level_2_context(build_sources_xml([replace(source, id="", filename="")]))
+        return content_hash(MODEL_ID, LEVEL_2_SYSTEM, LEVEL_2_USER, context)
+
+    def get_insight(self, source: Source) -> ExtractedInsight | None:
+        """Return the cached insight for source, re-labelled with its current id."""
+        raw = self.get(self.key_for(source))
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return ExtractedInsight(source_id=source.id, category=source.category, **data)
+
+    def put_insight(self, source: Source, insight: ExtractedInsight):
+        data = asdict(insight)
+        data.pop("source_id")
+        data.pop("category")
+        self.put(self.key_for(source), json.dumps(data))
+
+
+class ParseCache(SqliteLRUCache):
+    """Cache of parsed file contents, so unchanged uploads skip parsing.
+
+    Keyed by the file's bytes, extension and category plus PARSER_VERSION
+    and the parser settings that shape the extracted text. Like
+    InsightCache, ids and
+    filenames are not part of the key; a hit is re-labelled with the
+    file's current name and position.
+    """
+
+    def __init__(
+        self,
+        path: str = PARSE_CACHE_PATH,
+        max_bytes: int = PARSE_CACHE_MAX_BYTES,
+        memory_max_bytes: int = PARSE_CACHE_MEMORY_BYTES,
+    ):
+        super().__init__(path, max_bytes, memory_max_bytes)
+
+    @staticmethod
+    def key_for(filename: str, raw_bytes, category: str) -> str:
+        ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+        return content_hash(
+            raw_bytes, ext, category, PARSER_VERSION,
+            MAX_CHARS_PER_DOCUMENT, CSV_CHUNK_ROWS, CSV_ROW_SELECTION,
+            category in TICKET_CLUSTER_CATEGORIES, TICKET_CLUSTERS_MAX, TICKET_CLUSTER_FEATURES,
+            TICKET_KMEANS_ITERATIONS, TICKET_KMEANS_BATCH,
+        )
+
+    def get_source(self, key: str, filename: str, category: str, index: int) -> Source | None:
+        """Return the cached Source for key with the given name and position."""
+        raw = self.get(key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return Source(
+            id=f"{category}_{index:03d}",
+            filename=filename,
+            category=category,
+            content=data["content"],
+            weight=INPUT_CATEGORIES[category]["weight"],
+            metadata=data["metadata"],
+        )
+
+    def put_source(self, key: str, source: Source):
+        """Store a parsed Source; sources whose parser failed are not cached."""
+        if source.metadata.get("parse_error"):
+            return
+        self.put(key, json.dumps({"content": source.content, "metadata": source.metadata}))
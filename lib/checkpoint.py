@@ -0,0 +1,134 @@
+"""Durable per-run checkpoints so a failed synthesis can resume."""
+
+import json
+import os
+import shutil
+import uuid
+from dataclasses import asdict
+
+from config import CHECKPOINT_DIR, CHECKPOINT_MAX_RUNS
+from lib.cache import InsightCache, content_hash
+from lib.models import Source, ExtractedInsight, Pattern
+
+
+def sources_fingerprint(sources: list[Source]) -> str:
+    """Identify a run's input set, independent of source order."""
+    return content_hash(*sorted(InsightCache.key_for(s) for s in sources))
+
+
+class CheckpointStore:
+    """Directory store of completed synthesis steps, one folder per run id.
+
+    Layout::
+
+        <root>/<run_id>/level_2/batch_<hash>.json   one per completed batch
+        <root>/<run_id>/level_2.json                all Level 2 insights
+        <root>/<run_id>/level_3.json                all Level 3 patterns
+
+    Level 2 entries are keyed by the same content hash as InsightCache, so
+    a resumed run reuses a batch only for sources whose content matches.
+    Level-wide checkpoints also record the fingerprint of the full source
+    set and are ignored if the inputs changed. All writes are atomic.
+    """
+
+    def __init__(self, root: str = CHECKPOINT_DIR, max_runs: int = CHECKPOINT_MAX_RUNS):
+        self.root = root
+        self.max_runs = max_runs
+        os.makedirs(root, exist_ok=True)
+
+    # ----- Runs -----
+
+    def new_run_id(self) -> str:
+        """Allocate a run id, pruning the oldest runs beyond max_runs."""
+        self._prune()
+        run_id = uuid.uuid4().hex[:12]
+        os.makedirs(os.path.join(self.root, run_id, "level_2"), exist_ok=True)
+        return run_id
+
+    def has_run(self, run_id: str) -> bool:
+        return bool(run_id) and os.path.isdir(os.path.join(self.root, run_id))
+
+    def has_level(self, run_id: str, level: str) -> bool:
+        """Whether a level-wide checkpoint ("level_2" or "level_3") exists."""
+        return os.path.isfile(os.path.join(self.root, run_id, f"{level}.json"))
+
+    def _prune(self):
+        runs = [
+            os.path.join(self.root, name)
+            for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        ]
+        runs.sort(key=os.path.getmtime)
+        for path in runs[: max(0, len(runs) - self.max_runs + 1)]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    # ----- Level 2 -----
+
+    def save_batch(self, run_id: str, sources: list[Source], insights: list[ExtractedInsight]):
+        """Record the insights of one completed Level 2 batch."""
+        by_id = {s.id: s for s in sources}
+        entries = [
+            {"key": InsightCache.key_for(by_id[i.source_id]), "insight": asdict(i)}
+            for i in insights
+            if i.source_id in by_id
+        ]
+        if not entries:
+            return
+        name = f"batch_{content_hash(*(e['key'] for e in entries))[:16]}.json"
+        self._write(os.path.join(run_id, "level_2", name), entries)
+
+    def load_batches(self, run_id: str) -> dict[str, dict]:
+        """Return content key -> insight dict for every completed batch."""
+        directory = os.path.join(self.root, run_id, "level_2")
+        if not os.path.isdir(directory):
+            return {}
+        completed = {}
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                for entry in self._read(os.path.join(run_id, "level_2", name)) or []:
+                    completed[entry["key"]] = entry["insight"]
+        return completed
+
+    def save_insights(self, run_id: str, fingerprint: str, insights: list[ExtractedInsight]):
+        self._write(
+            os.path.join(run_id, "level_2.json"),
+            {"fingerprint": fingerprint, "insights": [asdict(i) for i in insights]},
+        )
+
+    def load_insights(self, run_id: str, fingerprint: str) -> list[ExtractedInsight] | None:
+        data = self._read(os.path.join(run_id, "level_2.json"))
+        if not data or data.get("fingerprint") != fingerprint:
+            return None
+        return [ExtractedInsight(**i) for i in data["insights"]]
+
+    # ----- Level 3 -----
+
+    def save_patterns(self, run_id: str, fingerprint: str, patterns: list[Pattern]):
+        self._write(
+            os.path.join(run_id, "level_3.json"),
+            {"fingerprint": fingerprint, "patterns": [asdict(p) for p in patterns]},
+        )
+
+    def load_patterns(self, run_id: str, fingerprint: str) -> list[Pattern] | None:
+        data = self._read(os.path.join(run_id, "level_3.json"))
+        if not data or data.get("fingerprint") != fingerprint:
+            return None
+        return [Pattern(**p) for p in data["patterns"]]
+
+    # ----- Helpers -----
+
+    def _write(self, relpath: str, data):
+        path = os.path.join(self.root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _read(self, relpath: str):
+        path = os.path.join(self.root, relpath)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
@@ -0,0 +1,131 @@
+"""Split long sources into overlapping chunks and merge their insights back."""
+
+import re
+
+from config import MAX_CHARS_PER_SOURCE, CHUNK_OVERLAP_CHARS
+from lib.models import Source, ExtractedInsight
+
+# Preferred places to end a chunk, best first
+_BREAKS = ("\n\n", "\n", ". ", " ")
+
+_SEVERITY_RANK = {"high": 0, "medium": 1, "low": 2}
+
+# Chunk ids as made by split_source: "<parent id>#<n>"
+_CHUNK_ID = re.compile(r"(.+)#(\d+)")
+
+
+def split_source(
+    source: Source,
+    chunk_chars: int = MAX_CHARS_PER_SOURCE,
+    overlap_chars: int = CHUNK_OVERLAP_CHARS,
+) -> list[Source]:
+    """Split a source longer than chunk_chars into overlapping sub-sources.
+
+    Chunks end at the last paragraph, line, sentence or word break in
+    their second half, and each chunk repeats the last ~overlap_chars of
+    the previous one so nothing said across a boundary is lost. Chunk ids
+    are "<parent id>#<n>" (1-based); metadata records parent_id, chunk and
+    chunks. Sources that fit are returned unchanged.
+    """
+    text = source.content
+    if len(text) <= chunk_chars:
+        return [source]
+
+    spans = _chunk_spans(text, chunk_chars, min(overlap_chars, chunk_chars // 4))
+    return [
+        Source(
+            id=f"{source.id}#{n}",
+            filename=source.filename,
+            category=source.category,
+            content=text[start:end],
+            weight=source.weight,
+            metadata={**source.metadata, "parent_id": source.id, "chunk": n, "chunks": len(spans)},
+        )
+        for n, (start, end) in enumerate(spans, 1)
+    ]
+
+
+def merge_chunk_insights(insights: list[ExtractedInsight]) -> list[ExtractedInsight]:
+    """Fold chunk insights into one insight per parent source.
+
+    Items repeated across chunks (e.g. from the overlap) are kept once;
+    for problems and pain points the highest severity and the largest
+    ticket_count win (the overlap would double-count a sum). Order follows
+    each parent's first chunk. Only chunk ids ("<parent id>#<n>") are
+    folded; every other insight passes through unchanged, including
+    several insights for the same source.
+    """
+    merged: list[ExtractedInsight] = []
+    parents: dict[str, ExtractedInsight] = {}
+    for insight in insights:
+        match = _CHUNK_ID.fullmatch(insight.source_id)
+        if match is None:
+            merged.append(insight)
+            continue
+        parent_id = match.group(1)
+        target = parents.get(parent_id)
+        if target is None:
+            target = parents[parent_id] = ExtractedInsight(source_id=parent_id, category=insight.category)
+            merged.append(target)
+        _merge_items(target.problems, insight.problems)
+        _merge_items(target.pain_points, insight.pain_points)
+        _merge_strings(target.jobs_to_be_done, insight.jobs_to_be_done)
+        _merge_strings(target.desired_outcomes, insight.desired_outcomes)
+        _merge_strings(target.solution_requests, insight.solution_requests)
+    return merged
+
+
+def _chunk_spans(text: str, chunk_chars: int, overlap_chars: int) -> list[tuple[int, int]]:
+    spans = []
+    start = 0
+    while True:
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            window_start = start + chunk_chars // 2
+            for sep in _BREAKS:
+                cut = text.rfind(sep, window_start, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        spans.append((start, end))
+        if end >= len(text):
+            return spans
+        # Restart overlap_chars back, at a word boundary
+        next_start = max(end - overlap_chars, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+
+
+def _normalize(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def _merge_strings(target: list[str], items: list[str]):
+    known = {_normalize(t) for t in target}
+    for item in items:
+        key = _normalize(item)
+        if key not in known:
+            known.add(key)
+            target.append(item)
+
+
+def _merge_items(target: list[dict], items: list[dict]):
+    known = {_normalize(t.get("description", "")): t for t in target}
+    for item in items:
+        key = _normalize(item.get("description", ""))
+        existing = known.get(key)
+        if existing is None:
+            known[key] = dict(item)
+            target.append(known[key])
+            continue
+        if _SEVERITY_RANK.get(item.get("severity"), 1) < _SEVERITY_RANK.get(existing.get("severity"), 1):
+            existing["severity"] = item["severity"]
+        if _ticket_count(item) > _ticket_count(existing):
+            existing["ticket_count"] = _ticket_count(item)
+
+
+def _ticket_count(item: dict) -> int:
+    try:
+        return int(item.get("ticket_count") or 0)
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,434 @@
+"""Group similar texts locally.
+
+Support tickets: hashed TF-IDF and mini-batch k-means (TicketClusterer).
+Level 2 insight items: TF-IDF leader clustering (cluster_insights).
+"""
+
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+
+from config import (
+    TICKET_CLUSTERS_MAX, TICKET_CLUSTER_FEATURES, TICKET_KMEANS_ITERATIONS, TICKET_KMEANS_BATCH,
+    INSIGHT_CLUSTER_THRESHOLD,
+)
+from lib.models import ExtractedInsight, InsightCluster
+
+_TOKEN_RE = re.compile(r"\w\w+")
+_ASSIGN_BLOCK_ROWS = 4096
+_INIT_SAMPLE_PER_CLUSTER = 10
+
+
+@dataclass
+class TicketCluster:
+    """A group of similar tickets."""
+    representative: int   # position (in add order) of the ticket nearest the centroid
+    size: int             # number of tickets in the cluster
+
+
+class TicketClusterer:
+    """Cluster short texts (e.g. ticket entries) without materializing them all.
+
+    add() only keeps each text's token ids, so memory grows with the token
+    count rather than the text size. fit() turns them into sublinear TF-IDF
+    vectors hashed into ``n_features`` dimensions, built a block of rows at
+    a time, and runs spherical mini-batch k-means (k-means++ seeding on a
+    sample, per-centre learning rates) over them. Everything is seeded, so
+    the same texts always give the same clusters.
+    """
+
+    def __init__(
+        self,
+        max_clusters: int = TICKET_CLUSTERS_MAX,
+        n_features: int = TICKET_CLUSTER_FEATURES,
+        iterations: int = TICKET_KMEANS_ITERATIONS,
+        batch_size: int = TICKET_KMEANS_BATCH,
+        seed: int = 1,
+    ):
+        self.max_clusters = max_clusters
+        self.n_features = n_features
+        self.iterations = iterations
+        self.batch_size = batch_size
+        self.seed = seed
+        self._vocabulary: dict[str, int] = {}
+        self._token_ids: list[np.ndarray] = []
+        self._lengths: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, texts):
+        """Tokenize and store texts; their positions continue from earlier calls."""
+        vocabulary = self._vocabulary
+        for text in texts:
+            ids = [vocabulary.setdefault(t, len(vocabulary)) for t in _TOKEN_RE.findall(str(text).lower())]
+            self._token_ids.append(np.asarray(ids, dtype=np.int64) % self.n_features)
+            self._lengths.append(len(ids))
+
+    def fit(self) -> list[TicketCluster]:
+        """Cluster everything added so far; largest clusters first."""
+        n = len(self)
+        if n == 0:
+            return []
+        self._ids = np.concatenate(self._token_ids)
+        self._lengths_array = np.asarray(self._lengths, dtype=np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(self._lengths_array)[:-1]])
+
+        # Document frequencies of the hashed features, for the IDF weights
+        doc_of = np.repeat(np.arange(n, dtype=np.int64), self._lengths_array)
+        present = np.unique(doc_of * self.n_features + self._ids) % self.n_features
+        df = np.bincount(present, minlength=self.n_features)
+        self._idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+
+        rng = np.random.default_rng(self.seed)
+        centres = self._seed_centres(n, min(self.max_clusters, n), rng)
+        k = len(centres)
+        seen = np.zeros(k, dtype=np.float32)
+        for _ in range(self.iterations):
+            batch = rng.choice(n, size=min(self.batch_size, n), replace=False)
+            x = self._vectors(batch)
+            labels = np.argmax(self._similarity(x, len(batch), centres), axis=1)
+            members = np.bincount(labels, minlength=k).astype(np.float32)
+            rows, features, values = x
+            sums = np.bincount(
+                labels[rows] * self.n_features + features, weights=values, minlength=k * self.n_features,
+            ).reshape(k, self.n_features).astype(np.float32)
+            seen += members
+            hit = members > 0
+            rate = (members[hit] / seen[hit])[:, None]
+            centres[hit] = (1 - rate) * centres[hit] + rate * (sums[hit] / members[hit][:, None])
+            norms = np.linalg.norm(centres, axis=1, keepdims=True)
+            centres /= np.where(norms > 0, norms, 1)
+
+        # Final assignment, one block at a time, tracking the row nearest each centre
+        sizes = np.zeros(k, dtype=np.int64)
+        best_similarity = np.full(k, -np.inf, dtype=np.float32)
+        best_row = np.full(k, -1, dtype=np.int64)
+        for start in range(0, n, _ASSIGN_BLOCK_ROWS):
+            rows = np.arange(start, min(start + _ASSIGN_BLOCK_ROWS, n))
+            similarity = self._similarity(self._vectors(rows), len(rows), centres)
+            labels = np.argmax(similarity, axis=1)
+            nearest = similarity[np.arange(len(rows)), labels]
+            sizes += np.bincount(labels, minlength=k)
+            # Rows sorted by label, best first within a label: the first of each is the candidate
+            order = np.lexsort((-nearest, labels))
+            clusters, first = np.unique(labels[order], return_index=True)
+            candidates = order[first]
+            better = nearest[candidates] > best_similarity[clusters]
+            best_similarity[clusters[better]] = nearest[candidates[better]]
+            best_row[clusters[better]] = rows[candidates[better]]
+
+        found = [TicketCluster(int(best_row[c]), int(sizes[c])) for c in np.flatnonzero(sizes)]
+        found.sort(key=lambda c: (-c.size, c.representative))
+        return found
+
+    def _vectors(self, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sparse unit-length TF-IDF vectors of rows as (row, feature, value), sorted by row."""
+        row_lengths = self._lengths_array[rows]
+        starts = np.repeat(self._offsets[rows] - (np.cumsum(row_lengths) - row_lengths), row_lengths)
+        features = self._ids[starts + np.arange(row_lengths.sum())]
+        row_of = np.repeat(np.arange(len(rows), dtype=np.int64), row_lengths)
+        keys, counts = np.unique(row_of * self.n_features + features, return_counts=True)
+        row_of, features = keys // self.n_features, keys % self.n_features
+        values = np.log1p(counts).astype(np.float32) * self._idf[features]
+        norms = np.sqrt(np.bincount(row_of, weights=values * values, minlength=len(rows)))
+        return row_of, features, values / norms[row_of].astype(np.float32)
+
+    @staticmethod
+    def _similarity(x: tuple, n_rows: int, centres: np.ndarray) -> np.ndarray:
+        """Cosine similarity of sparse rows to unit-length dense centres."""
+        rows, features, values = x
+        if len(centres) == 1:
+            return np.bincount(rows, weights=centres[0, features] * values, minlength=n_rows)[:, None]
+        similarity = np.zeros((n_rows, len(centres)), dtype=np.float32)
+        if len(rows):
+            products = np.ascontiguousarray(centres.T)[features]
+            products *= values[:, None]
+            boundaries = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            similarity[rows[boundaries]] = np.add.reduceat(products, boundaries, axis=0)
+        return similarity
+
+    def _seed_centres(self, n: int, k: int, rng: np.random.Generator) -> np.ndarray:
+        """k-means++ seeding on a random sample of rows."""
+        size = min(n, max(k * _INIT_SAMPLE_PER_CLUSTER, self.batch_size))
+        sample = np.sort(rng.choice(n, size=size, replace=False))
+        x = self._vectors(sample)
+        rows, features, values = x
+        dense = np.zeros((size, self.n_features), dtype=np.float32)
+        dense[rows, features] = values
+
+        chosen = [int(rng.integers(size))]
+        distance = np.maximum(1 - self._similarity(x, size, dense[chosen])[:, 0], 0).astype(np.float64)
+        for _ in range(1, k):
+            total = distance.sum()
+            if total <= 0:
+                # Fewer distinct tickets than clusters: the remaining centres would repeat
+                break
+            chosen.append(int(rng.choice(size, p=distance / total)))
+            distance = np.minimum(distance, np.maximum(1 - self._similarity(x, size, dense[chosen[-1:]])[:, 0], 0))
+        return dense[chosen]
+
+
+# ---------------------------------------------------------------------------
+# Level 2 insight items
+# ---------------------------------------------------------------------------
+
+# ExtractedInsight lists that are clustered, each on its own
+INSIGHT_KINDS = ("problems", "jobs_to_be_done", "pain_points", "desired_outcomes", "solution_requests")
+
+# Group ids are "G1", "G2", ...; category codes for short source ids skip "G"
+GROUP_ID_PREFIX = "G"
+
+_SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+_LEADER_BLOCK_ROWS = 512
+# Candidate pairs generated per step
+_PAIR_BLOCK = 1_000_000
+
+
+def cluster_insights(
+    insights: Sequence[ExtractedInsight],
+    threshold: float = INSIGHT_CLUSTER_THRESHOLD,
+) -> list[InsightCluster]:
+    """Group near-identical items across insights, kind by kind.
+
+    Items are visited in source order; each joins the most similar earlier
+    group leader with TF-IDF cosine >= threshold, or starts a group. The
+    leader is the group's representative; a dict item gets the highest
+    severity and the summed ticket_count of its members. Groups come
+    back per kind (in INSIGHT_KINDS order), most mentioned first.
+    """
+    clusters = []
+    for kind in INSIGHT_KINDS:
+        entries = [(insight, item) for insight in insights for item in getattr(insight, kind)]
+        if not entries:
+            continue
+        leaders = _leader_clusters([_item_text(item) for _, item in entries], threshold)
+        groups: dict[int, list[int]] = {}
+        for position, leader in enumerate(leaders.tolist()):
+            groups.setdefault(leader, []).append(position)
+        found = [_make_cluster(kind, [entries[p] for p in positions]) for positions in groups.values()]
+        found.sort(key=lambda c: -c.mentions)
+        clusters.extend(found)
+    for i, cluster in enumerate(clusters, start=1):
+        cluster.id = f"{GROUP_ID_PREFIX}{i}"
+    return clusters
+
+
+def _item_text(item) -> str:
+    return str(item.get("description", "")) if isinstance(item, dict) else str(item)
+
+
+def _make_cluster(kind: str, entries: list[tuple[ExtractedInsight, object]]) -> InsightCluster:
+    """InsightCluster from (insight, item) pairs, the leader's first."""
+    representative = entries[0][1]
+    if isinstance(representative, dict):
+        items = [item for _, item in entries]
+        representative = dict(representative)
+        representative["severity"] = max(
+            (str(item.get("severity", "medium")) for item in items),
+            key=lambda severity: _SEVERITY_RANK.get(severity, 1),
+        )
+        tickets = sum(_ticket_count(item) for item in items if item.get("ticket_count"))
+        if tickets:
+            representative["ticket_count"] = tickets
+
+    members = {}
+    for insight, item in entries:
+        if insight.source_id not in members:
+            members[insight.source_id] = {
+                "source_id": insight.source_id,
+                "category": insight.category,
+                "text": _item_text(item),
+            }
+        if isinstance(item, dict) and item.get("ticket_count"):
+            member = members[insight.source_id]
+            member["tickets"] = member.get("tickets", 0) + _ticket_count(item)
+            if item.get("evidence"):
+                member.setdefault("quotes", []).append(str(item["evidence"]))
+    return InsightCluster(
+        id="", kind=kind, item=representative, mentions=len(entries), members=list(members.values()),
+    )
+
+
+def _ticket_count(item: dict) -> int:
+    """Tickets an item with a ticket_count stands for (at least 1)."""
+    try:
+        return max(int(item.get("ticket_count") or 1), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _leader_clusters(texts: list[str], threshold: float) -> np.ndarray:
+    """Leader clustering of texts by TF-IDF cosine; returns each text's leader position.
+
+    Rows are processed in blocks. A block is compared with the leaders
+    found so far and with its own earlier rows, and then resolved in
+    order, so the result is the same as visiting the rows one by one.
+    Candidate pairs come from prefix filtering: of each vector, only its
+    rarest features (up to where the remaining ones weigh less than
+    threshold) are indexed, and every pair at or above threshold shares
+    an indexed feature. Candidates are then verified exactly. The work
+    grows with rows times similar leaders, not with all pairs of rows.
+    """
+    n = len(texts)
+    rows, features, values = _tfidf(texts)
+    leaders = np.arange(n)
+    if not len(rows):
+        return leaders
+
+    # Each row's features rarest first; a feature is in the prefix while the
+    # weight from it onwards still reaches the threshold
+    df = np.bincount(features)
+    order = np.lexsort((features, df[features], rows))
+    rows, features, values = rows[order], features[order], values[order]
+    squares = values ** 2
+    cumulative = np.cumsum(squares)
+    row_starts = np.searchsorted(rows, np.arange(n + 1))
+    first = row_starts[rows]
+    before = cumulative - squares - (cumulative[first] - squares[first])
+    in_prefix = 1 - before >= threshold * threshold - 1e-9
+
+    index_rows = np.empty(0, dtype=np.int64)       # prefix entries of the leaders so far
+    index_features = np.empty(0, dtype=np.int64)
+    is_leader = np.ones(n, dtype=bool)
+    column_of = np.empty(int(features.max()) + 1, dtype=np.int64)
+    for block_start in range(0, n, _LEADER_BLOCK_ROWS):
+        block_end = min(block_start + _LEADER_BLOCK_ROWS, n)
+        entries = np.arange(row_starts[block_start], row_starts[block_end])
+        # The block as a dense matrix over its own features, for verifying candidates
+        block_features, columns = np.unique(features[entries], return_inverse=True)
+        dense = np.zeros((block_end - block_start, len(block_features) + 1))   # last column: absent
+        dense[rows[entries] - block_start, columns] = values[entries]
+        column_of[:] = len(block_features)
+        column_of[block_features] = np.arange(len(block_features))
+        similarity_of = partial(
+            _block_similarity, block_start=block_start, dense=dense, column_of=column_of,
+            row_starts=row_starts, features=features, values=values,
+        )
+
+        # Best earlier leader of every row in the block
+        best = np.full(block_end - block_start, -1, dtype=np.int64)
+        best_similarity = np.full(block_end - block_start, -1.0)
+        later, earlier = _candidate_pairs(
+            rows[entries], features[entries], index_rows, index_features, block_start, block_end,
+        )
+        similarity = similarity_of(later, earlier)
+        close = similarity >= threshold
+        later, earlier, similarity = later[close], earlier[close], similarity[close]
+        if len(later):
+            order = np.lexsort((-similarity, later))
+            later, earlier, similarity = later[order], earlier[order], similarity[order]
+            head = np.flatnonzero(np.r_[True, later[1:] != later[:-1]])
+            best[later[head] - block_start] = earlier[head]
+            best_similarity[later[head] - block_start] = similarity[head]
+
+        # Rows earlier in the block may become leaders too: resolve in order
+        prefix = entries[in_prefix[entries]]
+        local_order = np.argsort(features[prefix], kind="stable")
+        later, earlier = _candidate_pairs(
+            rows[entries], features[entries], rows[prefix][local_order], features[prefix][local_order],
+            block_start, block_end,
+        )
+        similarity = similarity_of(later, earlier)
+        close = similarity >= threshold
+        later, earlier, similarity = later[close], earlier[close], similarity[close]
+        bounds = np.searchsorted(later, np.arange(block_start, block_end + 1)).tolist()
+        for i, row in enumerate(range(block_start, block_end)):
+            leader, leader_similarity = int(best[i]), float(best_similarity[i])
+            for other, value in zip(earlier[bounds[i]:bounds[i + 1]].tolist(),
+                                    similarity[bounds[i]:bounds[i + 1]].tolist()):
+                if is_leader[other] and (value, -other) > (leader_similarity, -leader):
+                    leader, leader_similarity = other, value
+            if leader >= 0:
+                leaders[row] = leader
+                is_leader[row] = False
+
+        # Index the block's new leaders
+        added = prefix[is_leader[rows[prefix]]]
+        index_rows = np.concatenate([index_rows, rows[added]])
+        index_features = np.concatenate([index_features, features[added]])
+        order = np.argsort(index_features, kind="stable")
+        index_rows, index_features = index_rows[order], index_features[order]
+    return leaders
+
+
+def _candidate_pairs(
+    probe_rows: np.ndarray, probe_features: np.ndarray,
+    index_rows: np.ndarray, index_features: np.ndarray, block_start: int, block_end: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct (probe row, index row) pairs sharing a feature, index row earlier.
+
+    Probe rows lie in [block_start, block_end); index_features must be
+    sorted. Returned pairs are sorted by probe row.
+    """
+    lo = np.searchsorted(index_features, probe_features, side="left")
+    counts = np.searchsorted(index_features, probe_features, side="right") - lo
+    total = np.cumsum(counts)
+    if not len(total) or not total[-1]:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # Keys are (probe row - block_start) * width + index row. Many repeats
+    # (rows sharing several features) are cheaper to collapse in a bitmap
+    # over all keys than to sort
+    width = block_end
+    cells = (block_end - block_start) * width
+    bitmap = np.zeros(cells, dtype=bool) if total[-1] * 8 > cells else None
+    keys = []
+    start = 0
+    while start < len(probe_rows):
+        reached = total[start - 1] if start else 0
+        end = max(int(np.searchsorted(total, reached + _PAIR_BLOCK, side="right")), start + 1)
+        sizes = counts[start:end]
+        later = np.repeat(probe_rows[start:end], sizes)
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        earlier = index_rows[np.repeat(lo[start:end], sizes) + offsets]
+        keep = earlier < later
+        block_keys = (later[keep] - block_start) * width + earlier[keep]
+        if bitmap is not None:
+            bitmap[block_keys] = True
+        else:
+            keys.append(np.unique(block_keys))
+        start = end
+    keys = np.flatnonzero(bitmap) if bitmap is not None else np.unique(np.concatenate(keys))
+    return keys // width + block_start, keys % width
+
+
+def _tfidf(texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sparse unit-length TF-IDF vectors of texts as (row, feature, value), sorted by row."""
+    vocabulary: dict[str, int] = {}
+    ids, lengths = [], []
+    for text in texts:
+        tokens = [vocabulary.setdefault(t, len(vocabulary)) for t in _TOKEN_RE.findall(text.lower())]
+        ids.extend(tokens)
+        lengths.append(len(tokens))
+    n, size = len(texts), max(len(vocabulary), 1)
+    row_of = np.repeat(np.arange(n, dtype=np.int64), lengths)
+    keys, counts = np.unique(row_of * size + np.asarray(ids, dtype=np.int64), return_counts=True)
+    rows, features = keys // size, keys % size
+    df = np.bincount(features, minlength=size)
+    values = np.log1p(counts) * (np.log((1 + n) / (1 + df[features])) + 1)
+    norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=n))
+    return rows, features, values / norms[rows]
+
+
+def _block_similarity(
+    later: np.ndarray, earlier: np.ndarray, *, block_start: int, dense: np.ndarray,
+    column_of: np.ndarray, row_starts: np.ndarray, features: np.ndarray, values: np.ndarray,
+) -> np.ndarray:
+    """Cosine of each block row later[i] (a row of dense) with the sparse row earlier[i]."""
+    similarity = np.zeros(len(later))
+    for start in range(0, len(later), _PAIR_BLOCK // 16):
+        stop = start + _PAIR_BLOCK // 16
+        pair, entry = _expand_rows(earlier[start:stop], row_starts)
+        products = dense[later[start:stop][pair] - block_start, column_of[features[entry]]] * values[entry]
+        similarity[start:stop] = np.bincount(pair, weights=products, minlength=len(later[start:stop]))
+    return similarity
+
+
+def _expand_rows(rows: np.ndarray, row_starts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(position in rows, entry index) for every entry of the given rows."""
+    sizes = row_starts[rows + 1] - row_starts[rows]
+    offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return np.repeat(np.arange(len(rows)), sizes), np.repeat(row_starts[rows], sizes) + offsets
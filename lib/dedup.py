@@ -0,0 +1,113 @@
+"""Near-duplicate source detection with MinHash and locality-sensitive hashing."""
+
+import re
+import zlib
+
+import numpy as np
+
+from config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_SHINGLE_WORDS
+from lib.batching import estimate_tokens
+from lib.cache import content_hash
+from lib.models import Source
+
+_PRIME = 4294967291  # largest prime below 2**32; keeps a * x + b inside uint64
+_WORD_RE = re.compile(r"\w+")
+
+
+class NearDuplicateIndex:
+    """Incremental near-duplicate detector for Sources.
+
+    Each source is reduced to a MinHash signature over word shingles and
+    filed into LSH buckets (``bands`` bands of ``num_perm // bands`` rows),
+    so a new source is only compared with the sources it shares a bucket
+    with rather than with every earlier source. A candidate whose
+    estimated Jaccard similarity reaches ``threshold`` is a duplicate; the
+    first source seen stays the representative of its cluster.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = DEDUP_NUM_PERM,
+        bands: int = DEDUP_BANDS,
+        shingle_words: int = DEDUP_SHINGLE_WORDS,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+        self._exact: dict[str, str] = {}               # content hash -> representative id
+        self._signatures: dict[str, np.ndarray] = {}   # representative id -> signature
+        self._buckets: dict[tuple, list[str]] = {}     # (band, band hash) -> representative ids
+        self.clusters: dict[str, list[str]] = {}       # representative id -> duplicate ids
+        self.tokens_saved = 0
+
+    def add(self, source: Source) -> str | None:
+        """Index a source; return its representative's id if it is a duplicate."""
+        digest = content_hash(source.content)
+        representative = self._exact.get(digest)
+        signature = None
+        if representative is None:
+            signature = self.signature(source.content)
+            if signature is not None:
+                representative = self._best_candidate(signature)
+
+        if representative is not None:
+            self.clusters.setdefault(representative, []).append(source.id)
+            self.tokens_saved += estimate_tokens(source.content)
+            return representative
+
+        self._exact[digest] = source.id
+        if signature is not None:
+            self._signatures[source.id] = signature
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(source.id)
+        return None
+
+    def signature(self, text: str) -> np.ndarray | None:
+        """MinHash signature of the text's word shingles (None if it has no words)."""
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            return None
+        size = min(self.shingle_words, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # One universal hash (a * x + b) mod p per permutation, all at once
+        permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(_PRIME)
+        return permuted.min(axis=0)
+
+    def stats(self) -> dict:
+        """Cluster report for OSTResult.sources_summary["dedup"]."""
+        return {
+            "clusters": len(self.clusters),
+            "duplicates": sum(len(ids) for ids in self.clusters.values()),
+            "tokens_saved": self.tokens_saved,
+            "groups": {rep: list(ids) for rep, ids in self.clusters.items()},
+        }
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, rows.tobytes()
+
+    def _best_candidate(self, signature: np.ndarray) -> str | None:
+        candidates = {
+            rep_id
+            for key in self._band_keys(signature)
+            for rep_id in self._buckets.get(key, ())
+        }
+        best, best_similarity = None, self.threshold
+        for rep_id in candidates:
+            similarity = float(np.mean(self._signatures[rep_id] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = rep_id, similarity
+        return best
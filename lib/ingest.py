@@ -0,0 +1,209 @@
+"""Headless ingestion: parse a folder tree or zip archive into Sources."""
+
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from config import INPUT_CATEGORIES, SUPPORTED_EXTENSIONS, PARSE_MAX_WORKERS, PARSE_START_METHOD
+from lib.models import Source
+from lib.parser import parse_bytes
+
+# Files outside any category folder
+DEFAULT_CATEGORY = "miscellaneous"
+
+
+@dataclass
+class IngestEntry:
+    """One file to parse, located on disk or inside a zip archive."""
+    path: str                   # file path, or the zip archive's path
+    name: str                   # path relative to its category folder
+    category: str               # key from INPUT_CATEGORIES
+    index: int                  # position within the category (for the id)
+    member: str = ""            # zip member name, if path is an archive
+
+
+class BulkIngest:
+    """Lazily parse a sample_data-style folder tree or zip archive.
+
+    The first folder on each file's path that is an INPUT_CATEGORIES key
+    (e.g. ``customer_calls/``) sets the file's category; files outside
+    any category folder count as miscellaneous. Files are read through
+    memory maps (zip members via a temporary file) rather than loaded
+    into memory, and Sources are yielded in a stable order as soon as
+    they are parsed, so the ingest can be passed straight to
+    Synthesizer.run. Per-file failures are collected in ``errors``, files
+    with unsupported extensions in ``skipped``. close() stops a parse the
+    consumer abandoned and shuts its process pool down.
+    """
+
+    def __init__(self, path: str, max_workers: int | None = PARSE_MAX_WORKERS):
+        """
+        Args:
+            path: A directory or a .zip archive.
+            max_workers: Parser process pool size (None = one per CPU,
+                1 = parse in this process).
+        """
+        if not (os.path.isdir(path) or zipfile.is_zipfile(path)):
+            raise ValueError(f"{path} is neither a directory nor a zip archive")
+        self.path = path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.sources: list[Source] = []
+        self.errors: list[str] = []
+        self.skipped: list[str] = []
+        self.timings: dict[str, float] = {}
+        self._parsing = None
+
+    def entries(self) -> list[IngestEntry]:
+        """List the files to parse, in category then path order."""
+        if os.path.isdir(self.path):
+            names = []
+            for dirpath, dirnames, filenames in os.walk(self.path):
+                dirnames[:] = sorted(d for d in dirnames if not _is_hidden(d))
+                rel_dir = os.path.relpath(dirpath, self.path)
+                for filename in filenames:
+                    if not _is_hidden(filename):
+                        names.append(os.path.normpath(os.path.join(rel_dir, filename)).replace(os.sep, "/"))
+        else:
+            with zipfile.ZipFile(self.path) as archive:
+                names = [
+                    info.filename for info in archive.infolist()
+                    if not info.is_dir() and not any(_is_hidden(p) for p in info.filename.split("/"))
+                ]
+
+        located = []
+        self.skipped = []
+        for name in sorted(names):
+            ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+            if ext not in SUPPORTED_EXTENSIONS:
+                self.skipped.append(name)
+                continue
+            category, relative = _categorize_path(name)
+            located.append((category, relative, name))
+
+        order = {key: i for i, key in enumerate(INPUT_CATEGORIES)}
+        located.sort(key=lambda item: (order[item[0]], item[1]))
+        counts: dict[str, int] = {}
+        entries = []
+        for category, relative, name in located:
+            index = counts.get(category, 0)
+            counts[category] = index + 1
+            if os.path.isdir(self.path):
+                entries.append(IngestEntry(os.path.join(self.path, name), relative, category, index))
+            else:
+                entries.append(IngestEntry(self.path, relative, category, index, member=name))
+        return entries
+
+    def __iter__(self):
+        self._parsing = self._iter_sources()
+        return self._parsing
+
+    def close(self):
+        """Stop the current parse, dropping files not started yet."""
+        if self._parsing is not None:
+            self._parsing.close()
+            self._parsing = None
+
+    def _iter_sources(self):
+        entries = self.entries()
+        results = self._parse_all(entries)
+        try:
+            for entry, (source, error, seconds) in zip(entries, results):
+                if error:
+                    self.errors.append(error)
+                    continue
+                self.timings[source.id] = seconds
+                self.sources.append(source)
+                yield source
+        finally:
+            results.close()
+
+    def _parse_all(self, entries: list[IngestEntry]):
+        """Yield parse_entry results in entry order."""
+        if self.max_workers <= 1 or len(entries) <= 1:
+            for entry in entries:
+                yield parse_entry(entry)
+            return
+
+        # Keep a bounded window of files in flight so results are not
+        # buffered far ahead of the consumer
+        context = multiprocessing.get_context(PARSE_START_METHOD)
+        pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        try:
+            pending = deque()
+            remaining = iter(entries)
+            for entry in remaining:
+                pending.append(pool.submit(parse_entry, entry))
+                if len(pending) >= 2 * self.max_workers:
+                    break
+            while pending:
+                result = pending.popleft().result()
+                entry = next(remaining, None)
+                if entry is not None:
+                    pending.append(pool.submit(parse_entry, entry))
+                yield result
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def parse_entry(entry: IngestEntry) -> tuple[Source | None, str, float]:
+    """Parse one file; return (source, error, seconds) like the upload path."""
+    started = time.perf_counter()
+    try:
+        with open_entry(entry) as contents:
+            source = parse_bytes(entry.name, contents, entry.category, entry.index)
+        return source, "", time.perf_counter() - started
+    except Exception as e:
+        return None, f"{entry.name}: {e}", time.perf_counter() - started
+
+
+@contextmanager
+def open_entry(entry: IngestEntry):
+    """Memory-map an entry's contents (bytes for empty files)."""
+    if not entry.member:
+        with open(entry.path, "rb") as f, _mapped(f) as contents:
+            yield contents
+        return
+
+    # Zip members are usually compressed, so inflate to a temp file and map that
+    with zipfile.ZipFile(entry.path) as archive, archive.open(entry.member) as member:
+        with tempfile.TemporaryFile() as tmp:
+            shutil.copyfileobj(member, tmp)
+            tmp.flush()
+            with _mapped(tmp) as contents:
+                yield contents
+
+
+@contextmanager
+def _mapped(f):
+    if os.fstat(f.fileno()).st_size == 0:
+        yield b""
+        return
+    contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield contents
+    finally:
+        try:
+            contents.close()
+        except BufferError:
+            pass  # a parser still holds a view; the map closes when it is released
+
+
+def _categorize_path(name: str) -> tuple[str, str]:
+    """Split "a/customer_calls/x/y.txt" into ("customer_calls", "x/y.txt")."""
+    parts = name.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if part in INPUT_CATEGORIES:
+            return part, "/".join(parts[i + 1:])
+    return DEFAULT_CATEGORY, parts[-1]
+
+
+def _is_hidden(name: str) -> bool:
+    return name.startswith(".") or name == "__MACOSX"
@@ -11,6 +11,8 @@ class Source:
     category: str               # key from INPUT_CATEGORIES
     content: str                # extracted text
     weight: float               # from category weight
+    metadata: dict = field(default_factory=dict)
+    # Parser notes, e.g. {"pages_total": 400, "pages_parsed": 9, "pages_skipped": 391}
 
 
 @dataclass
@@ -27,6 +29,19 @@ class ExtractedInsight:
     solution_requests: list[str] = field(default_factory=list)
 
 
+@dataclass
+class InsightCluster:
+    """Near-identical Level 2 items of one kind, represented by one of them."""
+    id: str                     # "G1", "G2", ...; Level 3 cites it in place of source ids
+    kind: str                   # ExtractedInsight field, e.g. "problems"
+    item: dict | str            # representative item, as in ExtractedInsight
+    mentions: int               # items in the cluster
+    members: list[dict] = field(default_factory=list)
+    # One per distinct source, the representative's first:
+    # {"source_id": str, "category": str, "text": str, "tickets": int (optional),
+    #  "quotes": [str, ...] (optional, evidence of the items with tickets)}
+
+
 @dataclass
 class Pattern:
     """Level 3 output: a cross-source pattern."""
@@ -38,7 +53,16 @@ class Pattern:
     business_impact: str
     cross_org_signal: bool                      # appears in 2+ categories
     evidence: list[dict] = field(default_factory=list)
-    # Each: {"source_id": str, "category": str, "weight": float, "quote": str}
+    # Each: {"source_id": str, "category": str, "weight": float, "quote": str,
+    #        "tickets": int (optional, support tickets the cited item stands for)}
+    # A cited InsightCluster is one entry for its representative, plus
+    #        "group": str, "mentions": int, "sources": [source_id, ...],
+    #        "source_tickets": {source_id: int} (optional)
+    # Ticket counts are the cluster sizes parsed from the cited ticket export
+    # (lib/scoring.resolve_tickets); "tickets_estimated": True marks an entry
+    # where some count fell back to the figure Claude reported.
+    # frequency, weighted_score, cross_org_signal and source_categories are
+    # computed from the evidence (lib/scoring.py), tickets counting as sources
     source_categories: dict = field(default_factory=dict)
     # {"customer_calls": 3, "internal_meetings": 2, ...}
 
@@ -87,3 +111,8 @@ class OSTResult:
     sources_summary: dict = field(default_factory=dict)
     processing_time_seconds: float = 0.0
     raw_markdown: str = ""
+    api_usage: dict = field(default_factory=dict)
+    # {"calls": int, "input_tokens": int, "output_tokens": int}
+    stage_stats: dict = field(default_factory=dict)
+    # stage -> {"busy_seconds": float, "wall_seconds": float, "utilization": float}
+    run_id: str = ""                            # checkpoint id; pass as resume_run_id to retry
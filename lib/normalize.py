@@ -0,0 +1,138 @@
+"""Token-reducing normalization of transcripts before Level 2."""
+
+import re
+from dataclasses import replace
+
+from lib.batching import estimate_tokens
+from lib.models import Source
+
+_TIMESTAMP = r"[\[(]?\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d{1,3})?[\])]?"
+_BRACKETED_TIMESTAMP = r"[\[(]\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d{1,3})?[\])]"
+_LABEL = r"[A-Z][A-Za-z.'-]*(?: [A-Z][A-Za-z.'-]*){0,3}"
+
+# Only line-level noise is removed; the words of an utterance are never
+# touched, so a quote taken from the normalized text is also a quote from
+# the original. One alternation, tried left to right at each position,
+# rewrites the whole text in a single regex pass.
+_PATTERN = re.compile(
+    "|".join([
+        # "Jane Doe joined the meeting", "Recording started" on a line of their own
+        rf"(?P<boilerplate>(?im:^[ \t]*(?:{_TIMESTAMP}[ \t]*)?"
+        r"(?:[^\n:]{0,60}\b(?:has |have )?(?:joined|left) the (?:meeting|call|conversation|channel|huddle)"
+        r"|recording (?:started|stopped|in progress)|this (?:meeting|call) is being recorded)"
+        r"[^\n:]{0,40}$\n?))",
+        # "[00:01:02] Sarah Chen: ..." at the start of a line
+        rf"(?P<speaker>(?m:^(?P<speaker_time>{_TIMESTAMP}[ \t]*)?"
+        rf"(?P<speaker_name>{_LABEL})[ \t]*:[ \t]+))",
+        # Timestamp-only lines, WebVTT/SRT cue timings, and a bracketed
+        # timestamp opening a line ("10:45 we reconvened" is left alone)
+        rf"(?P<timestamp>(?m:^[ \t]*{_TIMESTAMP}(?:[ \t]*-->[ \t]*{_TIMESTAMP}[^\n]*)?[ \t]*$\n?)"
+        rf"|(?m:^[ \t]*{_BRACKETED_TIMESTAMP}[ \t]*))",
+        r"(?P<whitespace>(?m:[ \t]+$)|\n[ \t]*\n(?:[ \t]*\n)+)",
+    ])
+)
+
+# Line-leading labels collected before the rewrite to find the speakers
+_LINE_LABEL = re.compile(rf"(?m)^(?:{_TIMESTAMP}[ \t]*)?({_LABEL})[ \t]*:[ \t]+")
+
+# Labels that head notes and minutes rather than name a speaker
+_NOT_SPEAKERS = frozenset({
+    "a", "action", "action item", "action items", "agenda", "answer", "attendees",
+    "date", "decision", "decisions", "example", "from", "important", "next steps",
+    "note", "notes", "owner", "q", "question", "re", "status", "subject",
+    "summary", "to", "todo", "update", "warning",
+})
+
+RULES = ("boilerplate", "speaker", "timestamp", "whitespace")
+
+
+def normalize_text(text: str) -> tuple[str, dict[str, int]]:
+    """Normalize a transcript; return the text and chars removed per rule.
+
+    Removes join/leave and recording notices, timestamp-only lines, cue
+    timings and bracketed line-leading timestamps, the speaker label of
+    consecutive turns by the same speaker, trailing blanks and runs of
+    blank lines. Everything inside an utterance is kept byte for byte.
+    """
+    speakers = _speakers(text)
+    removed = dict.fromkeys(RULES, 0)
+    last_speaker = None
+
+    def rewrite(match: re.Match) -> str:
+        nonlocal last_speaker
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "speaker":
+            name = match.group("speaker_name")
+            time = match.group("speaker_time") or ""
+            label = text[len(time):]
+            if name not in speakers:
+                # A label such as "Note:" stays; only a bracketed time before it goes
+                out = label if time[:1] in "[(" and time else text
+                kind = "timestamp"
+            else:
+                out = "" if name == last_speaker else label
+                last_speaker = name
+        elif kind == "whitespace":
+            out = "\n\n" if "\n" in text else ""
+        else:
+            out = ""
+        removed[kind] += len(text) - len(out)
+        return out
+
+    return _PATTERN.sub(rewrite, text), removed
+
+
+def _speakers(text: str) -> frozenset[str]:
+    """Line-leading labels that name speakers.
+
+    Common note headings ("Note:", "Action items:") never count, and a
+    text with fewer than two other distinct labels is not treated as a
+    dialogue, so its labels are kept.
+    """
+    names = {
+        match.group(1) for match in _LINE_LABEL.finditer(text)
+        if match.group(1).lower() not in _NOT_SPEAKERS
+    }
+    return frozenset(names) if len(names) >= 2 else frozenset()
+
+
+class TranscriptNormalizer:
+    """Normalize Sources before Level 2 and tally what was removed.
+
+    CSV exports are passed through unchanged: their rows are structured
+    fields, not transcript text.
+    """
+
+    def __init__(self):
+        self._by_category: dict[str, dict] = {}
+
+    def normalize_source(self, source: Source) -> Source:
+        """Return the source with normalized content (or the source itself)."""
+        if source.filename.lower().endswith(".csv"):
+            return source
+        content, removed = normalize_text(source.content)
+        chars = len(source.content) - len(content)
+        tokens = estimate_tokens(source.content) - estimate_tokens(content)
+
+        totals = self._by_category.setdefault(
+            source.category, {"sources": 0, "chars_removed": 0, "tokens_removed": 0}
+        )
+        totals["sources"] += 1
+        totals["chars_removed"] += chars
+        totals["tokens_removed"] += tokens
+        if not chars:
+            return source
+        return replace(
+            source,
+            content=content,
+            metadata={**source.metadata, "normalized_chars_removed": chars, "normalized_by_rule": removed},
+        )
+
+    def stats(self) -> dict:
+        """Per-category and total chars/tokens removed, for sources_summary."""
+        return {
+            "chars_removed": sum(c["chars_removed"] for c in self._by_category.values()),
+            "tokens_removed": sum(c["tokens_removed"] for c in self._by_category.values()),
+            "by_category": {cat: dict(totals) for cat, totals in self._by_category.items()},
+        }
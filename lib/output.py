@@ -204,6 +204,31 @@ def generate_markdown_report(result: OSTResult, sources: list[Source]) -> str:
     lines.append("**Synthesis Approach:**")
     lines.append("")
     lines.append(f"1. **Multi-Source Aggregation** — {total} sources across {len(sources_by_cat)} categories")
+    dedup = result.sources_summary.get("dedup")
+    if dedup and dedup.get("duplicates"):
+        lines.append(
+            f"   - Near-duplicates collapsed: {dedup['duplicates']} sources in "
+            f"{dedup['clusters']} clusters (~{dedup['tokens_saved']:,} tokens saved)"
+        )
+    normalization = result.sources_summary.get("normalization")
+    if normalization and normalization.get("chars_removed"):
+        lines.append(
+            f"   - Transcript normalization removed {normalization['chars_removed']:,} characters "
+            f"(~{normalization['tokens_removed']:,} tokens)"
+        )
+    ticket_clusters = result.sources_summary.get("ticket_clusters")
+    if ticket_clusters:
+        lines.append(
+            f"   - Support tickets clustered: {ticket_clusters['tickets']:,} tickets in "
+            f"{ticket_clusters['clusters']} clusters, one representative each "
+            f"({ticket_clusters['represented']:,} tickets represented)"
+        )
+    insight_clusters = result.sources_summary.get("insight_clusters")
+    if insight_clusters:
+        lines.append(
+            f"   - Level 2 items pre-clustered: {insight_clusters['items']:,} items in "
+            f"{insight_clusters['clusters']:,} groups before pattern synthesis"
+        )
     lines.append("2. **Data Pyramid Processing:**")
     lines.append("   - Level 1: Raw signal ingestion")
     lines.append("   - Level 2: Content categorization (problems, JTBD, pain points)")
@@ -217,6 +242,17 @@ def generate_markdown_report(result: OSTResult, sources: list[Source]) -> str:
     lines.append("   - Tool: Product Insight Synthesizer v1.0")
     lines.append(f"   - Model: {MODEL_ID}")
     lines.append(f"   - Processing time: {result.processing_time_seconds:.1f}s")
+    usage = result.api_usage
+    if usage:
+        lines.append(
+            f"   - API usage: {usage.get('calls', 0)} calls, "
+            f"{usage.get('input_tokens', 0):,} input / {usage.get('output_tokens', 0):,} output tokens"
+        )
+    for stage, stats in result.stage_stats.items():
+        lines.append(
+            f"   - Stage {stage}: {stats.get('wall_seconds', 0):.1f}s wall, "
+            f"{stats.get('utilization', 0):.0%} utilization"
+        )
     lines.append("")
     lines.append("**Confidence Levels:**")
     lines.append("- **HIGH:** Mentioned in 10+ sources with consistent messaging")
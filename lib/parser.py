@@ -1,9 +1,38 @@
 """File parsing: convert uploaded files into Source objects."""
 
 import io
+import itertools
+import mmap
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import numpy as np
 import pandas as pd
+from lib.clustering import TicketClusterer
 from lib.models import Source
-from config import INPUT_CATEGORIES, MAX_CHARS_PER_SOURCE
+from config import (
+    INPUT_CATEGORIES, MAX_CHARS_PER_DOCUMENT, CSV_CHUNK_ROWS, CSV_ROW_SELECTION,
+    PARSE_MAX_WORKERS, PARSE_PARALLEL_MIN_BYTES, PARSE_START_METHOD, TICKET_CLUSTER_CATEGORIES,
+    TICKET_CLUSTERS_MAX,
+)
+
+# Part of every ParseCache key: bump whenever a change to this module alters
+# the text or metadata parsed from the same file with the same settings.
+PARSER_VERSION = 1
+
+
+@dataclass
+class ParseReport:
+    """Outcome of parsing a set of uploads with parse_files()."""
+    sources: list[Source] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    # "filename: message", same format as the app's parse_errors
+    timings: dict[str, float] = field(default_factory=dict)
+    # source id -> parse seconds
 
 
 def parse_file(uploaded_file, category: str, index: int) -> Source:
@@ -17,29 +46,151 @@ def parse_file(uploaded_file, category: str, index: int) -> Source:
     Returns:
         Source with extracted text content.
     """
-    filename = uploaded_file.name
+    return parse_bytes(uploaded_file.name, uploaded_file.read(), category, index)
+
+
+def parse_files(
+    uploaded_files: dict[str, list],
+    max_workers: int | None = PARSE_MAX_WORKERS,
+    cache=None,
+) -> ParseReport:
+    """Parse every upload, fanning out to a process pool for large sets.
+
+    Source ids depend only on each file's category and position, never on
+    which worker finishes first, and sources come back in upload order.
+
+    Args:
+        uploaded_files: Category key -> list of UploadedFile objects.
+        max_workers: Process pool size (None = one per CPU).
+        cache: Optional ParseCache; unchanged files are not parsed again.
+    """
+    results = {}
+    report = ParseReport()
+    for order, source, error, seconds in iter_parse_files(uploaded_files, max_workers, cache):
+        results[order] = (source, error, seconds)
+
+    for order in sorted(results):
+        source, error, seconds = results[order]
+        if error:
+            report.errors.append(error)
+        else:
+            report.sources.append(source)
+            report.timings[source.id] = seconds
+    return report
+
+
+def iter_parse_files(
+    uploaded_files: dict[str, list],
+    max_workers: int | None = PARSE_MAX_WORKERS,
+    cache=None,
+):
+    """Parse uploads, yielding (order, source, error, seconds) as each finishes.
+
+    ``order`` is the file's position in upload order; exactly one of
+    ``source`` and ``error`` is set. Files found in the optional ParseCache
+    are yielded first, without parsing. CPU-bound PDF/DOCX extraction runs
+    in worker processes once the remaining uploads total
+    PARSE_PARALLEL_MIN_BYTES.
+    """
+    jobs = []
+    keys = {}
+    order = 0
+    for category, files in uploaded_files.items():
+        for i, uploaded_file in enumerate(files):
+            started = time.perf_counter()
+            try:
+                raw_bytes = uploaded_file.read()
+            except Exception as e:
+                yield order, None, f"{uploaded_file.name}: {e}", 0.0
+                order += 1
+                continue
+            if cache is not None:
+                keys[order] = cache.key_for(uploaded_file.name, raw_bytes, category)
+                source = cache.get_source(keys[order], uploaded_file.name, category, i)
+                if source is not None:
+                    yield order, source, "", time.perf_counter() - started
+                    order += 1
+                    continue
+            jobs.append((order, (uploaded_file.name, raw_bytes, category, i)))
+            order += 1
+
+    for order, source, error, seconds in _parse_jobs(jobs, max_workers):
+        if cache is not None and source is not None:
+            cache.put_source(keys[order], source)
+        yield order, source, error, seconds
+
+
+def _parse_jobs(jobs: list, max_workers: int | None):
+    """Yield (order, source, error, seconds) for (order, job args) pairs."""
+    total_bytes = sum(len(job[1]) for _, job in jobs)
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1 or total_bytes < PARSE_PARALLEL_MIN_BYTES:
+        for order, job in jobs:
+            yield (order, *_parse_job(*job))
+        return
+
+    context = multiprocessing.get_context(PARSE_START_METHOD)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    try:
+        futures = {pool.submit(_parse_job, *job): order for order, job in jobs}
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
+    finally:
+        # A consumer that stops early (closing this generator) drops the
+        # files not started yet
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _parse_job(filename: str, raw_bytes: bytes, category: str, index: int):
+    """Worker entry point: return (source, error, seconds) for one file."""
+    started = time.perf_counter()
+    try:
+        source = parse_bytes(filename, raw_bytes, category, index)
+        error = None
+    except Exception as e:
+        source = None
+        error = f"{filename}: {e}"
+    return source, error, time.perf_counter() - started
+
+
+def parse_bytes(filename: str, raw_bytes: bytes | mmap.mmap, category: str, index: int) -> Source:
+    """Parse a file's raw bytes and return a Source object.
+
+    Args:
+        filename: Original filename; its extension selects the parser.
+        raw_bytes: File contents, or a memory-mapped file (read in place).
+        category: Key from INPUT_CATEGORIES (e.g. "customer_calls").
+        index: Index within this category for ID generation.
+    """
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-    raw_bytes = uploaded_file.read()
 
     parsers = {
         "txt": _parse_txt,
+        "csv": _parse_csv,
+    }
+    # These stop extracting at the character budget and also return metadata
+    document_parsers = {
         "docx": _parse_docx,
         "pdf": _parse_pdf,
-        "csv": _parse_csv,
     }
 
-    parser = parsers.get(ext)
-    if parser is None:
-        content = f"[Unsupported file format: .{ext}]"
-    else:
-        try:
-            content = parser(raw_bytes)
-        except Exception as e:
-            content = f"[Error parsing {filename}: {e}]"
+    metadata = {}
+    try:
+        if ext == "csv" and category in TICKET_CLUSTER_CATEGORIES:
+            content, metadata = _parse_ticket_csv(raw_bytes)
+        elif ext in document_parsers:
+            content, metadata = document_parsers[ext](raw_bytes)
+        elif ext in parsers:
+            content = parsers[ext](raw_bytes)
+        else:
+            content = f"[Unsupported file format: .{ext}]"
+    except Exception as e:
+        content = f"[Error parsing {filename}: {e}]"
+        metadata = {"parse_error": str(e)}
 
     # Truncate if too long
-    if len(content) > MAX_CHARS_PER_SOURCE:
-        content = content[:MAX_CHARS_PER_SOURCE] + "\n\n[... content truncated ...]"
+    if len(content) > MAX_CHARS_PER_DOCUMENT:
+        content = content[:MAX_CHARS_PER_DOCUMENT] + "\n\n[... content truncated ...]"
 
     weight = INPUT_CATEGORIES[category]["weight"]
     source_id = f"{category}_{index:03d}"
@@ -50,53 +201,242 @@ def parse_file(uploaded_file, category: str, index: int) -> Source:
         category=category,
         content=content,
         weight=weight,
+        metadata=metadata,
     )
 
 
+def _open_stream(raw_bytes):
+    """File-like view of the contents; memory-mapped files are not copied."""
+    if isinstance(raw_bytes, mmap.mmap):
+        return _MappedStream(raw_bytes)
+    return io.BytesIO(raw_bytes)
+
+
+class _MappedStream(io.RawIOBase):
+    """Seekable, read-only file object over a memory map."""
+
+    def __init__(self, mapped: mmap.mmap):
+        self._mapped = mapped
+        mapped.seek(0)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._mapped.read(None if size is None or size < 0 else size)
+
+    def readinto(self, buffer) -> int:
+        data = self._mapped.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._mapped.seek(offset, whence)
+        return self._mapped.tell()
+
+    def tell(self) -> int:
+        return self._mapped.tell()
+
+
 def _parse_txt(raw_bytes: bytes) -> str:
     """Decode plain text bytes."""
     for encoding in ("utf-8", "utf-8-sig", "latin-1"):
         try:
-            return raw_bytes.decode(encoding).strip()
+            return str(raw_bytes, encoding).strip()
         except UnicodeDecodeError:
             continue
-    return raw_bytes.decode("utf-8", errors="replace").strip()
+    return str(raw_bytes, "utf-8", "replace").strip()
 
 
-def _parse_docx(raw_bytes: bytes) -> str:
-    """Extract text from a Word document."""
+def _parse_docx(raw_bytes: bytes, max_chars: int | None = MAX_CHARS_PER_DOCUMENT) -> tuple[str, dict]:
+    """Extract text from a Word document, stopping at max_chars.
+
+    Returns the text and metadata counting paragraphs read and skipped.
+    """
     from docx import Document
+    from docx.oxml.ns import qn
+
+    doc = Document(_open_stream(raw_bytes))
+    # Body paragraphs are read one element at a time (doc.paragraphs would
+    # wrap them all first); those past the budget are only counted
+    paragraphs = doc.element.body.iterchildren(qn("w:p"))
+    text, metadata = _join_within_budget((p.text for p in paragraphs), 0, "paragraphs", max_chars)
+    skipped = sum(1 for _ in paragraphs)
+    metadata.update(paragraphs_total=metadata["paragraphs_parsed"] + skipped, paragraphs_skipped=skipped)
+    return text, metadata
 
-    doc = Document(io.BytesIO(raw_bytes))
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-    return "\n\n".join(paragraphs)
 
+def _parse_pdf(raw_bytes: bytes, max_chars: int | None = MAX_CHARS_PER_DOCUMENT) -> tuple[str, dict]:
+    """Extract text from a PDF, stopping at max_chars.
 
-def _parse_pdf(raw_bytes: bytes) -> str:
-    """Extract text from a PDF."""
+    Pages are extracted one at a time, so a long PDF only costs the pages
+    actually used. Returns the text and metadata counting pages read and
+    skipped.
+    """
     from PyPDF2 import PdfReader
 
-    reader = PdfReader(io.BytesIO(raw_bytes))
-    pages = []
-    for page in reader.pages:
-        text = page.extract_text()
-        if text:
-            pages.append(text.strip())
-    return "\n\n".join(pages)
+    reader = PdfReader(_open_stream(raw_bytes))
+    pages = reader.pages
+    blocks = ((page.extract_text() or "").strip() for page in pages)
+    return _join_within_budget(blocks, len(pages), "pages", max_chars)
+
+
+def _join_within_budget(blocks, total: int, unit: str, max_chars: int | None) -> tuple[str, dict]:
+    """Join non-empty text blocks with blank lines until max_chars is passed.
 
+    blocks is consumed lazily and abandoned once the joined text exceeds
+    max_chars; the block that crosses the budget is included so parse_bytes
+    still marks the content as truncated.
 
-def _parse_csv(raw_bytes: bytes) -> str:
+    Args:
+        blocks: Iterator of raw block texts (pages, paragraphs).
+        total: Number of blocks in the document.
+        unit: Block name used in the metadata keys.
+        max_chars: Character budget (None = read everything).
+    """
+    parts, length, parsed = [], 0, 0
+    for text in blocks:
+        parsed += 1
+        if not text.strip():
+            continue
+        length += len(text) + (2 if parts else 0)
+        parts.append(text)
+        if max_chars is not None and length > max_chars:
+            break
+    metadata = {
+        f"{unit}_total": total,
+        f"{unit}_parsed": parsed,
+        f"{unit}_skipped": total - parsed,
+    }
+    return "\n\n".join(parts), metadata
+
+
+def _parse_csv(
+    raw_bytes: bytes,
+    max_chars: int | None = MAX_CHARS_PER_DOCUMENT,
+    selection: str = CSV_ROW_SELECTION,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+) -> str:
     """Parse CSV into readable text blocks.
 
     Detects common content columns (description, body, content, summary,
     comment, text, notes) and formats each row as a readable entry.
     Falls back to full DataFrame string representation.
+
+    The file is read chunk_rows rows at a time and only the entries that
+    fit max_chars are kept, chosen by the selection policy (see
+    CSV_ROW_SELECTION). The entry that crosses the budget is included so
+    that parse_bytes still marks the content as truncated. With the
+    "first" policy, and for the fallback, reading stops once the budget
+    is met. max_chars=None keeps every row.
+    """
+    reader = _read_csv_chunks(raw_bytes, chunk_rows)
+    first_chunk = next(reader, None)
+    if first_chunk is None:
+        return ""
+    chunks = itertools.chain([first_chunk], reader)
+
+    content_columns, meta_columns = _csv_columns(first_chunk.columns)
+
+    if content_columns:
+        selector = _CsvRowSelector(selection, first_chunk.columns, max_chars)
+        for chunk in chunks:
+            if selector.offer(chunk, lambda rows: _format_csv_entries(rows, meta_columns, content_columns)):
+                break
+        return _CSV_ENTRY_SEPARATOR.join(selector.entries())
+
+    # Fallback: stringify the leading rows of the DataFrame
+    frames, rendered = [], 0
+    for chunk in chunks:
+        frames.append(chunk)
+        if max_chars is not None:
+            rendered += len(chunk.to_string(index=False))
+            if rendered > max_chars:
+                break
+    return pd.concat(frames).to_string(index=False)
+
+
+def _parse_ticket_csv(
+    raw_bytes: bytes,
+    max_chars: int | None = MAX_CHARS_PER_DOCUMENT,
+    max_clusters: int = TICKET_CLUSTERS_MAX,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+) -> tuple[str, dict]:
+    """Parse a ticket export into one representative entry per cluster.
+
+    Every row is read, chunk_rows at a time, and grouped with similar
+    tickets by TicketClusterer. The ticket nearest each cluster's centre
+    is kept, preceded by a "similar_tickets: N" line with its cluster size,
+    largest clusters first until max_chars (the crossing entry included,
+    as in _parse_csv). Exports without content columns or with no more
+    than max_clusters tickets are parsed by _parse_csv instead.
+
+    Returns:
+        The text and metadata with tickets (rows read), ticket_clusters
+        and tickets_represented (the summed sizes of the kept clusters).
     """
-    df = pd.read_csv(io.BytesIO(raw_bytes))
+    reader = _read_csv_chunks(raw_bytes, chunk_rows)
+    first_chunk = next(reader, None)
+    if first_chunk is None:
+        return "", {}
+    content_columns, meta_columns = _csv_columns(first_chunk.columns)
+    if not content_columns:
+        return _parse_csv(raw_bytes, max_chars, chunk_rows=chunk_rows), {}
+
+    clusterer = TicketClusterer(max_clusters)
+    row_labels = []
+    for chunk in itertools.chain([first_chunk], reader):
+        entries = _format_csv_entries(chunk, meta_columns, content_columns)
+        clusterer.add(entries)
+        row_labels.append(entries.index.to_numpy())
+    if len(clusterer) <= max_clusters:
+        return _parse_csv(raw_bytes, max_chars, chunk_rows=chunk_rows), {"tickets": len(clusterer)}
+    row_labels = np.concatenate(row_labels)
+    clusters = clusterer.fit()
+
+    # Second pass: format only the representatives
+    wanted = row_labels[[c.representative for c in clusters]]
+    texts = {}
+    for chunk in _read_csv_chunks(raw_bytes, chunk_rows):
+        rows = chunk[chunk.index.isin(wanted)]
+        if len(rows):
+            texts.update(_format_csv_entries(rows, meta_columns, content_columns).items())
+
+    entries, total, represented = [], 0, 0
+    for cluster, label in zip(clusters, wanted):
+        entries.append(f"similar_tickets: {cluster.size}\n{texts[label]}")
+        represented += cluster.size
+        total += len(entries[-1]) + len(_CSV_ENTRY_SEPARATOR)
+        if max_chars is not None and total > max_chars:
+            break
+    metadata = {
+        "tickets": len(clusterer),
+        "ticket_clusters": len(clusters),
+        "tickets_represented": represented,
+    }
+    return _CSV_ENTRY_SEPARATOR.join(entries), metadata
+
+
+def _read_csv_chunks(raw_bytes: bytes, chunk_rows: int):
+    """Read a CSV chunk_rows rows at a time, every cell as the text in the file.
 
+    Blank and NA-like cells ("NA", "N/A", ...) are missing, as with a plain
+    read_csv. Other cells are not converted: inferring dtypes per chunk
+    would render the same column differently from one chunk to the next
+    (a number as "2" in one and "2.0" in another that has a blank), so
+    numbers are rendered as written in the file.
+    """
+    return pd.read_csv(_open_stream(raw_bytes), chunksize=chunk_rows, dtype=str)
+
+
+def _csv_columns(columns) -> tuple[list, list]:
+    """Return the (content, metadata) columns of a CSV export."""
     # Look for content-bearing columns
     content_columns = []
-    for col in df.columns:
+    for col in columns:
         if col.lower() in (
             "description", "body", "content", "summary",
             "comment", "text", "notes", "message", "details",
@@ -105,28 +445,206 @@ def _parse_csv(raw_bytes: bytes) -> str:
 
     # Also grab metadata columns if present
     meta_columns = []
-    for col in df.columns:
+    for col in columns:
         if col.lower() in (
             "subject", "title", "status", "priority", "created_at",
             "date", "category", "type", "id", "ticket_id",
         ):
             meta_columns.append(col)
+    return content_columns, meta_columns
 
-    if content_columns:
-        entries = []
-        for _, row in df.iterrows():
-            parts = []
-            for mc in meta_columns:
-                val = row.get(mc)
-                if pd.notna(val):
-                    parts.append(f"{mc}: {val}")
-            for cc in content_columns:
-                val = row.get(cc)
-                if pd.notna(val):
-                    parts.append(str(val))
-            if parts:
-                entries.append("\n".join(parts))
-        return "\n\n---\n\n".join(entries)
-
-    # Fallback: stringify the whole DataFrame
-    return df.to_string(index=False)
+
+def _format_csv_entries(df: pd.DataFrame, meta_columns: list, content_columns: list) -> pd.Series:
+    """Format each row as "meta: value" lines followed by its content values.
+
+    Works a column at a time rather than a row at a time: each column's
+    present (non-null) cells are stringified in one pass and appended to
+    the entries they belong to, with a newline only between parts. Rows
+    with no present values are dropped; the result keeps the row index.
+    """
+    entries = np.full(len(df), "", dtype=object)
+    started = np.zeros(len(df), dtype=bool)
+    columns = [(mc, f"{mc}: ") for mc in meta_columns] + [(cc, "") for cc in content_columns]
+    for column, prefix in columns:
+        values = df[column]
+        present = values.notna().to_numpy()
+        if not present.any():
+            continue
+        text = values[present].astype(str).to_numpy(dtype=object)
+        if prefix:
+            text = prefix + text
+        separator = np.where(started[present], "\n", "")
+        entries[present] = entries[present] + separator + text
+        started |= present
+    return pd.Series(entries[started], index=df.index[started], dtype=object)
+
+
+class _CsvRowSelector:
+    """Keep the best-ranked CSV entries that fit a character budget.
+
+    Every policy is expressed as a sort key per row; after each chunk the
+    kept entries and the new ones are sorted together and cut back to the
+    budget, so memory stays around one chunk plus max_chars of text. Rows
+    are formatted in rank order only until they fill the budget, and once
+    the budget is full, rows ranking below the last kept entry are dropped
+    without being formatted.
+
+    Policies:
+        first:      file order.
+        recent:     newest created_at/date first (rows without a parseable
+                    date last); without a date column, the last rows first.
+        priority:   highest priority first (urgent/critical, high, medium,
+                    low, or P0-P4 / numeric levels), then file order.
+        stratified: round-robin over category/status values in order of
+                    first appearance, file order within each.
+    """
+
+    def __init__(self, policy: str, columns, max_chars: int | None):
+        if policy not in _CSV_ROW_POLICIES:
+            raise ValueError(
+                f"Unknown CSV row selection {policy!r}; expected one of {', '.join(_CSV_ROW_POLICIES)}"
+            )
+        self.policy = policy
+        self.max_chars = max_chars
+        self.date_column = _find_column(columns, ("created_at", "date"))
+        self.priority_column = _find_column(columns, ("priority",))
+        self.strata_columns = [
+            c for c in (_find_column(columns, ("category",)), _find_column(columns, ("status",)))
+            if c is not None
+        ]
+        if policy == "priority" and self.priority_column is None:
+            self.policy = "first"
+        if policy == "stratified" and not self.strata_columns:
+            self.policy = "first"
+        self._stratum_order: dict = {}
+        self._stratum_seen: dict = {}
+        self._kept = None
+        self._full = False
+
+    def offer(self, chunk: pd.DataFrame, format_entries) -> bool:
+        """Consider a chunk of rows; True once no later row can be kept.
+
+        Args:
+            chunk: The next rows of the CSV, in file order.
+            format_entries: Maps a DataFrame of rows to a Series of entry
+                text indexed by row (rows without text omitted).
+        """
+        if chunk.empty:
+            return False
+        key, tiebreak = self._sort_keys(chunk)
+        if self._full:
+            last = self._kept.iloc[-1]
+            eligible = (key < last["key"]) | ((key == last["key"]) & (tiebreak < last["tiebreak"]))
+            if not eligible.any():
+                return False
+            chunk, key, tiebreak = chunk[eligible], key[eligible], tiebreak[eligible]
+
+        # Only the chunk's best-ranked rows can fit, so format in rank order
+        # and stop once they alone fill the budget
+        if self.policy != "first":  # "first" chunks are already in rank order
+            order = np.lexsort((tiebreak, key))
+            chunk, key, tiebreak = chunk.iloc[order], key[order], tiebreak[order]
+        step = len(chunk) if self.max_chars is None else _CSV_FORMAT_SLICE_ROWS
+        pieces, formatted_chars, start = [], 0, 0
+        while start < len(chunk):
+            piece = format_entries(chunk.iloc[start:start + step])
+            pieces.append(piece)
+            formatted_chars += piece.str.len().sum() + len(_CSV_ENTRY_SEPARATOR) * len(piece)
+            start += step
+            if self.max_chars is not None and formatted_chars > self.max_chars:
+                break
+        entries = pd.concat(pieces)
+        if entries.empty:
+            return False
+        selected = chunk.index.get_indexer(entries.index)
+        candidates = pd.DataFrame({
+            "entry": entries.to_numpy(dtype=object),
+            "cost": entries.str.len().to_numpy() + len(_CSV_ENTRY_SEPARATOR),
+            "key": key[selected],
+            "tiebreak": tiebreak[selected],
+        })
+        kept = candidates if self._kept is None else pd.concat([self._kept, candidates], ignore_index=True)
+        if self.policy != "first":
+            kept = kept.sort_values(["key", "tiebreak"], kind="stable", ignore_index=True)
+        if self.max_chars is None:
+            self._kept = kept
+            return False
+        # Keep every entry that starts within the budget
+        before = kept["cost"].cumsum().to_numpy() - kept["cost"].to_numpy()
+        self._kept = kept[before <= self.max_chars]
+        total = self._kept["cost"].sum() - len(_CSV_ENTRY_SEPARATOR)
+        self._full = total > self.max_chars
+        # Rows arrive in file order, so only "first" knows no later row can rank higher
+        return self.policy == "first" and self._full
+
+    def entries(self) -> list[str]:
+        return [] if self._kept is None else self._kept["entry"].tolist()
+
+    def _sort_keys(self, rows: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Return (key, tiebreak) arrays; rows sort ascending by both."""
+        position = rows.index.to_numpy(dtype=float)
+        if self.policy == "recent":
+            if self.date_column is None:
+                return -position, position
+            dates = _parse_dates(rows[self.date_column])
+            seconds = (dates - pd.Timestamp(0, tz="UTC")).dt.total_seconds()
+            return (-seconds).fillna(np.inf).to_numpy(dtype=float), position
+        if self.policy == "priority":
+            return _priority_rank(rows[self.priority_column]), position
+        if self.policy == "stratified":
+            return self._stratum_keys(rows)
+        return position, position
+
+    def _stratum_keys(self, rows: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Round-robin keys: position within the stratum, then stratum order."""
+        strata = rows[self.strata_columns[0]].astype(str)
+        for column in self.strata_columns[1:]:
+            strata = strata + "|" + rows[column].astype(str)
+        for value in strata.unique():
+            self._stratum_order.setdefault(value, len(self._stratum_order))
+        seen = strata.map(self._stratum_seen).fillna(0).to_numpy(dtype=float)
+        within = seen + strata.groupby(strata, sort=False).cumcount().to_numpy()
+        for value, count in strata.value_counts().items():
+            self._stratum_seen[value] = self._stratum_seen.get(value, 0) + count
+        return within, strata.map(self._stratum_order).to_numpy(dtype=float)
+
+
+_CSV_ENTRY_SEPARATOR = "\n\n---\n\n"
+_CSV_ROW_POLICIES = ("first", "recent", "priority", "stratified")
+_CSV_FORMAT_SLICE_ROWS = 256
+
+# Lower rank = more important; numeric "P2" / "2" style levels map onto the same scale
+_PRIORITY_RANKS = {
+    "urgent": 0, "critical": 0, "blocker": 0, "highest": 0,
+    "high": 1, "medium": 2, "normal": 2, "low": 3, "lowest": 4,
+}
+
+
+def _priority_rank(values: pd.Series) -> np.ndarray:
+    # Exports use a handful of distinct labels, so rank those rather than every cell
+    ranks = {}
+    for label in values.dropna().unique():
+        text = str(label).strip().lower()
+        match = re.fullmatch(r"p?(\d+)", text)
+        ranks[label] = _PRIORITY_RANKS.get(text, float(match.group(1)) if match else len(_PRIORITY_RANKS))
+    return values.map(ranks).fillna(len(_PRIORITY_RANKS)).to_numpy(dtype=float)
+
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """Parse a date column as UTC, unparseable values becoming NaT.
+
+    Tries a single inferred format first (fast) and falls back to parsing
+    each value separately for exports that mix formats.
+    """
+    try:
+        return pd.to_datetime(values, utc=True)
+    except (ValueError, TypeError):
+        return pd.to_datetime(values, errors="coerce", utc=True, format="mixed")
+
+
+def _find_column(columns, names: tuple) -> str | None:
+    """Return the first column whose lowercased name is in names."""
+    for col in columns:
+        if str(col).lower() in names:
+            return col
+    return None
@@ -0,0 +1,138 @@
+"""Producer/consumer pipeline: parse uploads while Level 2 is already running."""
+
+import queue
+import threading
+import time
+
+from config import PARSE_MAX_WORKERS
+from lib.models import Source
+from lib.parser import iter_parse_files
+
+_DONE = object()
+
+
+class ParsePipeline:
+    """Parse uploaded files on a background thread and stream the Sources.
+
+    Iterate over the pipeline (or pass it straight to Synthesizer.run) to
+    receive each Source as soon as it is parsed, so Level 2 batches can be
+    dispatched while later files are still being extracted. Per-file
+    failures are collected in ``errors`` the same way the app's
+    ``parse_errors`` were; ``sources`` holds everything parsed so far.
+
+    Call close() once the consumer is done, including when it stops
+    early (e.g. Level 2 failed): the producer stops, files not yet being
+    parsed are dropped and the parser processes shut down.
+    """
+
+    def __init__(
+        self,
+        uploaded_files: dict[str, list],
+        max_buffered: int = 64,
+        max_workers: int | None = PARSE_MAX_WORKERS,
+        parse_cache=None,
+    ):
+        """
+        Args:
+            uploaded_files: Category key -> list of UploadedFile objects,
+                as returned by render_upload_section().
+            max_buffered: Max parsed sources waiting for the consumer.
+            max_workers: Parser process pool size (None = one per CPU).
+            parse_cache: Optional ParseCache; unchanged uploads are served
+                from it instead of being parsed again.
+        """
+        self.uploaded_files = uploaded_files
+        self.max_workers = max_workers
+        self.parse_cache = parse_cache
+        self.timings: dict[str, float] = {}
+        self.sources: list[Source] = []
+        self.errors: list[str] = []
+
+        self._queue = queue.Queue(maxsize=max_buffered)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._started_at = None
+        self._producer_done_at = None
+        self._consumer_done_at = None
+        self._parse_busy = 0.0
+        self._consumer_wait = 0.0
+
+    def start(self) -> "ParsePipeline":
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stop parsing and wait for the producer thread to exit."""
+        self._stop.set()
+        # Unblock a producer waiting for room in a full queue
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _produce(self):
+        parsed = iter_parse_files(self.uploaded_files, self.max_workers, self.parse_cache)
+        try:
+            for _, source, error, seconds in parsed:
+                self._parse_busy += seconds
+                if error:
+                    self.errors.append(error)
+                    continue
+                self.timings[source.id] = seconds
+                if not self._put(source):
+                    break
+        except Exception as e:
+            self.errors.append(f"Parsing stopped: {e}")
+        finally:
+            # Shuts the process pool down, dropping files not started yet
+            parsed.close()
+            self._producer_done_at = time.perf_counter()
+            self._put(_DONE)
+
+    def _put(self, item) -> bool:
+        """Queue item, waiting for room; False once close() was called."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        self.start()
+        while True:
+            waited_from = time.perf_counter()
+            item = self._queue.get()
+            self._consumer_wait += time.perf_counter() - waited_from
+            if item is _DONE:
+                self._consumer_done_at = time.perf_counter()
+                return
+            self.sources.append(item)
+            yield item
+
+    def stats(self) -> dict:
+        """Per-stage timing for the parse side of the pipeline.
+
+        ``busy_seconds`` sums parse time over all worker processes, so
+        ``utilization`` (busy over wall time) can exceed 1.0 when files are
+        parsed in parallel. ``consumer_wait_seconds`` is how long the
+        consumer (Level 2 dispatch) sat idle waiting for parsed sources.
+        """
+        if self._started_at is None:
+            return {}
+        end = self._consumer_done_at or self._producer_done_at or time.perf_counter()
+        wall = max(end - self._started_at, 1e-9)
+        return {
+            "files": len(self.sources) + len(self.errors),
+            "busy_seconds": round(self._parse_busy, 3),
+            "wall_seconds": round(wall, 3),
+            "utilization": round(self._parse_busy / wall, 3),
+            "consumer_wait_seconds": round(self._consumer_wait, 3),
+            "per_file_seconds": {k: round(v, 3) for k, v in self.timings.items()},
+        }
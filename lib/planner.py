@@ -0,0 +1,262 @@
+"""Pre-flight run planning: expected calls, tokens, cost and time before any API call."""
+
+import heapq
+import math
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from functools import partial
+
+from config import (
+    CHARS_PER_TOKEN, MAX_CONCURRENT_REQUESTS, DEDUP_ENABLED, NORMALIZE_TRANSCRIPTS,
+    L3_SHARD_MAX_CHARS, L3_MERGE_FAN_IN, RATE_LIMIT_RPM, RATE_LIMIT_INPUT_TPM,
+    RATE_LIMIT_OUTPUT_TPM, PRICE_PER_MTOK, BULK_PRICE_FACTOR,
+    PROMPT_ENCODING, INSIGHT_CLUSTERING,
+)
+from lib.batching import (
+    plan_batches, plan_level_3_shards, estimate_input_tokens, estimate_output_tokens,
+)
+from lib.chunking import split_source, merge_chunk_insights
+from lib.clustering import cluster_insights
+from lib.dedup import NearDuplicateIndex
+from lib.models import Source
+from lib.normalize import TranscriptNormalizer
+from lib.prompts import (
+    LEVEL_2_SYSTEM, LEVEL_2_USER, LEVEL_3_SYSTEM, LEVEL_3_USER,
+    LEVEL_3_MERGE_SYSTEM, LEVEL_3_MERGE_USER, LEVEL_4_SYSTEM, LEVEL_4_USER, build_level_3_context,
+)
+from lib.tokens import TokenEstimator, get_estimator, level_3_encoding_key
+from lib.xml_builder import SourceIdTable, write_xml, iter_insights_xml, iter_level_3_insights
+
+
+@dataclass
+class StagePlan:
+    """Expected work for one level of the pyramid."""
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+    seconds: float | None = 0.0   # wall clock; None = not predictable (bulk jobs)
+
+
+@dataclass
+class RunPlan:
+    """Pre-flight estimate for a synthesis run (see plan_run)."""
+    sources: int = 0              # sources sent to Level 2, after dedup and chunking
+    batches: int = 0              # Level 2 requests
+    stages: dict[str, StagePlan] = field(default_factory=dict)
+    # "level_2" | "level_3" | "level_4" -> StagePlan
+    notes: list[str] = field(default_factory=list)
+
+    @property
+    def calls(self) -> int:
+        return sum(stage.calls for stage in self.stages.values())
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(stage.input_tokens for stage in self.stages.values())
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(stage.output_tokens for stage in self.stages.values())
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(stage.cost_usd for stage in self.stages.values())
+
+    @property
+    def seconds(self) -> float | None:
+        """Total wall clock, or None if a stage cannot be predicted."""
+        if any(stage.seconds is None for stage in self.stages.values()):
+            return None
+        return sum(stage.seconds for stage in self.stages.values())
+
+
+def plan_run(
+    sources: Iterable[Source],
+    estimator: TokenEstimator | None = None,
+    max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+    bulk: bool = False,
+    deduplicate: bool = DEDUP_ENABLED,
+    normalize: bool = NORMALIZE_TRANSCRIPTS,
+    insight_cache=None,
+    prompt_encoding: dict | None = None,
+    precluster: bool = INSIGHT_CLUSTERING,
+) -> RunPlan:
+    """Estimate a run's calls, tokens, cost and wall-clock time locally.
+
+    Sources go through the same preparation as Synthesizer.run (dedup,
+    normalization, chunking), cache lookup and Level 2 batch planner, so
+    the Level 2 figures follow the real batches. Level 3 input goes
+    through the same clustering, encoding and sharding as in
+    Synthesizer: cached insights are encoded exactly, the rest is scaled
+    from the expected Level 2 output by the estimator's calibrated
+    encoding size. Level 4 and all output use the calibrated output per
+    call.
+
+    Args:
+        sources: Parsed sources, as they would be passed to run().
+        estimator: TokenEstimator (default: the shared, calibrated one).
+        max_concurrency: Level 2 / Level 3 shard requests in flight.
+        bulk: Level 2 runs as a message batch job (half price, no
+            predictable wall clock).
+        deduplicate: Mirror Synthesizer's near-duplicate collapsing.
+        normalize: Mirror Synthesizer's transcript normalization.
+        insight_cache: Optional InsightCache; sources with a cached
+            insight skip Level 2, and their insights size Level 3.
+        prompt_encoding: Mirror Synthesizer's prompt_encoding.
+        precluster: Mirror Synthesizer's precluster.
+    """
+    estimator = estimator or get_estimator()
+    max_concurrency = max(1, max_concurrency)
+    plan = RunPlan()
+
+    prepared = list(sources)
+    if deduplicate:
+        index = NearDuplicateIndex()
+        prepared = [s for s in prepared if index.add(s) is None]
+        duplicates = index.stats()["duplicates"]
+        if duplicates:
+            plan.notes.append(f"{duplicates} near-duplicate sources will be skipped.")
+    if normalize:
+        prepared = list(map(TranscriptNormalizer().normalize_source, prepared))
+    chunks = [chunk for source in prepared for chunk in split_source(source)]
+    cached = {}
+    if insight_cache is not None:
+        for chunk in chunks:
+            insight = insight_cache.get_insight(chunk)
+            if insight is not None:
+                cached[chunk.id] = insight
+    if cached:
+        plan.notes.append(f"{len(cached)} sources have cached insights and skip Level 2.")
+    batches = plan_batches([c for c in chunks if c.id not in cached], estimator=estimator)
+    plan.sources = len(chunks)
+    plan.batches = len(batches)
+
+    # Level 2: one call per batch
+    prefix = estimator.count(LEVEL_2_SYSTEM + LEVEL_2_USER)
+    overhead = 20
+    level_2 = StagePlan()
+    durations = []
+    for batch in batches:
+        output = sum(estimate_output_tokens(s, estimator) for s in batch)
+        context = sum(estimate_input_tokens(s, estimator) for s in batch) + overhead
+        level_2.calls += 1
+        level_2.input_tokens += prefix + context
+        level_2.output_tokens += output
+        level_2.cost_usd += _cost(prefix + context, output)
+        durations.append(output * estimator.seconds_per_output_token)
+    if bulk:
+        level_2.cost_usd *= BULK_PRICE_FACTOR
+        level_2.seconds = None
+        plan.notes.append("Bulk jobs usually finish within an hour (at most 24 hours).")
+    else:
+        level_2.seconds = max(
+            _parallel_seconds(durations, max_concurrency),
+            _rate_limit_seconds(level_2),
+        )
+    plan.stages["level_2"] = level_2
+
+    # Level 3: one call per shard of the encoded insights
+    level_3 = StagePlan()
+    contexts = _level_3_contexts(
+        list(cached.values()), level_2.output_tokens, estimator,
+        {**PROMPT_ENCODING, **(prompt_encoding or {})}.get("level_3"), precluster,
+    )
+    shards = len(contexts)
+    per_call = estimator.call_output_tokens("level_3")
+    prefix = estimator.count(LEVEL_3_SYSTEM + LEVEL_3_USER)
+    corpus = estimator.count(build_level_3_context(len(prepared), Counter(s.category for s in prepared), ""))
+    for insights_tokens in contexts:
+        context = insights_tokens + corpus
+        level_3.calls += 1
+        level_3.input_tokens += prefix + context
+        level_3.output_tokens += per_call
+        level_3.cost_usd += _cost(prefix + context, per_call)
+    call_seconds = per_call * estimator.seconds_per_output_token
+    level_3.seconds = _parallel_seconds([call_seconds] * shards, max_concurrency)
+    if shards > 1:
+        plan.notes.append(f"Level 3 will be sharded into {shards} parts and merged.")
+        prefix = estimator.count(LEVEL_3_MERGE_SYSTEM + LEVEL_3_MERGE_USER)
+        remaining = shards
+        while remaining > 1:
+            merges = math.ceil(remaining / L3_MERGE_FAN_IN)
+            for _ in range(merges):
+                context = per_call * min(L3_MERGE_FAN_IN, remaining)
+                level_3.calls += 1
+                level_3.input_tokens += prefix + context
+                level_3.output_tokens += per_call
+                level_3.cost_usd += _cost(prefix + context, per_call)
+            level_3.seconds += _parallel_seconds([call_seconds] * merges, max_concurrency)
+            remaining = merges
+    plan.stages["level_3"] = level_3
+
+    # Level 4: one call over the merged patterns
+    per_call = estimator.call_output_tokens("level_4")
+    prefix = estimator.count(LEVEL_4_SYSTEM + LEVEL_4_USER)
+    context = estimator.call_output_tokens("level_3") + 500
+    plan.stages["level_4"] = StagePlan(
+        calls=1,
+        input_tokens=prefix + context,
+        output_tokens=per_call,
+        cost_usd=_cost(prefix + context, per_call),
+        seconds=per_call * estimator.seconds_per_output_token,
+    )
+    return plan
+
+
+def _level_3_contexts(
+    cached: list, pending_output_tokens: int, estimator: TokenEstimator,
+    encoding: str | None, precluster: bool,
+) -> list[int]:
+    """Estimated insight tokens of each Level 3 call (one per shard).
+
+    Cached insights are clustered, encoded and sharded exactly as
+    Synthesizer does; insights still to come from Level 2 are assumed to
+    take pending_output_tokens as plain XML, scaled by the encoding size
+    measured on the cached ones (or the estimator's calibrated scale).
+    """
+    encode = partial(iter_level_3_insights, ids=SourceIdTable(), compact=encoding == "compact", grouped=precluster)
+    known = merge_chunk_insights(cached)
+    items = cluster_insights(known) if precluster and known else known
+    if known:
+        scale = write_xml(encode(items)).chars / max(write_xml(iter_insights_xml(known)).chars, 1)
+    else:
+        scale = estimator.level_3_scale_for(level_3_encoding_key(encoding, precluster))
+    pending_tokens = int(pending_output_tokens * scale)
+    pending_chars = pending_tokens * CHARS_PER_TOKEN
+
+    known_chars = write_xml(encode(items)).chars if items else 0
+    if known_chars + pending_chars <= L3_SHARD_MAX_CHARS:
+        known_tokens = estimator.count("".join(encode(items))) if items else 0
+        return [known_tokens + pending_tokens]
+    contexts = [estimator.count("".join(encode(shard))) for shard in plan_level_3_shards(items, encode)]
+    if pending_tokens:
+        pending_shards = math.ceil(pending_chars / L3_SHARD_MAX_CHARS)
+        contexts += [pending_tokens // pending_shards] * pending_shards
+    return contexts
+
+
+def _cost(input_tokens: int, output_tokens: int) -> float:
+    """USD for one call."""
+    return (
+        input_tokens * PRICE_PER_MTOK["input"]
+        + output_tokens * PRICE_PER_MTOK["output"]
+    ) / 1_000_000
+
+
+def _parallel_seconds(durations: list[float], slots: int) -> float:
+    """Makespan of durations started in order on the first free of slots."""
+    finish = [0.0] * min(slots, max(len(durations), 1))
+    for seconds in durations:
+        heapq.heappush(finish, heapq.heappop(finish) + seconds)
+    return max(finish)
+
+
+def _rate_limit_seconds(stage: StagePlan) -> float:
+    """Lower bound on a stage's wall clock from the per-minute rate budgets."""
+    return 60 * max(
+        stage.calls / RATE_LIMIT_RPM,
+        stage.input_tokens / RATE_LIMIT_INPUT_TPM,
+        stage.output_tokens / RATE_LIMIT_OUTPUT_TPM,
+    )
@@ -1,4 +1,9 @@
-"""Claude prompt templates for each level of the data pyramid."""
+"""Claude prompt templates for each level of the data pyramid.
+
+Each level's user prompt is a template (``LEVEL_N_USER``) with a
+``{context}`` slot between the task and the output format, filled with the
+per-request block built by a ``build_level_N_context`` function.
+"""
 
 from config import INPUT_CATEGORIES
 
@@ -25,10 +30,12 @@ Analyze each source document below. For EACH source, extract:
 5. **Solution requests** — Specific feature or product asks mentioned. Note these but do NOT prioritize them over problems/JTBD.
 
 CRITICAL: Preserve the source ID exactly as given for every extraction.
+A source with a part attribute is one excerpt of a longer document; extract from that excerpt under its own ID.
+An entry that starts with a "similar_tickets: N" line stands for N similar support tickets. Give every problem and pain point drawn from such entries a "ticket_count": the sum of N over the entries it draws on. Omit ticket_count otherwise.
 If a source has no relevant content for a category, omit that category — do not fabricate.
 </task>
 
-{sources_xml}
+{context}
 
 <output_format>
 Respond ONLY with valid JSON. No markdown code fences, no other text before or after.
@@ -64,6 +71,11 @@ Respond ONLY with valid JSON. No markdown code fences, no other text before or a
 </output_format>"""
 
 
+def build_level_2_context(sources_xml: str) -> str:
+    """Build the per-batch part of the Level 2 prompt."""
+    return sources_xml
+
+
 # ---------------------------------------------------------------------------
 # Level 3: Pattern Synthesis — find cross-source patterns
 # ---------------------------------------------------------------------------
@@ -78,21 +90,9 @@ categories — this signals a systemic issue, not an isolated complaint.
 You weight sources by their importance to strategic decisions."""
 
 
-def build_level_3_user(source_count: int, category_counts: dict) -> str:
-    """Build the Level 3 user prompt with dynamic source counts."""
-    breakdown_lines = []
-    for cat_key, cat_info in INPUT_CATEGORIES.items():
-        count = category_counts.get(cat_key, 0)
-        breakdown_lines.append(
-            f"- {cat_info['label']} (weight: {cat_info['weight']}x) — {count} sources"
-        )
-    breakdown = "\n".join(breakdown_lines)
-
-    return f"""<task>
-You have categorized insights from {source_count} sources across these
-categories (with importance weights):
-
-{breakdown}
+LEVEL_3_USER = """<task>
+You have categorized insights from the sources summarized in <corpus> below,
+across categories with different importance weights.
 
 Identify PATTERNS: problems, needs, or themes that appear across MULTIPLE
 sources. The most powerful signal is when a pattern spans multiple
@@ -101,24 +101,31 @@ the same friction).
 
 For each pattern:
 1. Give it a clear, descriptive name
-2. Count how many sources mention it (frequency)
-3. Calculate weighted_score = sum of weights of all sources mentioning it
-4. Assess severity (high/medium/low)
-5. Describe business impact (revenue, churn, efficiency, etc.)
-6. Flag if it's a cross-org signal (appears in 2+ categories)
-7. List all evidence with source IDs and quotes
+2. Assess severity (high/medium/low)
+3. Describe business impact (revenue, churn, efficiency, etc.)
+4. List all evidence with source IDs and quotes. When a cited problem or
+   pain point stands for several support tickets (a tickets count), give
+   that count as "tickets".
+
+Cite EVERY source that mentions the pattern: frequency, weighted score and
+the category breakdown are computed from your evidence.
+
+Insights may come pre-grouped: an item with a group id (e.g. G3) stands for
+near-identical items from all of the sources listed with it (mentions = how
+many items; "+N" / "+N more" counts sources not listed). Cite the group id
+as an evidence source_id to cite all of its sources at once.
 
 Prioritize patterns that:
 - Appear in MULTIPLE categories (cross-org = strongest signal)
-- Have high weighted scores
+- Are mentioned by many sources, especially heavily weighted ones
 - Show high severity across sources
 
 List ALL patterns, even those in only 2-3 sources.
 
-IMPORTANT: Only identify patterns that are directly supported by the extracted insights above. Do not infer patterns beyond what the evidence shows. Every source_id in your evidence must correspond to an actual source from the input. Do not fabricate quotes — paraphrase if you cannot recall the exact wording. If a pattern has weak evidence, reflect that honestly in the severity and frequency.
+IMPORTANT: Only identify patterns that are directly supported by the extracted insights below. Do not infer patterns beyond what the evidence shows. Every source_id in your evidence must correspond to an actual source from the input. Do not fabricate quotes — paraphrase if you cannot recall the exact wording. If a pattern has weak evidence, reflect that honestly in the severity.
 </task>
 
-{{insights_xml}}
+{context}
 
 <output_format>
 Respond ONLY with valid JSON. No markdown code fences, no other text before or after.
@@ -127,31 +134,85 @@ Respond ONLY with valid JSON. No markdown code fences, no other text before or a
   {{
     "name": "Short descriptive name",
     "description": "What this pattern represents",
-    "frequency": 5,
-    "weighted_score": 12.5,
     "severity": "high|medium|low",
     "business_impact": "Revenue/churn/efficiency impact",
-    "cross_org_signal": true,
     "evidence": [
       {{
         "source_id": "...",
-        "category": "...",
-        "weight": 3.0,
         "quote": "Quote or summary from this source"
       }}
-    ],
-    "source_breakdown": {{
-      "customer_calls": 2,
-      "internal_meetings": 1,
-      "support_tickets": 1,
-      "other_sources": 1,
-      "miscellaneous": 0
-    }}
+    ]
+  }}
+]
+</output_format>"""
+
+
+def build_level_3_context(source_count: int, category_counts: dict, insights_xml: str) -> str:
+    """Build the per-request part of the Level 3 prompt with dynamic source counts."""
+    breakdown_lines = []
+    for cat_key, cat_info in INPUT_CATEGORIES.items():
+        count = category_counts.get(cat_key, 0)
+        breakdown_lines.append(
+            f"- {cat_info['label']} (weight: {cat_info['weight']}x) — {count} sources"
+        )
+    breakdown = "\n".join(breakdown_lines)
+
+    return f"""<corpus>
+Categorized insights from {source_count} sources across these categories
+(with importance weights):
+
+{breakdown}
+</corpus>
+
+{insights_xml}"""
+
+
+LEVEL_3_MERGE_SYSTEM = """You are a senior product strategist consolidating pattern
+analyses that were produced independently over different slices of the same
+corpus. The same underlying pattern is often reported several times under
+different names. You merge duplicates faithfully and never invent new
+patterns or evidence."""
+
+
+LEVEL_3_MERGE_USER = """<task>
+Below are candidate patterns, each with an index. They were found in
+separate slices of the corpus, so the same pattern may appear more than
+once with different wording.
+
+Group candidates that describe the SAME underlying problem, need, or theme.
+For each group:
+1. Give it a clear, descriptive name
+2. Write a description that covers all members
+3. Assess severity (high/medium/low) across all members
+4. Describe business impact (revenue, churn, efficiency, etc.)
+5. List the indices of every member candidate
+
+A candidate with no duplicates forms a group of one. Every index must appear
+in exactly one group. Do not split a candidate across groups.
+</task>
+
+{context}
+
+<output_format>
+Respond ONLY with valid JSON. No markdown code fences, no other text before or after.
+
+[
+  {{
+    "name": "Short descriptive name",
+    "description": "What this pattern represents",
+    "severity": "high|medium|low",
+    "business_impact": "Revenue/churn/efficiency impact",
+    "members": [0, 4, 9]
   }}
 ]
 </output_format>"""
 
 
+def build_level_3_merge_context(patterns_xml: str) -> str:
+    """Build the per-request part of the Level 3 merge (reduce) prompt."""
+    return patterns_xml
+
+
 # ---------------------------------------------------------------------------
 # Level 4: Opportunity Mapping — build the OST
 # ---------------------------------------------------------------------------
@@ -168,27 +229,9 @@ Key principle: Opportunities represent problem/need spaces — NOT solutions.
 Solutions are options to explore within each opportunity space."""
 
 
-def build_level_4_user(source_count: int, desired_outcomes: list[str]) -> str:
-    """Build the Level 4 user prompt with optional desired outcomes."""
-    if desired_outcomes:
-        outcomes_section = (
-            "Map opportunities to these user-specified desired outcomes:\n"
-            + "\n".join(f"- {o}" for o in desired_outcomes)
-            + "\n\nYou may also identify additional outcomes if strongly supported by the data."
-        )
-    else:
-        outcomes_section = (
-            "Infer 2-4 desired outcomes from the strongest patterns. "
-            "These should be strategic goals that the evidence supports, "
-            "stated as measurable outcomes (e.g., 'Reduce customer onboarding time by 50%')."
-        )
-
-    return f"""<task>
-Using the patterns identified across {source_count} sources, create an
-Opportunity Solution Tree.
-
-**Desired Outcomes:**
-{outcomes_section}
+LEVEL_4_USER = """<task>
+Using the patterns identified across the sources, create an Opportunity
+Solution Tree for the desired outcomes given in <desired_outcomes> below.
 
 For EACH desired outcome:
 1. Group related patterns into OPPORTUNITY SPACES (problem/need clusters)
@@ -206,55 +249,81 @@ the same thing — fixing this one area has outsized impact."
 IMPORTANT: Every claim, problem, and solution must be traceable to specific sources from the input. Do not introduce information not present in the patterns. If evidence is thin for an opportunity, assign LOW confidence rather than fabricating supporting detail. Source counts in source_breakdown must reflect actual sources — do not count multiple mentions within a single source as separate sources.
 </task>
 
-{{patterns_xml}}
+{context}
 
 <output_format>
 Respond ONLY with valid JSON. No markdown, no code fences, no other text.
 
-{{{{
+{{
   "desired_outcomes": [
-    {{{{
+    {{
       "statement": "Measurable outcome statement",
       "opportunities": [
-        {{{{
+        {{
           "name": "Opportunity Space Name",
           "description": "What problem/need space this represents",
           "evidence_strength": "HIGH|MEDIUM|LOW",
           "weighted_score": 12.5,
           "source_count": 8,
-          "source_breakdown": {{{{
+          "source_breakdown": {{
             "customer_calls": 3,
             "internal_meetings": 2,
             "support_tickets": 2,
             "other_sources": 1,
             "miscellaneous": 0
-          }}}},
+          }},
           "problems": [
-            {{{{"description": "...", "source_id": "...", "severity": "high"}}}}
+            {{"description": "...", "source_id": "...", "severity": "high"}}
           ],
           "jobs_to_be_done": ["When..., I want..., so I can..."],
           "solutions": [
-            {{{{
+            {{
               "name": "Solution name",
               "description": "What this solution does",
               "expected_impact": "Quantified if possible",
               "effort": "HIGH|MEDIUM|LOW",
               "evidence_sources": ["source_id_1", "source_id_2"]
-            }}}}
+            }}
           ],
           "next_steps": ["Interview X customers about...", "Prototype Y..."],
           "contributing_patterns": ["pattern_name_1", "pattern_name_2"]
-        }}}}
+        }}
       ]
-    }}}}
+    }}
   ],
   "cross_cutting_themes": [
-    {{{{
+    {{
       "name": "Theme name",
       "description": "What this theme represents",
       "source_percentage": 45,
-      "category_breakdown": {{{{"customer_calls": 5, "internal_meetings": 3}}}}
-    }}}}
+      "category_breakdown": {{"customer_calls": 5, "internal_meetings": 3}}
+    }}
   ]
-}}}}
+}}
 </output_format>"""
+
+
+def build_level_4_context(
+    source_count: int, desired_outcomes: list[str], patterns_xml: str
+) -> str:
+    """Build the per-request part of the Level 4 prompt with optional desired outcomes."""
+    if desired_outcomes:
+        outcomes_section = (
+            "Map opportunities to these user-specified desired outcomes:\n"
+            + "\n".join(f"- {o}" for o in desired_outcomes)
+            + "\n\nYou may also identify additional outcomes if strongly supported by the data."
+        )
+    else:
+        outcomes_section = (
+            "Infer 2-4 desired outcomes from the strongest patterns. "
+            "These should be strategic goals that the evidence supports, "
+            "stated as measurable outcomes (e.g., 'Reduce customer onboarding time by 50%')."
+        )
+
+    return f"""<desired_outcomes>
+Patterns were identified across {source_count} sources.
+
+{outcomes_section}
+</desired_outcomes>
+
+{patterns_xml}"""
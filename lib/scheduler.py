@@ -0,0 +1,162 @@
+"""Rate-limited, retrying scheduler for every Claude API call."""
+
+import random
+import threading
+import time
+
+import anthropic
+
+from config import (
+    RATE_LIMIT_RPM, RATE_LIMIT_INPUT_TPM, RATE_LIMIT_OUTPUT_TPM,
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+)
+
+# HTTP statuses worth retrying: timeout, conflict, rate limit, server errors
+# (including 529 overloaded).
+_RETRYABLE_STATUS = {408, 409, 429}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute.
+
+    A request larger than the bucket's capacity waits for a full bucket
+    instead of waiting forever. debit() may take the level below zero,
+    which delays the next acquire (even of 0 tokens) until the overdraft
+    is paid back.
+    """
+
+    def __init__(self, rate_per_minute: float, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self._level = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float):
+        """Block until amount tokens are available, then take them."""
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._level >= amount:
+                    self._level -= amount
+                    return
+                wait = (amount - self._level) / self.rate
+            self._sleep(wait)
+
+    def debit(self, amount: float):
+        """Take tokens without waiting (e.g. actual usage reported afterwards).
+
+        A negative amount returns tokens, up to the bucket's capacity.
+        """
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level - amount)
+
+
+class RequestScheduler:
+    """Owns all Claude calls: rate budgets plus retry with backoff.
+
+    Requests-per-minute, input-tokens-per-minute and output-tokens-per-minute
+    budgets are acquired before each attempt, the output budget for the
+    call's estimated output; once the response reports its actual output
+    tokens the difference is settled, so an overdraft holds back the
+    next call. Retryable failures (429, 5xx/529,
+    timeouts, connection errors) are retried with exponential backoff and
+    full jitter, honoring the server's retry-after header when present.
+    Each call is one Level 2 batch or one Level 3/4 request, so a retry
+    only repeats that request.
+
+    Share one scheduler between Synthesizers that use the same API key so
+    the budgets cover all of them.
+    """
+
+    def __init__(
+        self,
+        rpm: float = RATE_LIMIT_RPM,
+        input_tpm: float = RATE_LIMIT_INPUT_TPM,
+        output_tpm: float = RATE_LIMIT_OUTPUT_TPM,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.requests = TokenBucket(rpm, clock, sleep)
+        self.input_tokens = TokenBucket(input_tpm, clock, sleep)
+        self.output_tokens = TokenBucket(output_tpm, clock, sleep)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.retries = 0
+
+    def call(self, fn, estimated_input_tokens: int, estimated_output_tokens: int = 0):
+        """Run fn() under the rate budgets, retrying transient failures.
+
+        fn should perform exactly one API request and return its response;
+        if the response has ``usage.output_tokens`` the output budget is
+        charged that instead of estimated_output_tokens.
+        """
+        for attempt in range(self.max_attempts):
+            self.requests.acquire(1)
+            self.input_tokens.acquire(estimated_input_tokens)
+            self.output_tokens.acquire(estimated_output_tokens)
+            try:
+                response = fn()
+            except Exception as e:
+                self.output_tokens.debit(-estimated_output_tokens)
+                if attempt + 1 >= self.max_attempts or not self.is_retryable(e):
+                    raise
+                with self._lock:
+                    self.retries += 1
+                self._sleep(self.retry_delay(e, attempt))
+                continue
+
+            usage = getattr(response, "usage", None)
+            output = getattr(usage, "output_tokens", None)
+            if output is not None:
+                self.output_tokens.debit(output - estimated_output_tokens)
+            return response
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        if isinstance(error, anthropic.APIConnectionError):  # includes timeouts
+            return True
+        if isinstance(error, anthropic.APIStatusError):
+            return error.status_code in _RETRYABLE_STATUS or error.status_code >= 500
+        return False
+
+    def retry_delay(self, error: Exception, attempt: int) -> float:
+        """Seconds to wait before the next attempt.
+
+        Uses the server's retry-after (seconds) or retry-after-ms header
+        when present, otherwise exponential backoff with full jitter.
+        """
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def _retry_after_seconds(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
@@ -0,0 +1,162 @@
+"""Local pattern metrics, computed from the evidence a pattern cites.
+
+Level 3 names patterns and cites sources; frequency, weighted score,
+cross-org signal and the category breakdown are derived here from that
+evidence and the sources' own categories and weights, so they always
+agree with what is cited and are the same on every run. Support ticket
+counts likewise come from the cluster sizes recorded when a ticket export
+was parsed (resolve_tickets), not from Claude's output.
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from config import INPUT_CATEGORIES
+from lib.models import Source
+
+
+def evidence_source(entry: dict, sources_by_id: dict[str, Source]) -> tuple[str, float]:
+    """Category and weight of the source an evidence entry cites.
+
+    Taken from the Source when known, otherwise from the entry itself
+    (or its category's weight).
+    """
+    source = sources_by_id.get(entry.get("source_id", ""))
+    if source is not None:
+        return source.category, float(source.weight)
+    category = entry.get("category") or "miscellaneous"
+    try:
+        weight = float(entry.get("weight") or INPUT_CATEGORIES.get(category, {}).get("weight", 1.0))
+    except (TypeError, ValueError):
+        weight = 1.0
+    return category, weight
+
+
+def pattern_metrics(evidence: list, sources_by_id: dict[str, Source]) -> dict:
+    """Frequency, weighted score, cross-org flag and category breakdown of a pattern.
+
+    Every distinct cited source counts once towards frequency and
+    weighted_score, or as many times as the support tickets it stands for
+    (an entry's "tickets", the largest if the source is cited more than
+    once); the breakdown counts distinct sources. An entry for a group
+    (with "sources", and "source_tickets" per source) counts each of its
+    sources. With sources_by_id, ids not among them are left out.
+
+    Args:
+        evidence: The pattern's evidence entries ({"source_id", ...}).
+        sources_by_id: Sources of the run by id (may be empty).
+
+    Returns:
+        Pattern keyword arguments: frequency, weighted_score,
+        cross_org_signal and source_categories (in order of first citation).
+    """
+    cited = [
+        (source_id, tickets, cited_as)
+        for e in evidence if isinstance(e, dict)
+        for source_id, tickets, cited_as in _cited_sources(e)
+        if source_id and (not sources_by_id or source_id in sources_by_id)
+    ]
+    if not cited:
+        return {"frequency": 0, "weighted_score": 0.0, "cross_org_signal": False, "source_categories": {}}
+
+    ids, first, inverse = np.unique(
+        [source_id for source_id, _, _ in cited], return_index=True, return_inverse=True
+    )
+    counts = np.ones(len(ids), dtype=np.int64)
+    np.maximum.at(counts, inverse, [tickets for _, tickets, _ in cited])
+
+    categories, weights = zip(*(
+        evidence_source(cited[i][2], sources_by_id) for i in first.tolist()
+    ))
+    names, codes = np.unique(categories, return_inverse=True)
+    per_category = np.bincount(codes, minlength=len(names))
+    first_cited = np.full(len(names), len(cited))
+    np.minimum.at(first_cited, codes, first)
+
+    return {
+        "frequency": int(counts.sum()),
+        "weighted_score": float(np.dot(np.asarray(weights, dtype=np.float64), counts)),
+        "cross_org_signal": len(names) >= 2,
+        "source_categories": {
+            str(names[c]): int(per_category[c]) for c in np.argsort(first_cited, kind="stable").tolist()
+        },
+    }
+
+
+def resolve_tickets(source: Source | None, quotes: list, claimed) -> tuple[int | None, bool]:
+    """Support tickets a citation of source stands for, and whether Claude's figure was used.
+
+    Clustered ticket exports (lib/parser._parse_ticket_csv) hold one entry
+    per cluster, headed "similar_tickets: N" with the cluster size counted
+    at parse time. The count is the summed N of the entries that contain
+    any of the quotes. Only when no entry matches (a paraphrase, a source
+    without clusters) does it fall back to claimed, the count Claude
+    reported, capped at the tickets the source represents; the second
+    value is then True.
+
+    Returns:
+        (tickets or None for a plain citation, estimated)
+    """
+    entries = _ticket_entries(source.content) if source is not None else ()
+    if entries:
+        keys = [key for key in map(_quote_key, quotes) if key]
+        matched = [size for size, text in entries if any(key in text for key in keys)]
+        if matched:
+            return sum(matched), False
+    if not claimed and not entries:
+        return None, False
+    tickets = _tickets(claimed)
+    represented = source.metadata.get("tickets_represented") if source is not None else None
+    if represented:
+        tickets = min(tickets, int(represented))
+    return tickets, True
+
+
+def _cited_sources(entry: dict):
+    """(source_id, tickets, entry for evidence_source) per source an evidence entry cites."""
+    if not entry.get("sources"):
+        yield entry.get("source_id"), _tickets(entry.get("tickets")), entry
+        return
+    # Without Sources, a group's members fall back to the representative's
+    # category (and that category's weight)
+    tickets = entry.get("source_tickets") or {}
+    for source_id in entry["sources"]:
+        member = {"source_id": source_id, "category": entry.get("category")}
+        yield source_id, _tickets(tickets.get(source_id)), member
+
+
+def _tickets(value) -> int:
+    """Support tickets a citation stands for (at least 1)."""
+    try:
+        return max(int(value or 1), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+_TICKET_ENTRY = re.compile(r"^similar_tickets: (\d+)$", re.MULTILINE)
+# Shorter quotes match too many ticket entries to attribute them
+_MIN_QUOTE_CHARS = 12
+
+
+@lru_cache(maxsize=32)
+def _ticket_entries(content: str) -> tuple[tuple[int, str], ...]:
+    """(cluster size, normalized text) of each "similar_tickets: N" entry in content."""
+    heads = list(_TICKET_ENTRY.finditer(content))
+    ends = [head.start() for head in heads[1:]] + [len(content)]
+    return tuple(
+        (int(head.group(1)), _normalize(content[head.end():end]))
+        for head, end in zip(heads, ends)
+    )
+
+
+def _quote_key(quote) -> str:
+    """Longest part of a quote between ellipses, normalized, if long enough to look up."""
+    parts = re.split(r"\.\.\.|\u2026", str(quote or ""))
+    key = max((_normalize(part).strip(" \"'\u201c\u201d\u2018\u2019.,") for part in parts), key=len)
+    return key if len(key) >= _MIN_QUOTE_CHARS else ""
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
@@ -0,0 +1,82 @@
+"""Incremental parsing of streamed JSON arrays from Claude."""
+
+import json
+
+
+class JsonArrayStreamParser:
+    """Parse a top-level JSON array of objects as text arrives.
+
+    Feed text chunks in order; each call returns the array elements that
+    were completed by that chunk. Anything before the opening ``[`` (such
+    as a stray markdown fence) is ignored, as is anything after the
+    closing ``]``.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._started = False
+        self._buffer = ""      # text of the element in progress
+        self._pos = 0          # next unscanned index in _buffer
+        self._depth = 0        # nesting depth inside the current element
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> list:
+        """Consume a chunk of text and return any newly completed elements."""
+        if self.done:
+            return []
+
+        if not self._started:
+            start = text.find("[")
+            if start == -1:
+                return []
+            self._started = True
+            text = text[start + 1:]
+
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if self._depth == 0:
+                # Between elements: skip separators until the next value
+                if ch in "{[":
+                    buffer = buffer[i:]
+                    i = 0
+                    self._depth = 1
+                elif ch == "]":
+                    self.done = True
+                    buffer = ""
+                    i = 0
+                    break
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(json.loads(buffer[: i + 1]))
+                    buffer = buffer[i + 1:]
+                    i = 0
+                    continue
+            i += 1
+
+        if self._depth == 0:
+            # Nothing in progress; drop scanned separators
+            buffer = buffer[i:]
+            i = 0
+        self._buffer = buffer
+        self._pos = i
+        return completed
@@ -1,52 +1,227 @@
 """Core synthesis engine: runs the 4-level data pyramid via Claude API."""
 
+import io
 import json
+import queue
 import re
+import threading
+import time
+from collections.abc import Iterable
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import anthropic
 
-from config import MODEL_ID, MAX_TOKENS_OUTPUT, INPUT_CATEGORIES, MAX_TOTAL_CHARS
+from config import (
+    MODEL_ID, MAX_TOKENS_OUTPUT, INPUT_CATEGORIES, MAX_TOTAL_CHARS,
+    MAX_CONCURRENT_REQUESTS, L3_SHARD_MAX_CHARS, L3_MERGE_FAN_IN,
+    STREAM_LEVEL_2, BULK_POLL_INTERVAL, BULK_MAX_WAIT_SECONDS, BULK_MAX_JOB_BYTES, DEDUP_ENABLED,
+    NORMALIZE_TRANSCRIPTS, PROMPT_ENCODING, INSIGHT_CLUSTERING,
+)
 from lib.models import (
-    Source, ExtractedInsight, Pattern, Opportunity,
+    Source, ExtractedInsight, InsightCluster, Pattern, Opportunity,
     DesiredOutcome, CrossCuttingTheme, OSTResult,
 )
-from lib.xml_builder import build_sources_xml, build_insights_xml, build_patterns_xml
+from lib.batching import BatchPlanner, estimate_output_tokens, plan_level_3_shards
+from lib.cache import InsightCache
+from lib.checkpoint import sources_fingerprint
+from lib.chunking import split_source, merge_chunk_insights
+from lib.clustering import cluster_insights
+from lib.dedup import NearDuplicateIndex
+from lib.normalize import TranscriptNormalizer
+from lib.scheduler import RequestScheduler
+from lib.scoring import evidence_source, pattern_metrics, resolve_tickets
+from lib.streaming import JsonArrayStreamParser
+from lib.tokens import get_estimator, level_3_encoding_key
+from lib.xml_builder import (
+    SizedWriter, write_xml, iter_sources_xml, iter_insights_xml, iter_patterns_xml,
+    SourceIdTable, iter_patterns_compact, iter_level_3_insights,
+)
 from lib.prompts import (
-    LEVEL_2_SYSTEM, LEVEL_2_USER,
-    LEVEL_3_SYSTEM, build_level_3_user,
-    LEVEL_4_SYSTEM, build_level_4_user,
+    LEVEL_2_SYSTEM, LEVEL_2_USER, build_level_2_context,
+    LEVEL_3_SYSTEM, LEVEL_3_USER, build_level_3_context,
+    LEVEL_3_MERGE_SYSTEM, LEVEL_3_MERGE_USER, build_level_3_merge_context,
+    LEVEL_4_SYSTEM, LEVEL_4_USER, build_level_4_context,
 )
 
 
+# response.usage fields accumulated per run and reported in OSTResult.api_usage
+_USAGE_FIELDS = ("input_tokens", "output_tokens")
+
+
 class SynthesisError(Exception):
     """Raised when synthesis fails at any level."""
 
 
+class TruncatedResponseError(SynthesisError):
+    """Raised when Claude's response hit the max_tokens limit."""
+
+
+class StreamInterruptedError(SynthesisError):
+    """Raised when a stream fails after output started (not safely retryable)."""
+
+
 class Synthesizer:
     """Orchestrates the 4-level data pyramid synthesis pipeline."""
 
-    def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        client=None,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        insight_cache=None,
+        stream: bool = STREAM_LEVEL_2,
+        checkpoints=None,
+        scheduler=None,
+        bulk_backend=None,
+        bulk_poll_interval: float = BULK_POLL_INTERVAL,
+        deduplicate: bool = DEDUP_ENABLED,
+        normalize: bool = NORMALIZE_TRANSCRIPTS,
+        token_estimator=None,
+        prompt_encoding: dict | None = None,
+        precluster: bool = INSIGHT_CLUSTERING,
+    ):
+        """
+        Args:
+            api_key: Anthropic API key.
+            client: Optional pre-built client exposing ``messages.create``
+                (used to inject a fake client in tests).
+            max_concurrency: Max Level 2 batches sent to Claude at once.
+                1 = sequential.
+            insight_cache: Optional InsightCache. Sources with a cached
+                Level 2 insight are not sent to Claude.
+            stream: Stream Level 2 responses (client must support
+                ``messages.stream``) so insights arrive per source.
+            checkpoints: Optional CheckpointStore. Completed Level 2
+                batches and levels are persisted so a failed run can be
+                resumed with run(..., resume_run_id=...).
+            scheduler: Optional RequestScheduler owning rate budgets and
+                retries; share one across Synthesizers using the same key.
+            bulk_backend: Optional BatchBackend. When set, all Level 2
+                batches are submitted as one message batch job (offline
+                bulk mode: higher throughput and lower cost, no
+                interactive latency) before Levels 3 and 4 run as usual.
+            bulk_poll_interval: Seconds between bulk job status checks.
+            deduplicate: Collapse near-duplicate sources before Level 2;
+                only the first copy is synthesized and the clusters are
+                reported in ``sources_summary["dedup"]``.
+            normalize: Strip line-level transcript noise (timestamp
+                lines, join/leave lines, repeated speaker labels) before
+                Level 2;
+                savings are reported in ``sources_summary["normalization"]``.
+            token_estimator: TokenEstimator used for batching and rate
+                budgets, calibrated from every response's usage and saved
+                after each stage (default: the shared estimator).
+            prompt_encoding: Level -> "xml" or "compact", how insights
+                and patterns are written into Level 3 and 4 prompts
+                (default: PROMPT_ENCODING). Short source ids cited in
+                compact prompts are mapped back when parsing.
+            precluster: Group near-identical Level 2 items locally before
+                Level 3, which then sees one representative per group with
+                its sources; counts are reported in
+                ``sources_summary["insight_clusters"]``.
+        """
+        # Retries are the scheduler's job, not the SDK's
+        self.client = client or anthropic.Anthropic(api_key=api_key, max_retries=0)
+        self.scheduler = scheduler or RequestScheduler()
+        self.bulk_backend = bulk_backend
+        self.bulk_poll_interval = bulk_poll_interval
+        self.max_concurrency = max(1, max_concurrency)
+        self.insight_cache = insight_cache
+        self.stream = stream
+        self.checkpoints = checkpoints
+        self.deduplicate = deduplicate
+        self.normalize = normalize
+        self.token_estimator = token_estimator or get_estimator()
+        self.prompt_encoding = {**PROMPT_ENCODING, **(prompt_encoding or {})}
+        self.precluster = precluster
+        self._ids = SourceIdTable()
+        self._groups: dict[str, InsightCluster] = {}
+        self._sources_by_id: dict[str, Source] = {}
+        self.run_id = ""
+        self._resumed_batches = {}
+
+        # Per-run progress state. Callbacks always fire on the thread that
+        # called run(); worker threads queue them in _events.
+        self._insight_callback = None
+        self._caller_ident = threading.get_ident()
+        self._events = queue.Queue()
+        self._progress_lock = threading.Lock()
+        self._l2_done = 0
+        self._l2_total = 0
+        self._usage = {}
+        self._stage = None
+        self._stage_stats = {}
+        self._dedup = None
+        self._normalizer = None
 
     def run(
         self,
-        sources: list[Source],
+        sources: Iterable[Source],
         desired_outcomes: list[str],
         progress_callback=None,
+        insight_callback=None,
+        resume_run_id: str | None = None,
     ) -> OSTResult:
         """Execute the full 4-level synthesis pipeline.
 
         Args:
-            sources: Parsed Source objects from all categories.
+            sources: Parsed Source objects from all categories. May be any
+                iterable (e.g. a ParsePipeline); Level 2 batches are
+                dispatched as soon as enough sources have arrived.
             desired_outcomes: User-specified outcomes (empty = AI derives).
             progress_callback: Optional fn(stage: str, percent: int) for UI.
+            insight_callback: Optional fn(insight: ExtractedInsight,
+                done: int, total: int), fired as each source's Level 2
+                insight arrives.
+            resume_run_id: Run id of an earlier, failed run. Completed
+                levels and Level 2 batches from its checkpoints are reused
+                (requires a CheckpointStore). The id of the current run is
+                available as ``self.run_id`` even if run() raises.
 
         Returns:
             Complete OSTResult ready for visualization and report generation.
         """
+        self._caller_ident = threading.get_ident()
+        self._insight_callback = insight_callback
+        self._usage = {"calls": 0, **{name: 0 for name in _USAGE_FIELDS}}
+        self._stage_stats = {}
+        self._ids = SourceIdTable()
+        self._groups = {}
+        self._sources_by_id = {}
+
         if progress_callback:
             progress_callback("Loading and structuring sources...", 5)
 
+        resuming = self._start_checkpointed_run(resume_run_id)
+
+        # Near-duplicates are dropped and transcripts normalized as sources
+        # arrive, ahead of Level 2
+        self._dedup = NearDuplicateIndex() if self.deduplicate else None
+        if self._dedup is not None:
+            sources = self._drop_near_duplicates(sources)
+        self._normalizer = TranscriptNormalizer() if self.normalize else None
+        if self._normalizer is not None:
+            sources = map(self._normalizer.normalize_source, sources)
+
+        # Level 2: Categorization (consumes sources as they arrive)
+        if progress_callback:
+            progress_callback("Categorizing content from each source...", 10)
+        insights = None
+        if resuming and self.checkpoints.has_level(self.run_id, "level_2"):
+            sources = list(sources)
+            insights = self.checkpoints.load_insights(self.run_id, sources_fingerprint(sources))
+        if insights is None:
+            received: list[Source] = []
+            with self._timed_stage("level_2"):
+                chunks = self._split_long_sources(self._collect(sources, received))
+                insights = merge_chunk_insights(self._categorize(chunks))
+            sources = received
+            if sources and self.checkpoints is not None:
+                self.checkpoints.save_insights(self.run_id, sources_fingerprint(sources), insights)
+        if not sources:
+            raise SynthesisError("No sources to synthesize.")
+
         # Build source summary
         category_counts = {}
         for s in sources:
@@ -62,74 +237,572 @@ class Synthesizer:
                 for cat, info in INPUT_CATEGORIES.items()
             },
         }
-
-        # Level 2: Categorization
-        if progress_callback:
-            progress_callback("Categorizing content from each source...", 10)
-        insights = self._categorize(sources)
+        if self._dedup is not None:
+            sources_summary["dedup"] = self._dedup.stats()
+        if self._normalizer is not None:
+            sources_summary["normalization"] = self._normalizer.stats()
+        clustered = [s.metadata for s in sources if s.metadata.get("ticket_clusters")]
+        if clustered:
+            sources_summary["ticket_clusters"] = {
+                "tickets": sum(m["tickets"] for m in clustered),
+                "clusters": sum(m["ticket_clusters"] for m in clustered),
+                "represented": sum(m["tickets_represented"] for m in clustered),
+            }
 
         # Level 3: Pattern Synthesis
         if progress_callback:
             progress_callback("Identifying cross-source patterns...", 40)
-        patterns = self._find_patterns(sources, insights, category_counts)
+        patterns = None
+        if resuming:
+            patterns = self.checkpoints.load_patterns(self.run_id, sources_fingerprint(sources))
+        if patterns is None:
+            with self._timed_stage("level_3"):
+                patterns = self._find_patterns(sources, insights, category_counts)
+            if self.checkpoints is not None:
+                self.checkpoints.save_patterns(self.run_id, sources_fingerprint(sources), patterns)
+        elif self.precluster:
+            # Resumed past Level 3: regroup the insights as _find_patterns did
+            self._groups = {cluster.id: cluster for cluster in cluster_insights(insights)}
+        if self._groups:
+            sources_summary["insight_clusters"] = {
+                "items": sum(group.mentions for group in self._groups.values()),
+                "clusters": len(self._groups),
+            }
 
         # Level 4: Opportunity Mapping
         if progress_callback:
             progress_callback("Mapping opportunity spaces...", 70)
-        result = self._map_opportunities(sources, patterns, desired_outcomes)
+        with self._timed_stage("level_4"):
+            result = self._map_opportunities(sources, patterns, desired_outcomes)
 
         # Build evidence index
         evidence_index = self._build_evidence_index(sources)
 
         result.evidence_index = evidence_index
         result.sources_summary = sources_summary
+        if self.insight_cache is not None:
+            result.sources_summary["insight_cache"] = self.insight_cache.stats()
+        result.api_usage = dict(self._usage)
+        result.stage_stats = dict(self._stage_stats)
+        result.run_id = self.run_id
 
         if progress_callback:
             progress_callback("Synthesis complete!", 100)
 
         return result
 
+    def _start_checkpointed_run(self, resume_run_id: str | None) -> bool:
+        """Pick this run's checkpoint id; return True if resuming an earlier run."""
+        self._resumed_batches = {}
+        if self.checkpoints is None:
+            self.run_id = ""
+            return False
+        if resume_run_id and self.checkpoints.has_run(resume_run_id):
+            self.run_id = resume_run_id
+            self._resumed_batches = self.checkpoints.load_batches(resume_run_id)
+            return True
+        self.run_id = self.checkpoints.new_run_id()
+        return False
+
+    @staticmethod
+    def _collect(sources: Iterable[Source], received: list[Source]):
+        """Yield sources while recording each one in received."""
+        for source in sources:
+            received.append(source)
+            yield source
+
+    @staticmethod
+    def _split_long_sources(sources: Iterable[Source]):
+        """Yield sources, with long ones replaced by their chunk sub-sources."""
+        for source in sources:
+            yield from split_source(source)
+
+    def _drop_near_duplicates(self, sources: Iterable[Source]):
+        """Yield only sources that are not near-duplicates of an earlier one."""
+        for source in sources:
+            if self._dedup.add(source) is None:
+                yield source
+
+    @contextmanager
+    def _timed_stage(self, name: str):
+        """Time a pipeline stage; Claude calls inside it count as busy time.
+
+        ``utilization`` is busy time over the wall time of every request
+        slot (wall_seconds x max_concurrency).
+        """
+        started = time.perf_counter()
+        stats = self._stage_stats[name] = {"busy_seconds": 0.0}
+        self._stage = name
+        try:
+            yield
+        finally:
+            self._stage = None
+            wall = max(time.perf_counter() - started, 1e-9)
+            stats["wall_seconds"] = round(wall, 3)
+            stats["busy_seconds"] = round(stats["busy_seconds"], 3)
+            stats["utilization"] = round(
+                stats["busy_seconds"] / (wall * self.max_concurrency), 3
+            )
+            self.token_estimator.save()
+
     # ----- Claude API -----
 
-    def _call_claude(self, system: str, user: str) -> str:
-        """Make a single Claude API call."""
-        response = self.client.messages.create(
-            model=MODEL_ID,
-            max_tokens=MAX_TOKENS_OUTPUT,
-            system=system,
-            messages=[{"role": "user", "content": user}],
-        )
+    @staticmethod
+    def _build_request(system: str, template: str, context: str) -> dict:
+        """Assemble messages API arguments, filling a level's user prompt template."""
+        return {
+            "model": MODEL_ID,
+            "max_tokens": MAX_TOKENS_OUTPUT,
+            "system": [{"type": "text", "text": system}],
+            "messages": [{
+                "role": "user",
+                "content": [{"type": "text", "text": template.format(context=context)}],
+            }],
+        }
+
+    def _call_claude(
+        self, system: str, template: str, context: str, expected_output_tokens: int | None = None,
+    ) -> str:
+        """Make a single Claude API call.
+
+        expected_output_tokens (the planner's estimate, if any) is reserved
+        from the scheduler's output budget and used to calibrate the token
+        estimator against the response's usage.
+        """
+        request = self._build_request(system, template, context)
+        prompt = system + request["messages"][0]["content"][0]["text"]
+        started = time.perf_counter()
+        try:
+            response = self.scheduler.call(
+                lambda: self.client.messages.create(**request),
+                self.token_estimator.count(prompt),
+                self._output_estimate(expected_output_tokens),
+            )
+        finally:
+            seconds = time.perf_counter() - started
+            self._record_busy(seconds)
+        self._record_usage(response)
+        self._calibrate(response, prompt, seconds, expected_output_tokens)
+        if response.stop_reason == "max_tokens":
+            raise TruncatedResponseError(
+                "Claude's response was truncated (hit max_tokens limit). "
+                "Try uploading fewer files or contact support."
+            )
+        return response.content[0].text
+
+    def _call_claude_stream(
+        self, system: str, template: str, context: str, on_text,
+        expected_output_tokens: int | None = None,
+    ) -> str:
+        """Make a streaming Claude API call, passing each text delta to on_text.
+
+        The scheduler retries failures that happen before any text arrives.
+        Once output has started, a failure raises StreamInterruptedError
+        instead, so the caller can keep what it already parsed.
+        """
+        request = self._build_request(system, template, context)
+
+        def attempt():
+            received = False
+            try:
+                with self.client.messages.stream(**request) as stream:
+                    for text in stream.text_stream:
+                        received = True
+                        on_text(text)
+                    return stream.get_final_message()
+            except SynthesisError:
+                raise
+            except Exception as e:
+                if received:
+                    raise StreamInterruptedError(f"Claude's response stream failed: {e}") from e
+                raise
+
+        prompt = system + request["messages"][0]["content"][0]["text"]
+        started = time.perf_counter()
+        try:
+            response = self.scheduler.call(
+                attempt, self.token_estimator.count(prompt), self._output_estimate(expected_output_tokens),
+            )
+        finally:
+            seconds = time.perf_counter() - started
+            self._record_busy(seconds)
+        self._record_usage(response)
+        self._calibrate(response, prompt, seconds, expected_output_tokens)
         if response.stop_reason == "max_tokens":
-            raise SynthesisError(
+            raise TruncatedResponseError(
                 "Claude's response was truncated (hit max_tokens limit). "
                 "Try uploading fewer files or contact support."
             )
         return response.content[0].text
 
+    def _output_estimate(self, expected_output_tokens: int | None) -> int:
+        """Output tokens to reserve from the scheduler's budget for one call."""
+        if expected_output_tokens:
+            return min(expected_output_tokens, MAX_TOKENS_OUTPUT)
+        return min(self.token_estimator.call_output_tokens(self._stage or ""), MAX_TOKENS_OUTPUT)
+
+    def _record_busy(self, seconds: float):
+        """Add time spent waiting on Claude to the current stage."""
+        stats = self._stage_stats.get(self._stage)
+        if stats is None:
+            return
+        with self._progress_lock:
+            stats["busy_seconds"] += seconds
+
+    def _record_usage(self, response):
+        """Add a response's token usage to the run's totals."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        with self._progress_lock:
+            self._usage["calls"] = self._usage.get("calls", 0) + 1
+            for name in _USAGE_FIELDS:
+                self._usage[name] = self._usage.get(name, 0) + (getattr(usage, name, 0) or 0)
+
+    def _calibrate(self, response, prompt: str, seconds: float, expected_output_tokens: int | None):
+        """Feed a response's actual usage back into the token estimator."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        self.token_estimator.observe_input(prompt, input_tokens)
+        self.token_estimator.observe_output(self._stage or "other", output_tokens, expected_output_tokens)
+        self.token_estimator.observe_latency(seconds, output_tokens)
+
     # ----- Level 2: Categorization -----
 
-    # Max sources per Level 2 batch — keeps output well under MAX_TOKENS_OUTPUT.
-    # ~900 output tokens per source; 10 sources ≈ 9K tokens (safe under 16K).
-    _L2_BATCH_SIZE = 10
-
-    def _categorize(self, sources: list[Source]) -> list[ExtractedInsight]:
-        """Level 2: Extract structured insights from each source."""
-        if len(sources) <= self._L2_BATCH_SIZE:
-            return self._categorize_batch(sources)
-
-        # Batch to stay within output token limits
-        all_insights = []
-        for i in range(0, len(sources), self._L2_BATCH_SIZE):
-            batch = sources[i : i + self._L2_BATCH_SIZE]
-            all_insights.extend(self._categorize_batch(batch))
-        return all_insights
-
-    def _categorize_batch(self, sources: list[Source]) -> list[ExtractedInsight]:
-        """Categorize a single batch of sources."""
-        sources_xml = build_sources_xml(sources)
-        user_prompt = LEVEL_2_USER.format(sources_xml=sources_xml)
-        raw = self._call_claude(LEVEL_2_SYSTEM, user_prompt)
-        return self._parse_level_2_response(raw)
+    def _categorize(self, sources: Iterable[Source]) -> list[ExtractedInsight]:
+        """Level 2: Extract structured insights from each source.
+
+        Sources with a cached insight are served locally; only the cache
+        misses are batched and sent to Claude. Batches are dispatched as
+        soon as the planner closes them, so when sources arrive from a
+        pipeline Level 2 overlaps with parsing.
+        """
+        seen: list[Source] = []
+        cached: dict[str, ExtractedInsight] = {}
+        self._l2_done = 0
+        self._l2_total = 0
+
+        batches = self._plan_level_2(sources, seen, cached)
+        if self.bulk_backend is not None:
+            batch_results = self._categorize_bulk(list(batches))
+        else:
+            batch_results = self._run_concurrently(self._categorize_batch, batches)
+
+        # Flatten in batch order so insights stay in source order
+        fresh = [insight for batch in batch_results for insight in batch]
+        if not cached:
+            return fresh
+        return self._merge_in_source_order(seen, cached, fresh)
+
+    def _plan_level_2(
+        self,
+        sources: Iterable[Source],
+        seen: list[Source],
+        cached: dict[str, ExtractedInsight],
+    ):
+        """Yield Level 2 batches of cache misses as the planner closes them.
+
+        Every source is appended to seen; cache hits go into cached.
+        """
+        # Pack by estimated tokens to stay within output token limits
+        planner = BatchPlanner(estimator=self.token_estimator)
+        for source in sources:
+            seen.append(source)
+            self._l2_total = len(seen)
+            insight = self._lookup_cached_insight(source)
+            if insight is not None:
+                cached[source.id] = insight
+                with self._progress_lock:
+                    self._l2_done += 1
+                continue
+            closed = planner.add(source)
+            if closed:
+                yield closed
+        last = planner.flush()
+        if last:
+            yield last
+
+    def _categorize_bulk(self, batches: list[list[Source]]) -> list[list[ExtractedInsight]]:
+        """Run all Level 2 batches as message batch jobs.
+
+        Requests are built one batch at a time and submitted as a job
+        whenever the pending contexts reach BULK_MAX_JOB_BYTES, so only one
+        job's request bodies are held in memory. Every batch service call
+        goes through the scheduler, so a transient failure during a long
+        poll is retried instead of ending the run; a job's results are
+        read in one retried call. Results are mapped back to batches by
+        custom id. Requests that errored, expired, were
+        truncated or returned unparseable JSON are re-run interactively
+        through _categorize_batch.
+        """
+        if not batches:
+            return []
+
+        custom_ids = [f"level2-{i:05d}" for i in range(len(batches))]
+        job_ids = []
+        requests, job_bytes = [], 0
+        for custom_id, batch in zip(custom_ids, batches):
+            context, size = self._level_2_context(batch)
+            if requests and job_bytes + size.bytes > BULK_MAX_JOB_BYTES:
+                job_ids.append(self._submit_bulk_job(requests))
+                requests, job_bytes = [], 0
+            requests.append({
+                "custom_id": custom_id,
+                "params": self._build_request(LEVEL_2_SYSTEM, LEVEL_2_USER, context),
+            })
+            job_bytes += size.bytes
+        job_ids.append(self._submit_bulk_job(requests))
+        del requests
+
+        deadline = time.monotonic() + BULK_MAX_WAIT_SECONDS
+        for job_id in job_ids:
+            while not self.scheduler.call(lambda: self.bulk_backend.is_done(job_id), 0):
+                if time.monotonic() > deadline:
+                    raise SynthesisError(f"Bulk Level 2 job {job_id} did not finish in time.")
+                time.sleep(self.bulk_poll_interval)
+
+        index_by_id = {custom_id: i for i, custom_id in enumerate(custom_ids)}
+        results: list[list[ExtractedInsight] | None] = [None] * len(batches)
+        entries = (
+            entry for job_id in job_ids
+            for entry in self.scheduler.call(lambda: list(self.bulk_backend.results(job_id)), 0)
+        )
+        for entry in entries:
+            i = index_by_id.get(entry.custom_id)
+            if i is None or entry.message is None:
+                continue
+            self._record_usage(entry.message)
+            if entry.message.stop_reason == "max_tokens":
+                continue
+            try:
+                insights = self._parse_level_2_response(entry.message.content[0].text)
+            except SynthesisError:
+                continue
+            for insight in insights:
+                self._report_insight(insight)
+            self._record_batch(batches[i], insights)
+            results[i] = insights
+
+        # Anything the bulk job did not deliver falls back to interactive calls
+        retry = [i for i, insights in enumerate(results) if insights is None]
+        redone = self._run_concurrently(self._categorize_batch, [batches[i] for i in retry])
+        for i, insights in zip(retry, redone):
+            results[i] = insights
+        return results
+
+    def _submit_bulk_job(self, requests: list[dict]) -> str:
+        """Submit one message batch job (retried by the scheduler); return its id."""
+        return self.scheduler.call(lambda: self.bulk_backend.submit(requests), 0)
+
+    def _lookup_cached_insight(self, source: Source) -> ExtractedInsight | None:
+        """Return an insight from a resumed run's checkpoints or the cache."""
+        if self._resumed_batches:
+            data = self._resumed_batches.get(InsightCache.key_for(source))
+            if data is not None:
+                return ExtractedInsight(
+                    **{**data, "source_id": source.id, "category": source.category}
+                )
+        if self.insight_cache is None:
+            return None
+        return self.insight_cache.get_insight(source)
+
+    @staticmethod
+    def _merge_in_source_order(
+        sources: list[Source],
+        cached: dict[str, ExtractedInsight],
+        fresh: list[ExtractedInsight],
+    ) -> list[ExtractedInsight]:
+        """Interleave cached and freshly extracted insights in source order.
+
+        Fresh insights whose source_id matches no source are kept at the end.
+        """
+        fresh_by_id = {}
+        for insight in fresh:
+            fresh_by_id.setdefault(insight.source_id, []).append(insight)
+
+        merged = []
+        for source in sources:
+            if source.id in cached:
+                merged.append(cached[source.id])
+            else:
+                merged.extend(fresh_by_id.pop(source.id, []))
+        for leftovers in fresh_by_id.values():
+            merged.extend(leftovers)
+        return merged
+
+    def _run_concurrently(self, fn, items: Iterable) -> list:
+        """Apply fn to each item on a bounded thread pool, preserving order.
+
+        Items may come from a generator; each one is submitted as soon as
+        it is produced. Progress callbacks queued by workers are fired on
+        this thread while waiting. The first failure cancels any work that
+        has not started yet and is re-raised to the caller.
+        """
+        if self.max_concurrency <= 1 or (isinstance(items, list) and len(items) <= 1):
+            return [fn(item) for item in items]
+
+        pool = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        futures = []
+        try:
+            for item in items:
+                futures.append(pool.submit(fn, item))
+                self._drain_events()
+                for future in futures:
+                    if future.done():
+                        future.result()  # surface failures without waiting for the producer
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                self._drain_events()
+                for future in done:
+                    future.result()  # surface the first failure immediately
+            return [future.result() for future in futures]
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._drain_events()
+
+    def _notify(self, fn, *args):
+        """Fire a progress callback on the run() thread."""
+        if threading.get_ident() == self._caller_ident:
+            fn(*args)
+        else:
+            self._events.put((fn, args))
+
+    def _drain_events(self):
+        while True:
+            try:
+                fn, args = self._events.get_nowait()
+            except queue.Empty:
+                return
+            fn(*args)
+
+    def _report_insight(self, insight: ExtractedInsight):
+        if self._insight_callback is None:
+            return
+        with self._progress_lock:
+            self._l2_done += 1
+            done = self._l2_done
+        self._notify(self._insight_callback, insight, done, self._l2_total)
+
+    def _categorize_batch(self, sources: list[Source], retry_interrupted: bool = True) -> list[ExtractedInsight]:
+        """Categorize a single batch of sources.
+
+        Insights already parsed from a stream survive a failure part-way
+        through; only the sources still missing are re-requested. If a
+        response is truncated before any source completes, the batch is
+        split in half and each half retried, so one oversized batch does
+        not abort the run. A stream that breaks off before any source
+        completes is retried once, then split the same way. Insights
+        citing none of the batch's sources count as no progress, so a
+        retry never repeats the same batch.
+        """
+        context, _ = self._level_2_context(sources)
+        expected = sum(estimate_output_tokens(s, self.token_estimator) for s in sources)
+
+        insights: list[ExtractedInsight] = []
+        interrupted = False
+        try:
+            if self.stream:
+                self._stream_level_2(context, insights, expected)
+            else:
+                raw = self._call_claude(LEVEL_2_SYSTEM, LEVEL_2_USER, context, expected)
+                insights = self._parse_level_2_response(raw)
+                for insight in insights:
+                    self._report_insight(insight)
+        except TruncatedResponseError:
+            if not self._covers_any(sources, insights):
+                if len(sources) == 1:
+                    raise
+                return self._split_batch(sources)
+            interrupted = True
+        except StreamInterruptedError:
+            if not self._covers_any(sources, insights):
+                if retry_interrupted:
+                    return self._categorize_batch(sources, retry_interrupted=False)
+                if len(sources) == 1:
+                    raise
+                return self._split_batch(sources)
+            interrupted = True
+        except Exception:
+            if not self._covers_any(sources, insights):
+                raise
+            interrupted = True
+
+        self._record_batch(sources, insights)
+
+        if interrupted:
+            parsed_ids = {insight.source_id for insight in insights}
+            remaining = [s for s in sources if s.id not in parsed_ids]
+            if remaining:
+                insights.extend(self._categorize_batch(remaining))
+        return insights
+
+    def _split_batch(self, sources: list[Source]) -> list[ExtractedInsight]:
+        """Categorize each half of a batch separately."""
+        mid = len(sources) // 2
+        return self._categorize_batch(sources[:mid]) + self._categorize_batch(sources[mid:])
+
+    @staticmethod
+    def _covers_any(sources: list[Source], insights: list[ExtractedInsight]) -> bool:
+        """True if any insight belongs to one of the sources."""
+        ids = {source.id for source in sources}
+        return any(insight.source_id in ids for insight in insights)
+
+    def _stream_level_2(
+        self, context: str, insights: list[ExtractedInsight], expected_output_tokens: int | None = None,
+    ):
+        """Stream a Level 2 call, appending each insight to insights as it closes."""
+        parser = JsonArrayStreamParser()
+        chunks = []
+
+        def on_text(text: str):
+            chunks.append(text)
+            try:
+                items = parser.feed(text)
+            except json.JSONDecodeError as e:
+                raise SynthesisError(f"Failed to parse Level 2 JSON response: {e}")
+            for item in items:
+                insight = self._insight_from_dict(item)
+                insights.append(insight)
+                self._report_insight(insight)
+
+        self._call_claude_stream(LEVEL_2_SYSTEM, LEVEL_2_USER, context, on_text, expected_output_tokens)
+
+        if not insights:
+            # Nothing streamed as an array element; let the one-shot parser
+            # either handle the response or raise the usual error.
+            for insight in self._parse_level_2_response("".join(chunks)):
+                insights.append(insight)
+                self._report_insight(insight)
+
+    @staticmethod
+    def _level_2_context(sources: list[Source]) -> tuple[str, SizedWriter]:
+        """Level 2 context for a batch, written straight into one buffer.
+
+        Returns the context and the writer holding its sources XML size.
+        """
+        buffer = io.StringIO()
+        size = write_xml(iter_sources_xml(sources), buffer)
+        return build_level_2_context(buffer.getvalue()), size
+
+    def _record_batch(self, sources: list[Source], insights: list[ExtractedInsight]):
+        """Persist a completed batch to the insight cache and run checkpoints."""
+        if self.insight_cache is not None:
+            self._store_insights(sources, insights)
+        if self.checkpoints is not None:
+            self.checkpoints.save_batch(self.run_id, sources, insights)
+
+    def _store_insights(self, sources: list[Source], insights: list[ExtractedInsight]):
+        """Cache each insight under the source it was extracted from."""
+        by_id = {source.id: source for source in sources}
+        for insight in insights:
+            source = by_id.get(insight.source_id)
+            if source is not None:
+                self.insight_cache.put_insight(source, insight)
 
     def _parse_level_2_response(self, raw: str) -> list[ExtractedInsight]:
         """Parse Level 2 JSON response into ExtractedInsight objects."""
@@ -138,19 +811,19 @@ class Synthesizer:
         if not isinstance(data, list):
             raise SynthesisError("Level 2 response is not a JSON array")
 
-        insights = []
-        for item in data:
-            insights.append(ExtractedInsight(
-                source_id=item.get("source_id", "unknown"),
-                category=item.get("category", "unknown"),
-                problems=item.get("problems", []),
-                jobs_to_be_done=item.get("jobs_to_be_done", []),
-                pain_points=item.get("pain_points", []),
-                desired_outcomes=item.get("desired_outcomes", []),
-                solution_requests=item.get("solution_requests", []),
-            ))
+        return [self._insight_from_dict(item) for item in data]
 
-        return insights
+    @staticmethod
+    def _insight_from_dict(item: dict) -> ExtractedInsight:
+        return ExtractedInsight(
+            source_id=item.get("source_id", "unknown"),
+            category=item.get("category", "unknown"),
+            problems=item.get("problems", []),
+            jobs_to_be_done=item.get("jobs_to_be_done", []),
+            pain_points=item.get("pain_points", []),
+            desired_outcomes=item.get("desired_outcomes", []),
+            solution_requests=item.get("solution_requests", []),
+        )
 
     # ----- Level 3: Pattern Synthesis -----
 
@@ -160,15 +833,172 @@ class Synthesizer:
         insights: list[ExtractedInsight],
         category_counts: dict,
     ) -> list[Pattern]:
-        """Level 3: Identify cross-source patterns."""
-        insights_xml = build_insights_xml(insights)
-        user_template = build_level_3_user(len(sources), category_counts)
-        user_prompt = user_template.replace("{insights_xml}", insights_xml)
-        raw = self._call_claude(LEVEL_3_SYSTEM, user_prompt)
+        """Level 3: Identify cross-source patterns.
+
+        With precluster, near-identical items are grouped first and Level 3
+        works on the groups (see cluster_insights). Corpora whose encoding
+        exceeds L3_SHARD_MAX_CHARS are handled by _find_patterns_sharded
+        instead of a single call.
+        """
+        # Pattern metrics are computed from the cited sources (see pattern_metrics)
+        self._sources_by_id = {s.id: s for s in sources}
+        plain_chars = write_xml(iter_insights_xml(insights)).chars
+        if self.precluster:
+            clusters = cluster_insights(insights)
+            self._groups = {cluster.id: cluster for cluster in clusters}
+            insights = clusters
+
+        # Measure before building: a sharded corpus never needs the full encoding
+        chars = write_xml(self._iter_insights(insights)).chars
+        # Teaches the run planner how much encoding and clustering shrink Level 3
+        if plain_chars and insights:
+            self.token_estimator.observe_level_3_scale(
+                level_3_encoding_key(self.prompt_encoding.get("level_3"), self.precluster),
+                chars / plain_chars,
+            )
+        if chars > L3_SHARD_MAX_CHARS:
+            return self._find_patterns_sharded(insights)
+
+        context = build_level_3_context(len(sources), category_counts, self._encode_insights(insights))
+        raw = self._call_claude(LEVEL_3_SYSTEM, LEVEL_3_USER, context)
         return self._parse_level_3_response(raw)
 
+    def _find_patterns_sharded(
+        self,
+        insights: list[ExtractedInsight] | list[InsightCluster],
+    ) -> list[Pattern]:
+        """Level 3 as map-reduce for corpora too large for one prompt.
+
+        Map: partial pattern discovery runs on each insight shard in
+        parallel. Reduce: partial pattern lists are merged L3_MERGE_FAN_IN
+        at a time (also in parallel) until one list remains, so latency
+        grows with the depth of the tree rather than the number of shards.
+        """
+        shards = self._shard_insights(insights)
+        partials = self._run_concurrently(self._find_shard_patterns, shards)
+
+        while len(partials) > 1:
+            groups = self._group_for_merge(partials)
+            partials = self._run_concurrently(self._merge_patterns, groups)
+        return partials[0]
+
+    def _shard_insights(self, insights: list) -> list[list]:
+        """Split insights into shards whose encoding fits L3_SHARD_MAX_CHARS."""
+        return plan_level_3_shards(insights, self._iter_insights)
+
+    def _find_shard_patterns(self, insights: list) -> list[Pattern]:
+        """Map step: find patterns within a single shard of insights (or groups)."""
+        if self._groups:
+            categories = {m["source_id"]: m["category"] for group in insights for m in group.members}
+        else:
+            categories = {insight.source_id: insight.category for insight in insights}
+        shard_counts = {}
+        for category in categories.values():
+            shard_counts[category] = shard_counts.get(category, 0) + 1
+
+        context = build_level_3_context(len(categories), shard_counts, self._encode_insights(insights))
+        raw = self._call_claude(LEVEL_3_SYSTEM, LEVEL_3_USER, context)
+        return self._parse_level_3_response(raw)
+
+    @staticmethod
+    def _group_for_merge(partials: list[list[Pattern]]) -> list[list[list[Pattern]]]:
+        """Group partial pattern lists for one round of the reduce tree.
+
+        Each group holds at least two lists (so every round shrinks the
+        tree) and at most L3_MERGE_FAN_IN, stopping early once the group's
+        patterns XML would exceed L3_SHARD_MAX_CHARS.
+        """
+        groups = []
+        group, group_chars = [], 0
+        for plist in partials:
+            chars = write_xml(iter_patterns_xml(plist, numbered=True)).chars
+            if len(group) >= 2 and (
+                len(group) >= L3_MERGE_FAN_IN
+                or group_chars + chars > L3_SHARD_MAX_CHARS
+            ):
+                groups.append(group)
+                group, group_chars = [], 0
+            group.append(plist)
+            group_chars += chars
+
+        if len(group) == 1 and groups:
+            groups[-1].extend(group)
+        elif group:
+            groups.append(group)
+        return groups
+
+    def _merge_patterns(self, group: list[list[Pattern]]) -> list[Pattern]:
+        """Reduce step: deduplicate partial patterns from several shards.
+
+        Claude decides which candidates describe the same pattern; evidence,
+        frequency and source_categories are then recombined locally from
+        the members so nothing cited by a shard is lost.
+        """
+        candidates = [pattern for plist in group for pattern in plist]
+        if not candidates:
+            return []
+
+        patterns_xml = self._encode_patterns(candidates, "level_3", numbered=True)
+        context = build_level_3_merge_context(patterns_xml)
+        raw = self._call_claude(LEVEL_3_MERGE_SYSTEM, LEVEL_3_MERGE_USER, context)
+        data = self._parse_json_response(raw, "Level 3 merge")
+
+        if not isinstance(data, list):
+            raise SynthesisError("Level 3 merge response is not a JSON array")
+
+        merged = []
+        used = set()
+        for item in data:
+            indices = [
+                i for i in item.get("members", [])
+                if isinstance(i, int) and 0 <= i < len(candidates) and i not in used
+            ]
+            if not indices:
+                continue
+            used.update(indices)
+            members = [candidates[i] for i in indices]
+            merged.append(self._combine_patterns(item, members, self._sources_by_id))
+
+        # Candidates Claude left out survive unmerged rather than being dropped
+        merged.extend(p for i, p in enumerate(candidates) if i not in used)
+        return merged
+
+    @staticmethod
+    def _combine_patterns(
+        item: dict,
+        members: list[Pattern],
+        sources_by_id: dict[str, Source],
+    ) -> Pattern:
+        """Build one Pattern from merged members, recombining their evidence."""
+        evidence = []
+        seen_quotes = set()
+        for member in members:
+            for e in member.evidence:
+                key = (e.get("source_id", ""), e.get("quote", ""))
+                if key not in seen_quotes:
+                    seen_quotes.add(key)
+                    evidence.append(e)
+
+        severity_rank = {"low": 0, "medium": 1, "high": 2}
+        severity = item.get("severity") or max(
+            (m.severity for m in members), key=lambda sev: severity_rank.get(sev, 1)
+        )
+
+        return Pattern(
+            name=item.get("name") or members[0].name,
+            description=item.get("description") or members[0].description,
+            severity=severity,
+            business_impact=item.get("business_impact") or members[0].business_impact,
+            evidence=evidence,
+            **pattern_metrics(evidence, sources_by_id),
+        )
+
     def _parse_level_3_response(self, raw: str) -> list[Pattern]:
-        """Parse Level 3 JSON response into Pattern objects."""
+        """Parse Level 3 JSON response into Pattern objects.
+
+        Frequency, weighted_score, cross_org_signal and source_categories
+        are computed from the resolved evidence, not taken from Claude.
+        """
         data = self._parse_json_response(raw, "Level 3")
 
         if not isinstance(data, list):
@@ -176,20 +1006,77 @@ class Synthesizer:
 
         patterns = []
         for item in data:
+            evidence = self._resolve_evidence(item.get("evidence", []))
             patterns.append(Pattern(
                 name=item.get("name", ""),
                 description=item.get("description", ""),
-                frequency=int(item.get("frequency", 0)),
                 severity=item.get("severity", "medium"),
-                weighted_score=float(item.get("weighted_score", 0)),
                 business_impact=item.get("business_impact", ""),
-                cross_org_signal=bool(item.get("cross_org_signal", False)),
-                evidence=item.get("evidence", []),
-                source_categories=item.get("source_breakdown", {}),
+                evidence=evidence,
+                **pattern_metrics(evidence, self._sources_by_id),
             ))
 
         return patterns
 
+    def _resolve_evidence(self, evidence: list) -> list:
+        """Map cited short ids back to source ids and resolve cited groups.
+
+        A cited group stays one entry: its representative's source and
+        quote, plus the group id, its mention count and the ids of all of
+        its sources (and their ticket counts), which pattern_metrics
+        counts in full. Every entry gets its source's category and weight,
+        and ticket counts from the cited sources (see _resolve_tickets).
+        """
+        resolved = []
+        for e in evidence:
+            if not isinstance(e, dict):
+                continue
+            source_id = self._ids.resolve(e.get("source_id", ""))
+            group = self._groups.get(source_id)
+            if group is None:
+                entry = {**e, "source_id": source_id}
+            else:
+                first = group.members[0]
+                entry = {
+                    "source_id": first["source_id"],
+                    "quote": e.get("quote") or first["text"],
+                    "group": group.id,
+                    "mentions": group.mentions,
+                    "sources": [member["source_id"] for member in group.members],
+                }
+            entry["category"], entry["weight"] = evidence_source(entry, self._sources_by_id)
+            self._resolve_tickets(entry, group)
+            resolved.append(entry)
+        return resolved
+
+    def _resolve_tickets(self, entry: dict, group: InsightCluster | None):
+        """Set an evidence entry's ticket counts from the parsed ticket clusters.
+
+        Claude's "tickets" (or, for a group, the ticket_count of its Level 2
+        items) is only kept where the cited source has no cluster entry
+        matching the quote; the entry is then marked "tickets_estimated".
+        """
+        estimated = False
+        if group is None:
+            tickets, estimated = resolve_tickets(
+                self._sources_by_id.get(entry["source_id"]), [entry.get("quote")], entry.pop("tickets", None),
+            )
+            if tickets is not None:
+                entry["tickets"] = tickets
+        else:
+            source_tickets = {}
+            for member in group.members:
+                tickets, guessed = resolve_tickets(
+                    self._sources_by_id.get(member["source_id"]), member.get("quotes", []), member.get("tickets"),
+                )
+                if tickets is not None:
+                    source_tickets[member["source_id"]] = tickets
+                    estimated |= guessed
+            if source_tickets:
+                entry["source_tickets"] = source_tickets
+        if estimated:
+            entry["tickets_estimated"] = True
+
     # ----- Level 4: Opportunity Mapping -----
 
     def _map_opportunities(
@@ -199,10 +1086,9 @@ class Synthesizer:
         desired_outcomes: list[str],
     ) -> OSTResult:
         """Level 4: Map patterns to OST structure."""
-        patterns_xml = build_patterns_xml(patterns)
-        user_template = build_level_4_user(len(sources), desired_outcomes)
-        user_prompt = user_template.replace("{patterns_xml}", patterns_xml)
-        raw = self._call_claude(LEVEL_4_SYSTEM, user_prompt)
+        patterns_xml = self._encode_patterns(patterns, "level_4")
+        context = build_level_4_context(len(sources), desired_outcomes, patterns_xml)
+        raw = self._call_claude(LEVEL_4_SYSTEM, LEVEL_4_USER, context)
         return self._parse_level_4_response(raw)
 
     def _parse_level_4_response(self, raw: str) -> OSTResult:
@@ -222,9 +1108,9 @@ class Synthesizer:
                     weighted_score=float(opp_data.get("weighted_score", 0)),
                     source_count=int(opp_data.get("source_count", 0)),
                     source_breakdown=opp_data.get("source_breakdown", {}),
-                    problems=opp_data.get("problems", []),
+                    problems=[self._resolve_ids(p, "source_id") for p in opp_data.get("problems", [])],
                     jobs_to_be_done=opp_data.get("jobs_to_be_done", []),
-                    solutions=opp_data.get("solutions", []),
+                    solutions=[self._resolve_ids(s, "evidence_sources") for s in opp_data.get("solutions", [])],
                     next_steps=opp_data.get("next_steps", []),
                     contributing_patterns=opp_data.get("contributing_patterns", []),
                 )
@@ -245,6 +1131,30 @@ class Synthesizer:
 
     # ----- Helpers -----
 
+    def _encode_insights(self, insights: list) -> str:
+        """Insights (or groups) for a Level 3 prompt, in the level's configured encoding."""
+        return "".join(self._iter_insights(insights))
+
+    def _iter_insights(self, insights: list):
+        # Pre-clustered runs pass InsightCluster groups instead of insights
+        compact = self.prompt_encoding.get("level_3") == "compact"
+        return iter_level_3_insights(insights, self._ids, compact, grouped=bool(self._groups))
+
+    def _encode_patterns(self, patterns: list[Pattern], level: str, numbered: bool = False) -> str:
+        """Patterns for a Level 3 merge or Level 4 prompt, in the level's encoding."""
+        if self.prompt_encoding.get(level) == "compact":
+            return "".join(iter_patterns_compact(patterns, self._ids, numbered=numbered))
+        return "".join(iter_patterns_xml(patterns, numbered=numbered))
+
+    def _resolve_ids(self, item, key: str):
+        """Map short source ids under item[key] (an id or a list) back to source ids."""
+        if not isinstance(item, dict) or key not in item:
+            return item
+        value = item[key]
+        if isinstance(value, list):
+            return {**item, key: [self._ids.resolve(v) for v in value]}
+        return {**item, key: self._ids.resolve(value)}
+
     def _build_evidence_index(self, sources: list[Source]) -> list[dict]:
         """Build an evidence index grouping sources by category."""
         index = []
@@ -0,0 +1,190 @@
+"""Local token estimation, calibrated against response.usage from past runs."""
+
+import json
+import os
+import re
+import threading
+
+from config import (
+    TOKEN_CHARS_PER_TOKEN, TOKEN_CALIBRATION_PATH, TOKEN_CALIBRATION_ALPHA,
+    PLAN_OUTPUT_TOKENS_PER_CALL, PLAN_SECONDS_PER_OUTPUT_TOKEN, PLAN_LEVEL_3_SCALE,
+)
+
+TEXT_KINDS = tuple(TOKEN_CHARS_PER_TOKEN)
+
+# Outside Latin scripts (and general punctuation such as dashes and quotes)
+_NON_LATIN = re.compile(r"[^\x00-\u024f\u2000-\u206f]")
+
+
+def text_profile(text: str) -> dict[str, int]:
+    """Split a text's characters into prose, table and non-Latin counts.
+
+    Lines with several delimiters (commas, tabs, pipes, semicolons) or
+    space-aligned columns count as table; non-Latin characters are counted
+    wherever they appear and taken out of the prose share.
+    """
+    table = sum(len(line) + 1 for line in text.split("\n") if _is_table_line(line))
+    table = min(table, len(text))
+    non_latin = min(len(_NON_LATIN.findall(text)), len(text) - table)
+    return {"prose": len(text) - table - non_latin, "table": table, "non_latin": non_latin}
+
+
+def _is_table_line(line: str) -> bool:
+    if len(line) < 8:
+        return False
+    delimiters = line.count(",") + line.count("\t") + line.count("|") + line.count(";")
+    return delimiters >= 3 or line.strip().count("  ") >= 2
+
+
+def level_3_encoding_key(encoding: str | None, precluster: bool) -> str:
+    """Key of PLAN_LEVEL_3_SCALE for a Level 3 prompt encoding ("compact+clustered")."""
+    return f"{encoding or 'xml'}{'+clustered' if precluster else ''}"
+
+
+class TokenEstimator:
+    """Estimate token counts locally and learn from actual usage.
+
+    Input tokens are estimated per kind of text (see text_profile) from a
+    chars-per-token ratio for each kind. After each call, observe_input()
+    compares the estimate with response.usage and moves every kind's ratio
+    towards the value that would have been exact, in proportion to that
+    kind's share of the prompt (an EWMA with weight ``alpha``; a single
+    observation moves a ratio by at most 2x, so one odd response cannot
+    wreck the calibration). Output
+    estimates are corrected the same way per level, and seconds per output
+    token are tracked for wall-clock planning, and the size of the Level 3
+    insight encoding relative to plain XML per encoding (which reflects
+    pre-clustering savings) for Level 3 planning. save() persists the
+    calibration to ``path`` so later runs start from it.
+    """
+
+    def __init__(self, path: str | None = TOKEN_CALIBRATION_PATH, alpha: float = TOKEN_CALIBRATION_ALPHA):
+        """
+        Args:
+            path: JSON file holding the calibration (None = not persisted).
+            alpha: Weight of each new observation in the moving averages.
+        """
+        self.path = path
+        self.alpha = alpha
+        self.chars_per_token = dict(TOKEN_CHARS_PER_TOKEN)
+        self.output_scale: dict[str, float] = {}     # level -> factor on formula estimates
+        self.output_per_call = dict(PLAN_OUTPUT_TOKENS_PER_CALL)
+        self.seconds_per_output_token = PLAN_SECONDS_PER_OUTPUT_TOKEN
+        self.level_3_scale = dict(PLAN_LEVEL_3_SCALE)  # encoding key -> chars per plain XML char
+        self.observations = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def count(self, text: str) -> int:
+        """Estimated input tokens for a piece of text."""
+        return self.count_profile(text_profile(text))
+
+    def count_profile(self, profile: dict[str, int]) -> int:
+        ratios = self.chars_per_token
+        return int(sum(chars / ratios[kind] for kind, chars in profile.items())) + 1
+
+    def scale_output(self, level: str, estimate: float) -> int:
+        """Apply the learned correction to a formula-based output estimate."""
+        return int(estimate * self.output_scale.get(level, 1.0))
+
+    def call_output_tokens(self, level: str) -> int:
+        """Typical output tokens of one call at a level without a formula (Level 3/4)."""
+        return int(self.output_per_call.get(level, max(self.output_per_call.values())))
+
+    def observe_input(self, text: str, tokens: int):
+        """Calibrate against the actual input tokens (cached ones included) of text."""
+        profile = text_profile(text)
+        estimated = self.count_profile(profile)
+        if tokens <= 0 or estimated <= 0 or not text:
+            return
+        error = min(max(estimated / tokens, 0.5), 2.0)    # > 1: ratios are too small
+        with self._lock:
+            for kind, chars in profile.items():
+                share = chars / len(text)
+                if share:
+                    weight = self.alpha * share
+                    self.chars_per_token[kind] *= (1 - weight) + weight * error
+            self.observations += 1
+
+    def observe_output(self, level: str, tokens: int, expected: int | None = None):
+        """Calibrate a level's output: against expected if given, else per call."""
+        with self._lock:
+            if expected:
+                scale = self.output_scale.get(level, 1.0)
+                error = min(max(tokens / expected, 0.5), 2.0)
+                self.output_scale[level] = scale * ((1 - self.alpha) + self.alpha * error)
+            elif tokens > 0:
+                previous = self.output_per_call.get(level, tokens)
+                self.output_per_call[level] = (1 - self.alpha) * previous + self.alpha * tokens
+
+    def observe_level_3_scale(self, key: str, ratio: float):
+        """Track how large a Level 3 encoding came out relative to plain XML."""
+        if ratio <= 0:
+            return
+        with self._lock:
+            previous = self.level_3_scale.get(key, ratio)
+            self.level_3_scale[key] = (1 - self.alpha) * previous + self.alpha * ratio
+
+    def level_3_scale_for(self, key: str) -> float:
+        """Expected Level 3 encoding size relative to plain XML for an encoding key."""
+        return self.level_3_scale.get(key, 1.0)
+
+    def observe_latency(self, seconds: float, output_tokens: int):
+        """Track generation speed from one call's duration."""
+        if output_tokens <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            self.seconds_per_output_token = (
+                (1 - self.alpha) * self.seconds_per_output_token + self.alpha * seconds / output_tokens
+            )
+
+    def save(self):
+        """Persist the calibration (no-op without a path)."""
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "chars_per_token": self.chars_per_token,
+                "output_scale": self.output_scale,
+                "output_per_call": self.output_per_call,
+                "seconds_per_output_token": self.seconds_per_output_token,
+                "level_3_scale": self.level_3_scale,
+                "observations": self.observations,
+            }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.chars_per_token.update(
+            (kind, ratio) for kind, ratio in data.get("chars_per_token", {}).items() if kind in TEXT_KINDS
+        )
+        self.output_scale.update(data.get("output_scale", {}))
+        self.output_per_call.update(data.get("output_per_call", {}))
+        self.seconds_per_output_token = data.get("seconds_per_output_token", self.seconds_per_output_token)
+        self.level_3_scale.update(data.get("level_3_scale", {}))
+        self.observations = data.get("observations", 0)
+
+
+_shared_estimator = None
+_shared_lock = threading.Lock()
+
+
+def get_estimator() -> TokenEstimator:
+    """The process-wide estimator, loaded from TOKEN_CALIBRATION_PATH on first use."""
+    global _shared_estimator
+    with _shared_lock:
+        if _shared_estimator is None:
+            _shared_estimator = TokenEstimator()
+        return _shared_estimator
@@ -1,16 +1,77 @@
-"""Build structured XML from parsed sources for Claude's context window."""
+"""Build structured XML (or a compact encoding) for Claude's context window.
 
+Every build_* function has an iter_* form that yields the same text in
+chunks (per source, insight or pattern; long content in escaped slices),
+so a prompt can be written to a buffer or measured with write_xml without
+holding extra full-size copies.
+"""
+
+from collections.abc import Iterable, Iterator, Sequence
+from typing import TextIO
 from xml.sax.saxutils import escape
-from lib.models import Source, ExtractedInsight, Pattern
-from config import INPUT_CATEGORIES, MAX_CHARS_PER_SOURCE
+from lib.clustering import GROUP_ID_PREFIX
+from lib.models import Source, ExtractedInsight, InsightCluster, Pattern
+from config import INPUT_CATEGORIES, INSIGHT_CLUSTER_LISTED_SOURCES
+
+
+# Source content is escaped and emitted in slices of this many chars, so a
+# long document never exists as a second, escaped full-size copy
+_ESCAPE_SLICE_CHARS = 64 * 1024
+
+
+class SizedWriter:
+    """Text sink that counts the chars and UTF-8 bytes passing through it.
+
+    Wraps any object with a write(str) method (a file, io.StringIO, a
+    socket wrapper); with out=None the text is only measured.
+    """
+
+    def __init__(self, out: TextIO | None = None):
+        self.out = out
+        self.chars = 0
+        self.bytes = 0
+
+    def write(self, chunk: str) -> int:
+        if self.out is not None:
+            self.out.write(chunk)
+        self.chars += len(chunk)
+        self.bytes += len(chunk) if chunk.isascii() else len(chunk.encode("utf-8"))
+        return len(chunk)
+
+
+def write_xml(chunks: Iterable[str], out: TextIO | None = None) -> SizedWriter:
+    """Drain one of the iter_* generators below into out, chunk by chunk.
+
+    Returns the SizedWriter, whose chars and bytes hold the totals; pass
+    out=None to measure an encoding without building it.
+    """
+    writer = SizedWriter(out)
+    for chunk in chunks:
+        writer.write(chunk)
+    return writer
+
+
+def _escaped_slices(text: str) -> Iterator[str]:
+    # escape() maps single characters, so slicing never splits an entity
+    for start in range(0, len(text), _ESCAPE_SLICE_CHARS):
+        yield escape(text[start:start + _ESCAPE_SLICE_CHARS])
 
 
-def build_sources_xml(sources: list[Source]) -> str:
+def build_sources_xml(sources: Sequence[Source]) -> str:
     """Convert Source objects into structured XML for Level 2 processing.
 
     Each source is tagged with its id, category, weight, and filename
     so Claude can maintain attribution throughout synthesis.
     """
+    return "".join(iter_sources_xml(sources))
+
+
+def iter_sources_xml(sources: Sequence[Source]) -> Iterator[str]:
+    """Yield build_sources_xml's output in chunks.
+
+    Content is written as is: parse_file has already capped each document
+    and split_source each chunk, so nothing is re-truncated here.
+    """
     # Summary header
     category_counts = {}
     for s in sources:
@@ -22,42 +83,45 @@ def build_sources_xml(sources: list[Source]) -> str:
         if count > 0
     )
 
-    lines = [f'<sources total="{len(sources)}" breakdown="{escape(breakdown)}">']
+    yield f'<sources total="{len(sources)}" breakdown="{escape(breakdown)}">'
 
     for source in sources:
-        content = source.content
-        if len(content) > MAX_CHARS_PER_SOURCE:
-            content = content[:MAX_CHARS_PER_SOURCE] + "\n[truncated]"
-
-        lines.append(
-            f'  <source id="{escape(source.id)}" '
+        part = ""
+        if source.metadata.get("parent_id"):
+            part = f' part="{source.metadata["chunk"]} of {source.metadata["chunks"]}"'
+        yield (
+            f'\n  <source id="{escape(source.id)}" '
             f'category="{escape(source.category)}" '
             f'weight="{source.weight}" '
-            f'filename="{escape(source.filename)}">'
+            f'filename="{escape(source.filename)}"{part}>'
+            "\n    <content>"
         )
-        lines.append(f"    <content>{escape(content)}</content>")
-        lines.append("  </source>")
+        yield from _escaped_slices(source.content)
+        yield "</content>\n  </source>"
 
-    lines.append("</sources>")
-    return "\n".join(lines)
+    yield "\n</sources>"
 
 
-def build_insights_xml(insights: list[ExtractedInsight]) -> str:
+def build_insights_xml(insights: Sequence[ExtractedInsight]) -> str:
     """Convert Level 2 ExtractedInsight objects into XML for Level 3."""
-    lines = [f'<categorized_insights total="{len(insights)}">']
+    return "".join(iter_insights_xml(insights))
+
+
+def iter_insights_xml(insights: Sequence[ExtractedInsight]) -> Iterator[str]:
+    """Yield build_insights_xml's output, one chunk per source insight."""
+    yield f'<categorized_insights total="{len(insights)}">'
 
     for insight in insights:
-        lines.append(
+        lines = [
             f'  <source_insight source_id="{escape(insight.source_id)}" '
             f'category="{escape(insight.category)}">'
-        )
-
+        ]
         # Problems
         if insight.problems:
             lines.append("    <problems>")
             for p in insight.problems:
                 sev = escape(p.get("severity", "medium"))
-                lines.append(f'      <problem severity="{sev}">')
+                lines.append(f'      <problem severity="{sev}"{_tickets_attr(p)}>')
                 lines.append(f"        <description>{escape(p.get('description', ''))}</description>")
                 if p.get("evidence"):
                     lines.append(f"        <evidence>{escape(p['evidence'])}</evidence>")
@@ -76,7 +140,9 @@ def build_insights_xml(insights: list[ExtractedInsight]) -> str:
             lines.append("    <pain_points>")
             for pp in insight.pain_points:
                 sev = escape(pp.get("severity", "medium"))
-                lines.append(f'      <pain severity="{sev}">{escape(pp.get("description", ""))}</pain>')
+                lines.append(
+                    f'      <pain severity="{sev}"{_tickets_attr(pp)}>{escape(pp.get("description", ""))}</pain>'
+                )
             lines.append("    </pain_points>")
 
         # Desired outcomes
@@ -94,17 +160,106 @@ def build_insights_xml(insights: list[ExtractedInsight]) -> str:
             lines.append("    </solution_requests>")
 
         lines.append("  </source_insight>")
+        yield "\n" + "\n".join(lines)
+
+    yield "\n</categorized_insights>"
+
+
+# Element (XML) and line tag (compact) per ExtractedInsight list
+_ITEM_TAGS = {
+    "problems": ("problem", "P"),
+    "jobs_to_be_done": ("jtbd", "J"),
+    "pain_points": ("pain", "X"),
+    "desired_outcomes": ("outcome", "D"),
+    "solution_requests": ("request", "R"),
+}
+
+
+def build_insight_clusters_xml(
+    clusters: Sequence[InsightCluster], listed: int = INSIGHT_CLUSTER_LISTED_SOURCES,
+) -> str:
+    """Convert pre-clustered Level 2 items into XML for Level 3.
+
+    Each group is one element in the tag of its kind carrying the
+    representative's text (and evidence). A group mentioned more than
+    once also has its group id, mention count, up to ``listed`` source
+    ids and a per-category breakdown; a single item just has its
+    source_id.
+    """
+    return "".join(iter_insight_clusters_xml(clusters, listed))
+
+
+def iter_insight_clusters_xml(
+    clusters: Sequence[InsightCluster], listed: int = INSIGHT_CLUSTER_LISTED_SOURCES,
+) -> Iterator[str]:
+    """Yield build_insight_clusters_xml's output, one chunk per group."""
+    sources = len({m["source_id"] for cluster in clusters for m in cluster.members})
+    items = sum(cluster.mentions for cluster in clusters)
+    yield f'<insight_clusters total="{len(clusters)}" items="{items}" sources="{sources}">'
+
+    for cluster in clusters:
+        tag = _ITEM_TAGS.get(cluster.kind, ("item",))[0]
+        item = cluster.item
+        if cluster.mentions == 1:
+            attrs = f'source_id="{escape(cluster.members[0]["source_id"])}"'
+        else:
+            ids, more = _listed_sources(cluster, listed)
+            breakdown = ", ".join(f"{cat}: {count}" for cat, count in _cluster_breakdown(cluster).items())
+            attrs = (
+                f'group="{escape(cluster.id)}" mentions="{cluster.mentions}" '
+                f'sources="{escape(" ".join(ids))}{f" (+{more} more)" if more else ""}" '
+                f'breakdown="{escape(breakdown)}"'
+            )
+        if not isinstance(item, dict):
+            yield f"\n  <{tag} {attrs}>{escape(str(item))}</{tag}>"
+            continue
 
-    lines.append("</categorized_insights>")
-    return "\n".join(lines)
+        attrs += f' severity="{escape(item.get("severity", "medium"))}"{_tickets_attr(item)}'
+        lines = [f"  <{tag} {attrs}>", f"    <description>{escape(item.get('description', ''))}</description>"]
+        if item.get("evidence"):
+            cited = "" if cluster.mentions == 1 else f' source_id="{escape(cluster.members[0]["source_id"])}"'
+            lines.append(f"    <evidence{cited}>{escape(item['evidence'])}</evidence>")
+        lines.append(f"  </{tag}>")
+        yield "\n" + "\n".join(lines)
 
+    yield "\n</insight_clusters>"
 
-def build_patterns_xml(patterns: list[Pattern]) -> str:
-    """Convert Level 3 Pattern objects into XML for Level 4."""
-    lines = [f'<patterns total="{len(patterns)}">']
 
-    for pattern in patterns:
-        lines.append("  <pattern>")
+def _listed_sources(cluster: InsightCluster, listed: int) -> tuple[list[str], int]:
+    """The first ``listed`` member source ids and how many are left out."""
+    ids = [m["source_id"] for m in cluster.members[:listed]]
+    return ids, len(cluster.members) - len(ids)
+
+
+def _cluster_breakdown(cluster: InsightCluster) -> dict[str, int]:
+    breakdown = {}
+    for member in cluster.members:
+        breakdown[member["category"]] = breakdown.get(member["category"], 0) + 1
+    return breakdown
+
+
+def _tickets_attr(item: dict) -> str:
+    """' tickets="N"' for items drawn from clustered support tickets."""
+    count = item.get("ticket_count")
+    return f' tickets="{escape(str(count))}"' if count else ""
+
+
+def build_patterns_xml(patterns: Sequence[Pattern], numbered: bool = False) -> str:
+    """Convert Level 3 Pattern objects into XML for Level 4.
+
+    With numbered=True each pattern carries its list index, so a merge
+    prompt can refer back to candidates by position. Evidence for a cited
+    group carries group_sources, the number of sources its quote stands for.
+    """
+    return "".join(iter_patterns_xml(patterns, numbered))
+
+
+def iter_patterns_xml(patterns: Sequence[Pattern], numbered: bool = False) -> Iterator[str]:
+    """Yield build_patterns_xml's output, one chunk per pattern."""
+    yield f'<patterns total="{len(patterns)}">'
+
+    for i, pattern in enumerate(patterns):
+        lines = [f'  <pattern index="{i}">' if numbered else "  <pattern>"]
         lines.append(f"    <name>{escape(pattern.name)}</name>")
         lines.append(f"    <description>{escape(pattern.description)}</description>")
         lines.append(f"    <frequency>{pattern.frequency}</frequency>")
@@ -117,10 +272,12 @@ def build_patterns_xml(patterns: list[Pattern]) -> str:
         if pattern.evidence:
             lines.append("    <evidence>")
             for e in pattern.evidence:
+                group = len(e.get("sources") or ())
                 lines.append(
                     f'      <source source_id="{escape(e.get("source_id", ""))}" '
                     f'category="{escape(e.get("category", ""))}" '
-                    f'weight="{e.get("weight", 1.0)}">'
+                    f'weight="{e.get("weight", 1.0)}"'
+                    + (f' group_sources="{group}">' if group > 1 else ">")
                 )
                 lines.append(f"        {escape(e.get('quote', ''))}")
                 lines.append("      </source>")
@@ -134,6 +291,246 @@ def build_patterns_xml(patterns: list[Pattern]) -> str:
             lines.append("    </source_breakdown>")
 
         lines.append("  </pattern>")
+        yield "\n" + "\n".join(lines)
+
+    yield "\n</patterns>"
 
-    lines.append("</patterns>")
-    return "\n".join(lines)
+
+# ---------------------------------------------------------------------------
+# Compact encoding: a line-oriented alternative to the XML above for large
+# Level 3/4 prompts. One-letter item tags and severities, short interned
+# source ids ("C1", "S12") whose categories and weights are given once in a
+# legend. Claude cites the short ids; SourceIdTable.resolve maps them back.
+# ---------------------------------------------------------------------------
+
+_COMPACT_SEVERITY = {"high": "h", "medium": "m", "low": "l"}
+
+
+class SourceIdTable:
+    """Interned short ids for sources, stable for the lifetime of the table.
+
+    A short id is the category's code letter (see category_code) plus a
+    running number within that category, in order of first use.
+    """
+
+    def __init__(self):
+        self._short: dict[str, str] = {}
+        self._full: dict[str, str] = {}
+        self._counts: dict[str, int] = {}
+
+    def intern(self, source_id: str, category: str) -> str:
+        """Return the short id for source_id, assigning one on first use."""
+        short = self._short.get(source_id)
+        if short is None:
+            code = category_code(category)
+            self._counts[code] = self._counts.get(code, 0) + 1
+            short = f"{code}{self._counts[code]}"
+            self._short[source_id] = short
+            self._full[short] = source_id
+        return short
+
+    def resolve(self, source_id: str) -> str:
+        """Map a short id back to the source id (other values pass through)."""
+        return self._full.get(str(source_id).strip().lstrip("@"), source_id)
+
+
+def category_code(category: str) -> str:
+    """Short code for a category: its initials, uppercased ("support_tickets" -> "S")."""
+    codes = _category_codes()
+    if category in codes:
+        return codes[category]
+    code = "".join(word[:1] for word in category.split("_")).upper() or "U"
+    return code if code != GROUP_ID_PREFIX else code + "X"
+
+
+def _category_codes() -> dict[str, str]:
+    codes = {}
+    for category in INPUT_CATEGORIES:
+        code = category[:1].upper()
+        # Lengthen on a clash: "customer_calls" -> "C", "compliance" -> "CO";
+        # GROUP_ID_PREFIX is taken by pre-clustered item groups
+        length = 1
+        while code in codes.values() or code == GROUP_ID_PREFIX:
+            length += 1
+            code = category[:length].upper()
+        codes[category] = code
+    return codes
+
+
+def _compact_text(text) -> str:
+    """Collapse a value to one line."""
+    return " ".join(str(text).split())
+
+
+def _compact_legend(categories: list[str]) -> str:
+    entries = ", ".join(
+        f"{category_code(cat)}={cat} (weight {INPUT_CATEGORIES.get(cat, {}).get('weight', 1.0)})"
+        for cat in categories
+    )
+    return f"sources: {entries}; cite sources by their short id (e.g. {category_code(categories[0])}1)"
+
+
+def build_insights_compact(insights: Sequence[ExtractedInsight], ids: SourceIdTable) -> str:
+    """Compact alternative to build_insights_xml for Level 3.
+
+    Each source is a "@<short id>" line followed by one line per item:
+    P = problem, J = job to be done, X = pain point, D = desired outcome,
+    R = solution request. Severities are h/m/l, "xN" marks items standing
+    for N support tickets, and a problem's evidence follows " | ".
+    """
+    return "".join(iter_insights_compact(insights, ids))
+
+
+def iter_insights_compact(insights: Sequence[ExtractedInsight], ids: SourceIdTable) -> Iterator[str]:
+    """Yield build_insights_compact's output, one chunk per source insight."""
+    categories = list(dict.fromkeys(insight.category for insight in insights)) or ["miscellaneous"]
+    yield (
+        f'<insights total="{len(insights)}" format="compact">\n'
+        f"legend: {_compact_legend(categories)}; items: P=problem, J=job to be done, "
+        "X=pain point, D=desired outcome, R=solution request; severity h/m/l; "
+        "xN = stands for N support tickets"
+    )
+    for insight in insights:
+        lines = [f"@{ids.intern(insight.source_id, insight.category)}"]
+        for p in insight.problems:
+            line = f"P {_compact_item_head(p)}{_compact_text(p.get('description', ''))}"
+            if p.get("evidence"):
+                line += f' | "{_compact_text(p["evidence"])}"'
+            lines.append(line)
+        for j in insight.jobs_to_be_done:
+            lines.append(f"J {_compact_text(j)}")
+        for pp in insight.pain_points:
+            lines.append(f"X {_compact_item_head(pp)}{_compact_text(pp.get('description', ''))}")
+        for o in insight.desired_outcomes:
+            lines.append(f"D {_compact_text(o)}")
+        for sr in insight.solution_requests:
+            lines.append(f"R {_compact_text(sr)}")
+        yield "\n" + "\n".join(lines)
+    yield "\n</insights>"
+
+
+def _compact_item_head(item: dict) -> str:
+    severity = str(item.get("severity", "medium"))
+    head = _COMPACT_SEVERITY.get(severity, severity) + " "
+    if item.get("ticket_count"):
+        head += f"x{item['ticket_count']} "
+    return head
+
+
+def build_insight_clusters_compact(
+    clusters: Sequence[InsightCluster], ids: SourceIdTable, listed: int = INSIGHT_CLUSTER_LISTED_SOURCES,
+) -> str:
+    """Compact alternative to build_insight_clusters_xml for Level 3.
+
+    One line per group: item tag (as in build_insights_compact), the
+    source's short id (or, for a group mentioned more than once, its
+    group id and "nN" for N mentions), severity, "xN" for N support
+    tickets, the representative's text and evidence. A group's sources
+    follow on the next line ("+N" for the ones not listed).
+    """
+    return "".join(iter_insight_clusters_compact(clusters, ids, listed))
+
+
+def iter_insight_clusters_compact(
+    clusters: Sequence[InsightCluster], ids: SourceIdTable, listed: int = INSIGHT_CLUSTER_LISTED_SOURCES,
+) -> Iterator[str]:
+    """Yield build_insight_clusters_compact's output, one chunk per group."""
+    categories = list(dict.fromkeys(
+        m["category"] for cluster in clusters for m in cluster.members
+    )) or ["miscellaneous"]
+    sources = len({m["source_id"] for cluster in clusters for m in cluster.members})
+    items = sum(cluster.mentions for cluster in clusters)
+    yield (
+        f'<insights total="{len(clusters)}" items="{items}" sources="{sources}" format="compact">\n'
+        f"legend: {_compact_legend(categories)}; items: P=problem, J=job to be done, "
+        "X=pain point, D=desired outcome, R=solution request; severity h/m/l; "
+        "xN = stands for N support tickets; each item names its source, or a group "
+        "(e.g. G3 n5 = near-identical items mentioned 5 times) whose sources follow "
+        "on the next line (+N = N more)"
+    )
+    for cluster in clusters:
+        item = cluster.item
+        members = cluster.members
+        line = _ITEM_TAGS.get(cluster.kind, ("item", "?"))[1]
+        if cluster.mentions == 1:
+            line += f" {ids.intern(members[0]['source_id'], members[0]['category'])} "
+        else:
+            line += f" {cluster.id} n{cluster.mentions} "
+        if isinstance(item, dict):
+            line += _compact_item_head(item) + _compact_text(item.get("description", ""))
+            if item.get("evidence"):
+                line += f' | "{_compact_text(item["evidence"])}"'
+        else:
+            line += _compact_text(item)
+        if cluster.mentions > 1:
+            listed_ids, more = _listed_sources(cluster, listed)
+            shorts = " ".join(ids.intern(m["source_id"], m["category"]) for m in members[:len(listed_ids)])
+            line += f"\n  {shorts}{f' +{more}' if more else ''}"
+        yield "\n" + line
+    yield "\n</insights>"
+
+
+def build_patterns_compact(patterns: Sequence[Pattern], ids: SourceIdTable, numbered: bool = False) -> str:
+    """Compact alternative to build_patterns_xml for Level 3 merges and Level 4.
+
+    One header line per pattern ("[index] name | severity | freq N |
+    score S | x" where x flags a cross-org signal), then its description,
+    impact, evidence (short id, "+N" for the other sources of a cited
+    group, and quote) and category breakdown.
+    """
+    return "".join(iter_patterns_compact(patterns, ids, numbered))
+
+
+def iter_patterns_compact(
+    patterns: Sequence[Pattern], ids: SourceIdTable, numbered: bool = False,
+) -> Iterator[str]:
+    """Yield build_patterns_compact's output, one chunk per pattern."""
+    categories = list(dict.fromkeys(
+        e.get("category", "miscellaneous") for p in patterns for e in p.evidence
+    )) or ["miscellaneous"]
+    yield (
+        f'<patterns total="{len(patterns)}" format="compact">\n'
+        f"legend: {_compact_legend(categories)}; severity h/m/l; x = cross-org signal"
+        + ("; +N after a source = its quote stands for N more sources"
+           if any(len(e.get("sources") or ()) > 1 for p in patterns for e in p.evidence) else "")
+    )
+    for i, pattern in enumerate(patterns):
+        head = f"[{i}] " if numbered else "- "
+        severity = _COMPACT_SEVERITY.get(pattern.severity, pattern.severity)
+        head += (
+            f"{_compact_text(pattern.name)} | {severity} | freq {pattern.frequency} "
+            f"| score {pattern.weighted_score:.1f}"
+        )
+        if pattern.cross_org_signal:
+            head += " | x"
+        lines = [head, f"  {_compact_text(pattern.description)}"]
+        if pattern.business_impact:
+            lines.append(f"  impact: {_compact_text(pattern.business_impact)}")
+        for e in pattern.evidence:
+            short = ids.intern(e.get("source_id", ""), e.get("category", "miscellaneous"))
+            group = len(e.get("sources") or ())
+            if group > 1:
+                short += f" +{group - 1}"
+            lines.append(f'  {short}: "{_compact_text(e.get("quote", ""))}"')
+        if pattern.source_categories:
+            breakdown = ", ".join(f"{cat} {count}" for cat, count in pattern.source_categories.items())
+            lines.append(f"  breakdown: {breakdown}")
+        yield "\n" + "\n".join(lines)
+    yield "\n</patterns>"
+
+
+def iter_level_3_insights(
+    insights: Sequence, ids: SourceIdTable, compact: bool, grouped: bool,
+) -> Iterator[str]:
+    """Insights (or, with grouped, InsightCluster groups) as written into a Level 3 prompt.
+
+    Synthesizer and the run planner both encode Level 3 input through
+    this, so planned and actual prompt sizes match.
+    """
+    if grouped:
+        if compact:
+            return iter_insight_clusters_compact(insights, ids)
+        return iter_insight_clusters_xml(insights)
+    if compact:
+        return iter_insights_compact(insights, ids)
+    return iter_insights_xml(insights)
@@ -0,0 +1,6 @@
+"""Shared pytest setup: make the app's top-level modules importable."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
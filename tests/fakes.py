@@ -0,0 +1,147 @@
+"""Fake Anthropic client, uploads and helpers for tests (no network calls)."""
+
+import io
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from lib.models import Source
+from lib.prompts import LEVEL_2_SYSTEM, LEVEL_3_SYSTEM
+
+
+def make_sources(count: int, category: str = "customer_calls", weight: float = 3.0) -> list[Source]:
+    return [
+        Source(id=f"{category}_{i:03d}", filename=f"{category}_{i:03d}.txt", category=category,
+               content=f"Source {i} says the export is slow. " * 5, weight=weight)
+        for i in range(count)
+    ]
+
+
+def request_text(request: dict) -> str:
+    """All user-message text of a messages.create request."""
+    content = request["messages"][0]["content"]
+    if isinstance(content, list):
+        return "".join(block["text"] for block in content)
+    return content
+
+
+def source_ids(request: dict) -> list[str]:
+    """Ids of the sources in a Level 2 request, in prompt order."""
+    return re.findall(r'<source id="([^"]+)"', request_text(request))
+
+
+def level_2_reply(request: dict) -> str:
+    """A valid Level 2 response: one insight per source in the request."""
+    return json.dumps([insight_dict(source_id) for source_id in source_ids(request)])
+
+
+def pyramid_reply(request: dict) -> str:
+    """Answer any level: Level 2 insights, one pattern, or a one-opportunity tree."""
+    system = request["system"][0]["text"]
+    if system == LEVEL_2_SYSTEM:
+        return level_2_reply(request)
+    if system == LEVEL_3_SYSTEM:
+        cited = re.findall(r'source_id="([^"]+)"', request_text(request))
+        return json.dumps([{
+            "name": "Slow export", "description": "Exports time out", "severity": "high",
+            "business_impact": "Churn", "evidence": [{"source_id": i, "quote": "slow"} for i in cited],
+        }])
+    return json.dumps({
+        "desired_outcomes": [{"statement": "Faster exports", "opportunities": [
+            {"name": "Export speed", "weighted_score": 3.0, "source_count": 1},
+        ]}],
+        "cross_cutting_themes": [],
+    })
+
+
+def insight_dict(source_id: str, category: str = "customer_calls") -> dict:
+    return {
+        "source_id": source_id,
+        "category": category,
+        "problems": [{"description": f"Slow export ({source_id})", "severity": "high", "evidence": "slow"}],
+        "jobs_to_be_done": [],
+        "pain_points": [],
+        "desired_outcomes": [],
+        "solution_requests": [],
+    }
+
+
+def message(text: str, stop_reason: str = "end_turn", input_tokens: int = 100, output_tokens: int = 50):
+    return SimpleNamespace(
+        stop_reason=stop_reason,
+        content=[SimpleNamespace(text=text)],
+        usage=SimpleNamespace(
+            input_tokens=input_tokens, output_tokens=output_tokens,
+            cache_creation_input_tokens=0, cache_read_input_tokens=0,
+        ),
+    )
+
+
+class Upload(io.BytesIO):
+    """Stand-in for a Streamlit UploadedFile."""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+
+
+class FakeMessages:
+    """messages.create / messages.stream answering from a reply function.
+
+    reply(request) returns the response text, or a (text, stop_reason)
+    pair, or raises. Every request is recorded in ``requests``.
+    """
+
+    def __init__(self, reply=level_2_reply, latency: float = 0.0, chunk_chars: int = 40):
+        self.reply = reply
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.requests: list[dict] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def create(self, **request):
+        with self._lock:
+            self.requests.append(request)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            result = self.reply(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        text, stop_reason = result if isinstance(result, tuple) else (result, "end_turn")
+        return message(text, stop_reason)
+
+    def stream(self, **request):
+        return _FakeStream(self.create(**request), self.chunk_chars)
+
+
+class _FakeStream:
+    def __init__(self, final, chunk_chars: int):
+        self._final = final
+        self._chunk_chars = chunk_chars
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        text = self._final.content[0].text
+        for i in range(0, len(text), self._chunk_chars):
+            yield text[i:i + self._chunk_chars]
+
+    def get_final_message(self):
+        return self._final
+
+
+class FakeClient:
+    def __init__(self, reply=level_2_reply, **kwargs):
+        self.messages = FakeMessages(reply, **kwargs)
@@ -0,0 +1,178 @@
+"""Offline bulk mode driven by a fake BatchBackend."""
+
+from functools import partial
+
+import anthropic
+import pytest
+
+import lib.synthesizer
+from lib.batching import BatchPlanner
+from lib.bulk import BatchBackend, BatchResult
+from lib.prompts import LEVEL_2_SYSTEM
+from lib.scheduler import RequestScheduler
+from lib.synthesizer import Synthesizer
+from lib.tokens import TokenEstimator
+
+from fakes import FakeClient, level_2_reply, make_sources, message, pyramid_reply, request_text
+
+
+class FakeBatchBackend(BatchBackend):
+    """Answers each request with reply(request) once a job has been polled enough.
+
+    reply returns a message, or a string used as the error of a failed
+    request. Results come back in reverse order, as a real service may
+    return them in any order.
+    """
+
+    def __init__(self, reply=lambda params: message(level_2_reply(params)), polls_until_done: int = 2):
+        self.reply = reply
+        self.polls_until_done = polls_until_done
+        self.jobs: dict[str, list[dict]] = {}
+        self.polls: dict[str, int] = {}
+
+    def submit(self, requests: list[dict]) -> str:
+        job_id = f"job-{len(self.jobs)}"
+        self.jobs[job_id] = list(requests)
+        self.polls[job_id] = 0
+        return job_id
+
+    def is_done(self, batch_id: str) -> bool:
+        self.polls[batch_id] += 1
+        return self.polls[batch_id] >= self.polls_until_done
+
+    def results(self, batch_id: str):
+        assert self.polls[batch_id] >= self.polls_until_done, "results read before the job finished"
+        for request in reversed(self.jobs[batch_id]):
+            outcome = self.reply(request["params"])
+            if isinstance(outcome, str):
+                yield BatchResult(request["custom_id"], error=outcome)
+            else:
+                yield BatchResult(request["custom_id"], message=outcome)
+
+
+@pytest.fixture(autouse=True)
+def two_sources_per_batch(monkeypatch):
+    monkeypatch.setattr(lib.synthesizer, "BatchPlanner", partial(BatchPlanner, max_sources=2))
+
+
+class FlakyBatchBackend(FakeBatchBackend):
+    """Fails each kind of batch call once with a connection error before it works."""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = {"submit": 0, "is_done": 0, "results": 0}
+
+    def _fail_once(self, method: str):
+        self.failures[method] += 1
+        if self.failures[method] == 1:
+            raise anthropic.APIConnectionError(message="connection reset", request=None)
+
+    def submit(self, requests):
+        self._fail_once("submit")
+        return super().submit(requests)
+
+    def is_done(self, batch_id):
+        self._fail_once("is_done")
+        return super().is_done(batch_id)
+
+    def results(self, batch_id):
+        yield from super().results(batch_id)
+        self._fail_once("results")
+
+
+def make_synthesizer(backend, client=None, **kwargs) -> Synthesizer:
+    return Synthesizer(
+        "test-key", client=client or FakeClient(pyramid_reply), bulk_backend=backend,
+        bulk_poll_interval=0, token_estimator=TokenEstimator(path=None),
+        deduplicate=False, normalize=False, **kwargs,
+    )
+
+
+def level_2_calls(client) -> list[dict]:
+    return [r for r in client.messages.requests if r["system"][0]["text"] == LEVEL_2_SYSTEM]
+
+
+def test_all_batches_go_in_one_job_and_map_back_by_custom_id():
+    backend = FakeBatchBackend()
+    client = FakeClient(pyramid_reply)
+    sources = make_sources(7)
+
+    insights = make_synthesizer(backend, client)._categorize(sources)
+
+    assert [i.source_id for i in insights] == [s.id for s in sources]
+    assert list(backend.jobs) == ["job-0"]
+    assert len(backend.jobs["job-0"]) == 4
+    assert backend.polls["job-0"] == 2
+    assert level_2_calls(client) == []
+
+
+def test_full_run_continues_to_levels_3_and_4():
+    backend = FakeBatchBackend()
+    client = FakeClient(pyramid_reply)
+
+    result = make_synthesizer(backend, client).run(make_sources(5), [])
+
+    assert result.sources_summary["total"] == 5
+    assert result.desired_outcomes[0].opportunities
+    assert level_2_calls(client) == []
+    assert result.api_usage["calls"] == 3 + 2   # three bulk results, Levels 3 and 4
+
+
+def test_batch_service_calls_are_retried():
+    backend = FlakyBatchBackend()
+    client = FakeClient(pyramid_reply)
+    scheduler = RequestScheduler(sleep=lambda seconds: None)
+    sources = make_sources(5)
+
+    insights = make_synthesizer(backend, client, scheduler=scheduler)._categorize(sources)
+
+    assert [i.source_id for i in insights] == [s.id for s in sources]
+    assert scheduler.retries == 3
+    assert list(backend.jobs) == ["job-0"]
+    assert level_2_calls(client) == []
+
+
+def test_batch_backend_is_abstract():
+    with pytest.raises(TypeError):
+        BatchBackend()
+
+
+@pytest.mark.parametrize("failure", ["errored: overloaded", "expired", "truncated", "invalid json"])
+def test_failed_requests_fall_back_to_interactive_calls(failure):
+    def reply(params):
+        if "customer_calls_002" not in request_text(params):
+            return message(level_2_reply(params))
+        if failure == "truncated":
+            return message(level_2_reply(params)[:-5], stop_reason="max_tokens")
+        if failure == "invalid json":
+            return message("not json")
+        return failure
+
+    client = FakeClient(pyramid_reply)
+    sources = make_sources(6)
+    insights = make_synthesizer(FakeBatchBackend(reply), client)._categorize(sources)
+
+    assert [i.source_id for i in insights] == [s.id for s in sources]
+    retried = level_2_calls(client)
+    assert len(retried) == 1
+    assert "customer_calls_002" in request_text(retried[0])
+
+
+def test_large_runs_are_split_into_several_jobs(monkeypatch):
+    backend = FakeBatchBackend()
+    monkeypatch.setattr(lib.synthesizer, "BULK_MAX_JOB_BYTES", 1)
+    sources = make_sources(6)
+
+    insights = make_synthesizer(backend)._categorize(sources)
+
+    assert [i.source_id for i in insights] == [s.id for s in sources]
+    assert list(backend.jobs) == ["job-0", "job-1", "job-2"]
+    assert all(backend.polls[job] == 2 for job in backend.jobs)
+
+
+def test_job_that_never_finishes_times_out(monkeypatch):
+    backend = FakeBatchBackend(polls_until_done=10**9)
+    monkeypatch.setattr(lib.synthesizer, "BULK_MAX_WAIT_SECONDS", 0)
+
+    with pytest.raises(lib.synthesizer.SynthesisError, match="did not finish"):
+        make_synthesizer(backend)._categorize(make_sources(2))
@@ -0,0 +1,27 @@
+"""Cache keys: what invalidates a cached parse or Level 2 insight."""
+
+from dataclasses import replace
+
+import lib.cache
+from lib.cache import InsightCache, ParseCache
+from lib.chunking import split_source
+
+from fakes import make_sources
+
+
+def test_parse_key_covers_the_parser_version(monkeypatch):
+    key = ParseCache.key_for("tickets.csv", b"id,description\n1,Export is slow\n", "support_tickets")
+    monkeypatch.setattr(lib.cache, "PARSER_VERSION", lib.cache.PARSER_VERSION + 1)
+    assert ParseCache.key_for("tickets.csv", b"id,description\n1,Export is slow\n", "support_tickets") != key
+
+
+def test_insight_key_follows_the_level_2_context(monkeypatch):
+    source = make_sources(1)[0]
+    key = InsightCache.key_for(source)
+    assert InsightCache.key_for(replace(source, id="renumbered_009", filename="other.txt")) == key
+
+    chunk = split_source(replace(source, content="Export is slow. " * 2000))[0]
+    assert InsightCache.key_for(chunk) != InsightCache.key_for(replace(chunk, metadata={}))
+
+    monkeypatch.setattr(lib.cache, "build_level_2_context", lambda sources_xml: f"<batch>{sources_xml}</batch>")
+    assert InsightCache.key_for(source) != key
@@ -0,0 +1,38 @@
+"""Resuming a failed run from its checkpoints."""
+
+import pytest
+
+from lib.checkpoint import CheckpointStore
+from lib.prompts import LEVEL_4_SYSTEM
+from lib.synthesizer import Synthesizer
+from lib.tokens import TokenEstimator
+
+from fakes import FakeClient, make_sources, pyramid_reply
+
+
+def test_resume_after_level_3_reports_the_insight_clusters(tmp_path):
+    sources = make_sources(6)
+    store = CheckpointStore(root=str(tmp_path))
+
+    def failing_level_4(request):
+        if request["system"][0]["text"] == LEVEL_4_SYSTEM:
+            raise RuntimeError("Level 4 failed")
+        return pyramid_reply(request)
+
+    failed = Synthesizer(
+        "test-key", client=FakeClient(failing_level_4), checkpoints=store,
+        token_estimator=TokenEstimator(path=None), precluster=True,
+    )
+    with pytest.raises(RuntimeError):
+        failed.run(sources, [])
+    fresh = Synthesizer(
+        "test-key", client=FakeClient(pyramid_reply), token_estimator=TokenEstimator(path=None), precluster=True,
+    ).run(sources, [])
+
+    client = FakeClient(pyramid_reply)
+    resumed = Synthesizer(
+        "test-key", client=client, checkpoints=store, token_estimator=TokenEstimator(path=None), precluster=True,
+    ).run(sources, [], resume_run_id=failed.run_id)
+
+    assert [r["system"][0]["text"] for r in client.messages.requests] == [LEVEL_4_SYSTEM]
+    assert resumed.sources_summary["insight_clusters"] == fresh.sources_summary["insight_clusters"]
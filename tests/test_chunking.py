@@ -0,0 +1,34 @@
+"""Merging chunk insights back into one insight per parent source."""
+
+from lib.chunking import merge_chunk_insights
+from lib.models import ExtractedInsight
+
+
+def insight(source_id: str, problem: str, severity: str = "medium") -> ExtractedInsight:
+    return ExtractedInsight(
+        source_id=source_id, category="customer_calls",
+        problems=[{"description": problem, "severity": severity}],
+    )
+
+
+def test_chunks_fold_into_their_parent():
+    merged = merge_chunk_insights([
+        insight("call_001#1", "Export is slow"),
+        insight("call_002", "Login fails"),
+        insight("call_001#2", "export is  slow", severity="high"),
+        insight("call_001#3", "Search is broken"),
+    ])
+    assert [m.source_id for m in merged] == ["call_001", "call_002"]
+    assert merged[0].problems == [
+        {"description": "Export is slow", "severity": "high"},
+        {"description": "Search is broken", "severity": "medium"},
+    ]
+
+
+def test_insights_sharing_a_source_id_are_all_kept():
+    insights = [
+        insight("call_001", "Export is slow"),
+        insight("call_001", "Login fails"),
+        insight("ticket#A", "Search is broken"),
+    ]
+    assert merge_chunk_insights(insights) == insights
@@ -0,0 +1,96 @@
+"""Concurrent Level 2: ordering, parallelism and error propagation."""
+
+import threading
+import time
+from functools import partial
+
+import pytest
+
+import lib.synthesizer
+from lib.batching import BatchPlanner
+from lib.synthesizer import Synthesizer
+from lib.tokens import TokenEstimator
+
+from fakes import FakeClient, level_2_reply, make_sources, pyramid_reply, source_ids
+
+LATENCY = 0.2
+
+
+@pytest.fixture(autouse=True)
+def two_sources_per_batch(monkeypatch):
+    monkeypatch.setattr(lib.synthesizer, "BatchPlanner", partial(BatchPlanner, max_sources=2))
+
+
+def make_synthesizer(client, **kwargs) -> Synthesizer:
+    return Synthesizer(
+        "test-key", client=client, token_estimator=TokenEstimator(path=None),
+        deduplicate=False, normalize=False, **kwargs,
+    )
+
+
+def slower_first(request):
+    """Earlier batches answer later, so completion order is reversed."""
+    first = int(source_ids(request)[0].rsplit("_", 1)[1])
+    time.sleep(LATENCY * (1 - first / 10))
+    return level_2_reply(request)
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_batches_run_in_parallel_and_insights_keep_source_order(stream):
+    client = FakeClient(slower_first)
+    synthesizer = make_synthesizer(client, max_concurrency=4, stream=stream)
+    sources = make_sources(8)
+
+    started = time.perf_counter()
+    insights = synthesizer._categorize(sources)
+    elapsed = time.perf_counter() - started
+
+    assert [i.source_id for i in insights] == [s.id for s in sources]
+    assert len(client.messages.requests) == 4
+    assert client.messages.max_in_flight == 4
+    assert elapsed < 2 * LATENCY  # sequential would take ~3.4 * LATENCY
+
+
+def test_max_concurrency_one_is_sequential():
+    client = FakeClient(level_2_reply, latency=0.01)
+    insights = make_synthesizer(client, max_concurrency=1)._categorize(make_sources(6))
+
+    assert len(insights) == 6
+    assert client.messages.max_in_flight == 1
+
+
+def test_max_concurrency_bounds_calls_in_flight():
+    client = FakeClient(level_2_reply, latency=0.05)
+    make_synthesizer(client, max_concurrency=2)._categorize(make_sources(12))
+
+    assert len(client.messages.requests) == 6
+    assert client.messages.max_in_flight == 2
+
+
+def test_first_batch_failure_is_raised_to_the_caller():
+    def reply(request):
+        if "customer_calls_002" in source_ids(request):
+            raise ValueError("bad batch")
+        time.sleep(0.05)
+        return level_2_reply(request)
+
+    synthesizer = make_synthesizer(FakeClient(reply), max_concurrency=3, stream=False)
+    with pytest.raises(ValueError, match="bad batch"):
+        synthesizer._categorize(make_sources(10))
+
+
+def test_insight_callbacks_fire_on_the_calling_thread():
+    calls = []
+
+    def on_insight(insight, done, total):
+        calls.append((insight.source_id, done, total, threading.get_ident()))
+
+    client = FakeClient(pyramid_reply, latency=0.02)
+    result = make_synthesizer(client, max_concurrency=4).run(
+        make_sources(8), [], insight_callback=on_insight
+    )
+
+    assert sorted(c[0] for c in calls) == [s.id for s in make_sources(8)]
+    assert [c[1] for c in calls] == list(range(1, 9))
+    assert {c[3] for c in calls} == {threading.get_ident()}
+    assert result.desired_outcomes[0].opportunities[0].name == "Export speed"
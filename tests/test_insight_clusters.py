@@ -0,0 +1,116 @@
+"""Level 3 pre-clustering: group citations, metrics and prompt size."""
+
+import json
+
+from lib.clustering import cluster_insights
+from lib.models import ExtractedInsight, Source
+from lib.synthesizer import Synthesizer
+from lib.tokens import TokenEstimator
+from lib.xml_builder import SourceIdTable, build_patterns_compact, build_patterns_xml
+
+from fakes import FakeClient
+
+TEXT = "Export to PDF times out on large fleets"
+
+
+def make_corpus(count: int):
+    categories = [("support_tickets", 1.5), ("customer_calls", 3.0)]
+    sources, insights = [], []
+    for i in range(count):
+        category, weight = categories[i % 2]
+        source_id = f"{category}_{i:03d}"
+        sources.append(Source(id=source_id, filename=f"{source_id}.txt", category=category,
+                              content="", weight=weight))
+        problem = {"description": TEXT, "severity": "high", "evidence": f"quote {i}"}
+        if category == "support_tickets":
+            problem["ticket_count"] = 10
+        insights.append(ExtractedInsight(source_id=source_id, category=category, problems=[problem]))
+    return sources, insights
+
+
+def parse_group_citation(count: int):
+    sources, insights = make_corpus(count)
+    synthesizer = Synthesizer("test-key", client=FakeClient(), token_estimator=TokenEstimator(path=None))
+    clusters = cluster_insights(insights)
+    synthesizer._groups = {cluster.id: cluster for cluster in clusters}
+    synthesizer._sources_by_id = {s.id: s for s in sources}
+    raw = json.dumps([{"name": "Slow export", "evidence": [{"source_id": clusters[0].id, "quote": "slow"}]}])
+    return synthesizer._parse_level_3_response(raw)[0], clusters[0]
+
+
+def test_cited_group_is_one_evidence_entry_counting_all_members():
+    pattern, group = parse_group_citation(40)
+
+    assert group.mentions == 40
+    assert len(pattern.evidence) == 1
+    entry = pattern.evidence[0]
+    assert entry["group"] == group.id and entry["mentions"] == 40
+    assert len(entry["sources"]) == 40
+    # 20 ticket sources of 10 tickets each (weight 1.5), 20 calls (weight 3.0)
+    assert pattern.frequency == 20 * 10 + 20
+    assert pattern.weighted_score == 20 * 10 * 1.5 + 20 * 3.0
+    assert pattern.source_categories == {"support_tickets": 20, "customer_calls": 20}
+    assert pattern.cross_org_signal
+
+
+def test_downstream_prompt_size_does_not_grow_with_group_size():
+    small, _ = parse_group_citation(4)
+    large, _ = parse_group_citation(400)
+
+    for encode in (build_patterns_xml, lambda p: build_patterns_compact(p, SourceIdTable())):
+        small_prompt, large_prompt = encode([small]), encode([large])
+        assert len(large_prompt) - len(small_prompt) < 40
+    assert 'group_sources="400"' in build_patterns_xml([large])
+    assert " +399:" in build_patterns_compact([large], SourceIdTable())
+
+
+TICKETS = Source(
+    id="support_tickets_001", filename="tickets.csv", category="support_tickets", weight=1.5,
+    content=(
+        "similar_tickets: 7\nsubject: Export\nExport to PDF times out on large fleets"
+        "\n\n---\n\nsimilar_tickets: 3\nsubject: Login\nLogin fails after the SSO redirect"
+    ),
+    metadata={"tickets": 10, "ticket_clusters": 2, "tickets_represented": 10},
+)
+
+
+def parse_ticket_citation(evidence: list[dict]):
+    synthesizer = Synthesizer("test-key", client=FakeClient(), token_estimator=TokenEstimator(path=None))
+    synthesizer._sources_by_id = {TICKETS.id: TICKETS}
+    return synthesizer._parse_level_3_response(json.dumps([{"name": "Slow export", "evidence": evidence}]))[0]
+
+
+def test_ticket_counts_come_from_the_parsed_clusters():
+    pattern = parse_ticket_citation([{
+        "source_id": TICKETS.id, "quote": "“Export to PDF times out...”", "tickets": 40,
+    }])
+    assert pattern.evidence[0]["tickets"] == 7
+    assert "tickets_estimated" not in pattern.evidence[0]
+    assert pattern.frequency == 7
+
+
+def test_unmatched_quote_falls_back_to_claude_within_the_represented_tickets():
+    pattern = parse_ticket_citation([{"source_id": TICKETS.id, "quote": "exports are slow", "tickets": 40}])
+    assert pattern.evidence[0]["tickets"] == 10
+    assert pattern.evidence[0]["tickets_estimated"] is True
+
+
+def test_group_member_tickets_come_from_the_quotes_of_its_items():
+    insights = [
+        ExtractedInsight(source_id=TICKETS.id, category="support_tickets", problems=[{
+            "description": TEXT, "severity": "high", "ticket_count": 40,
+            "evidence": "Export to PDF times out on large fleets",
+        }]),
+        ExtractedInsight(source_id="customer_calls_001", category="customer_calls", problems=[{
+            "description": TEXT, "severity": "high", "evidence": "PDF export never finishes",
+        }]),
+    ]
+    synthesizer = Synthesizer("test-key", client=FakeClient(), token_estimator=TokenEstimator(path=None))
+    clusters = cluster_insights(insights)
+    synthesizer._groups = {cluster.id: cluster for cluster in clusters}
+    synthesizer._sources_by_id = {TICKETS.id: TICKETS}
+    raw = json.dumps([{"name": "Slow export", "evidence": [{"source_id": clusters[0].id, "quote": "slow"}]}])
+    entry = synthesizer._parse_level_3_response(raw)[0].evidence[0]
+
+    assert entry["source_tickets"] == {TICKETS.id: 7}
+    assert "tickets_estimated" not in entry
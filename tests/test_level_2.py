@@ -0,0 +1,144 @@
+"""Level 2 categorization through Synthesizer with a fake client."""
+
+import json
+
+import pytest
+
+from lib.synthesizer import Synthesizer, StreamInterruptedError, TruncatedResponseError
+from lib.tokens import TokenEstimator
+
+from fakes import FakeClient, FakeMessages, insight_dict, level_2_reply, make_sources, source_ids
+
+
+def make_synthesizer(client, **kwargs) -> Synthesizer:
+    kwargs.setdefault("token_estimator", TokenEstimator(path=None))
+    kwargs.setdefault("deduplicate", False)
+    kwargs.setdefault("normalize", False)
+    return Synthesizer("test-key", client=client, **kwargs)
+
+
+def truncated_after(insights: list[dict]):
+    """Reply with the given insights, then cut off mid-way through the next one."""
+    def reply(request):
+        text = json.dumps(insights)[:-1] + ', {"source_id": "cut off'
+        return text, "max_tokens"
+    return reply
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_truncation_every_time_bisects_and_raises_instead_of_recursing(stream):
+    # Each response completes one insight, but for an id outside the batch
+    client = FakeClient(truncated_after([insight_dict("hallucinated_001")]))
+    synthesizer = make_synthesizer(client, stream=stream)
+
+    with pytest.raises(TruncatedResponseError):
+        synthesizer._categorize_batch(make_sources(4))
+
+    # Halving 4 -> 2 -> 1 and failing on the first single source: at most 3 calls
+    assert len(client.messages.requests) <= 3
+    assert [len(source_ids(r)) for r in client.messages.requests] == [4, 2, 1]
+
+
+def test_truncation_after_progress_rerequests_only_missing_sources():
+    calls = []
+
+    def reply(request):
+        ids = source_ids(request)
+        calls.append(ids)
+        if len(calls) == 1:
+            return truncated_after([insight_dict(ids[0])])(request)
+        return level_2_reply(request)
+
+    synthesizer = make_synthesizer(FakeClient(reply), stream=True)
+    sources = make_sources(3)
+    insights = synthesizer._categorize_batch(sources)
+
+    assert [i.source_id for i in insights] == [s.id for s in sources]
+    assert calls == [[s.id for s in sources], [s.id for s in sources[1:]]]
+
+
+def test_truncation_before_any_insight_splits_the_batch():
+    def reply(request):
+        if len(source_ids(request)) > 2:
+            return "[", "max_tokens"
+        return level_2_reply(request)
+
+    client = FakeClient(reply)
+    insights = make_synthesizer(client, stream=False)._categorize_batch(make_sources(4))
+
+    assert len(insights) == 4
+    assert [len(source_ids(r)) for r in client.messages.requests] == [4, 2, 2]
+
+
+
+class BrokenStream:
+    """A stream that sends the start of a reply, then loses the connection."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        yield self.text[:20]
+        raise ConnectionError("connection reset")
+
+
+class BreakingMessages(FakeMessages):
+    """messages.stream breaking off mid-reply while breaks(request) is true."""
+
+    def __init__(self, breaks):
+        super().__init__(level_2_reply)
+        self.breaks = breaks
+
+    def stream(self, **request):
+        if self.breaks(request):
+            self.requests.append(request)
+            return BrokenStream(level_2_reply(request))
+        return super().stream(**request)
+
+
+def test_stream_broken_before_any_insight_is_retried_then_split():
+    calls = []
+
+    def breaks(request):
+        calls.append(len(source_ids(request)))
+        return len(calls) <= 2  # the first attempt and its retry
+
+    client = FakeClient()
+    client.messages = BreakingMessages(breaks)
+    sources = make_sources(4)
+    insights = make_synthesizer(client, stream=True)._categorize_batch(sources)
+
+    assert [i.source_id for i in insights] == [s.id for s in sources]
+    assert calls == [4, 4, 2, 2]
+
+
+def test_stream_broken_before_any_insight_recovers_on_retry():
+    calls = []
+
+    def breaks(request):
+        calls.append(len(source_ids(request)))
+        return len(calls) == 1
+
+    client = FakeClient()
+    client.messages = BreakingMessages(breaks)
+    insights = make_synthesizer(client, stream=True)._categorize_batch(make_sources(3))
+
+    assert len(insights) == 3
+    assert calls == [3, 3]
+
+
+def test_stream_always_broken_raises_once_down_to_one_source():
+    client = FakeClient()
+    client.messages = BreakingMessages(lambda request: True)
+
+    with pytest.raises(StreamInterruptedError):
+        make_synthesizer(client, stream=True)._categorize_batch(make_sources(2))
+    # 2 sources: attempt + retry, then the first half: attempt + retry
+    assert [len(source_ids(r)) for r in client.messages.requests] == [2, 2, 1, 1]
@@ -0,0 +1,67 @@
+"""Tests for transcript normalization (lib/normalize.py)."""
+
+from lib.models import Source
+from lib.normalize import TranscriptNormalizer, normalize_text
+
+QUOTE = 'Um, so the export, you know,  breaks at 10:45 every day [00:12] "honestly".'
+
+TRANSCRIPT = f"""WEBVTT
+
+00:00:01.000 --> 00:00:04.000 align:start
+[00:00:01] Sarah Chen: {QUOTE}
+[00:00:05] Sarah Chen: I'll check with, uh, the team.
+Mike Ross joined the meeting
+Mike Ross: Thanks.
+
+
+
+10:45 we reconvened
+Note: keep this
+Note: and this
+"""
+
+
+def test_quoted_sentence_survives_byte_for_byte():
+    out, _ = normalize_text(TRANSCRIPT)
+    assert QUOTE in out
+    assert "I'll check with, uh, the team." in out
+
+
+def test_every_normalized_line_is_part_of_the_original():
+    out, _ = normalize_text(TRANSCRIPT)
+    for line in out.splitlines():
+        assert line in TRANSCRIPT
+
+
+def test_line_level_noise_is_removed():
+    out, removed = normalize_text(TRANSCRIPT)
+    assert "-->" not in out
+    assert "[00:00:01]" not in out
+    assert "joined the meeting" not in out
+    assert "\n\n\n" not in out
+    # The second consecutive turn by the same speaker loses its label
+    assert out.count("Sarah Chen:") == 1
+    assert removed["boilerplate"] and removed["speaker"] and removed["timestamp"]
+
+
+def test_meaningful_times_and_note_labels_are_kept():
+    out, _ = normalize_text(TRANSCRIPT)
+    assert "10:45 we reconvened" in out
+    assert "Note: keep this\nNote: and this" in out
+
+
+def test_labels_are_kept_outside_dialogues():
+    text = "Customer: Acme\nCustomer: Globex\n"
+    assert normalize_text(text)[0] == text
+
+
+def test_normalizer_skips_csv_and_reports_per_category():
+    normalizer = TranscriptNormalizer()
+    csv = Source(id="support_tickets_001", filename="t.csv", category="support_tickets",
+                 content="[00:01] A: x\n[00:02] B: y", weight=1.5)
+    call = Source(id="customer_calls_001", filename="c.txt", category="customer_calls",
+                  content=TRANSCRIPT, weight=3.0)
+    assert normalizer.normalize_source(csv) is csv
+    normalized = normalizer.normalize_source(call)
+    assert normalized.metadata["normalized_chars_removed"] == len(TRANSCRIPT) - len(normalized.content)
+    assert normalizer.stats()["by_category"]["customer_calls"]["chars_removed"] > 0
@@ -0,0 +1,96 @@
+"""File parsing: worker start method, parity with inline parsing and character budgets."""
+
+import io
+
+import lib.parser
+from lib.parser import parse_files, _parse_csv, _parse_docx, _CSV_ENTRY_SEPARATOR
+
+from fakes import Upload
+
+
+def uploads(count: int = 4) -> dict[str, list]:
+    return {"customer_calls": [
+        Upload(f"call_{i}.txt", f"Call {i}: the export is slow.\n".encode() * 50) for i in range(count)
+    ]}
+
+
+def test_parallel_parse_spawns_workers_and_matches_inline(monkeypatch):
+    inline = parse_files(uploads(), max_workers=1)
+
+    contexts = []
+    pool = lib.parser.ProcessPoolExecutor
+
+    def recording_pool(*args, **kwargs):
+        contexts.append(kwargs.get("mp_context"))
+        return pool(*args, **kwargs)
+
+    monkeypatch.setattr(lib.parser, "PARSE_PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(lib.parser, "ProcessPoolExecutor", recording_pool)
+    parallel = parse_files(uploads(), max_workers=2)
+
+    assert [c.get_start_method() for c in contexts] == ["spawn"]
+    assert not parallel.errors
+    assert [(s.id, s.content) for s in parallel.sources] == [(s.id, s.content) for s in inline.sources]
+
+
+def docx_bytes(paragraphs: list[str]) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    for i, text in enumerate(paragraphs):
+        doc.add_paragraph(text)
+        if i == 1:
+            doc.add_table(rows=1, cols=1).cell(0, 0).text = "table cell, not a body paragraph"
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def test_docx_stops_at_budget_and_counts_the_rest():
+    paragraphs = [f"Paragraph {i} about exports." if i % 3 else "" for i in range(30)]
+    raw = docx_bytes(paragraphs)
+
+    text, metadata = _parse_docx(raw, max_chars=100)
+    kept = [p for p in paragraphs if p]
+    assert text.split("\n\n") == kept[:len(text.split("\n\n"))]
+    assert len(text) > 100 and len(text) - len(text.split("\n\n")[-1]) <= 100
+    assert metadata["paragraphs_total"] == 30
+    assert metadata["paragraphs_parsed"] + metadata["paragraphs_skipped"] == 30
+    assert metadata["paragraphs_skipped"] > 0
+
+    text, metadata = _parse_docx(raw, max_chars=None)
+    assert text == "\n\n".join(kept)
+    assert metadata == {"paragraphs_total": 30, "paragraphs_parsed": 30, "paragraphs_skipped": 0}
+
+
+CSV = (
+    "id,priority,score,description\n"
+    "1,2,10,Export is slow\n"
+    "2,1,11,Export times out\n"
+    "3,3,12,Login fails\n"
+    "4,,13,Search is slow\n"       # blank priority in the second chunk
+    "5,2,,Export is slow again\n"  # blank score
+    "6,NA,15,N/A\n"
+).encode()
+
+
+def test_csv_renders_cells_the_same_across_chunk_boundaries():
+    whole = _parse_csv(CSV, max_chars=None, chunk_rows=100)
+    assert _parse_csv(CSV, max_chars=None, chunk_rows=3) == whole
+    assert "id: 4\nSearch is slow" in whole
+    assert "id: 5\npriority: 2\nExport is slow again" in whole
+    # NA-like cells are missing, as with a plain read_csv; numbers render as written
+    assert whole.endswith(_CSV_ENTRY_SEPARATOR + "id: 6")
+    assert ".0" not in whole
+
+
+def test_csv_priority_selection_ranks_numbers_in_every_chunk():
+    text = _parse_csv(CSV, max_chars=None, selection="priority", chunk_rows=3)
+    ids = [entry.split("\n")[0] for entry in text.split(_CSV_ENTRY_SEPARATOR)]
+    assert ids == ["id: 2", "id: 1", "id: 5", "id: 3", "id: 4", "id: 6"]
+
+
+def test_csv_fallback_renders_cells_the_same_across_chunk_boundaries():
+    raw = CSV.replace(b"description", b"remark")
+    assert _parse_csv(raw, max_chars=None, chunk_rows=3) == _parse_csv(raw, max_chars=None, chunk_rows=100)
+    assert ".0" not in _parse_csv(raw, max_chars=None, chunk_rows=3)
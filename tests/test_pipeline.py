@@ -0,0 +1,50 @@
+"""ParsePipeline: a consumer that stops early must not strand the producer."""
+
+import pytest
+
+from lib.pipeline import ParsePipeline
+from lib.synthesizer import Synthesizer
+from lib.tokens import TokenEstimator
+
+from fakes import FakeClient, Upload
+
+
+def uploads(count: int) -> dict[str, list]:
+    return {"customer_calls": [
+        Upload(f"call_{i:03d}.txt", f"Call {i}: the export is slow.".encode()) for i in range(count)
+    ]}
+
+
+def test_full_iteration_yields_every_source_in_order():
+    pipeline = ParsePipeline(uploads(5), max_buffered=2)
+    ids = [source.id for source in pipeline]
+    pipeline.close()
+
+    assert ids == [f"customer_calls_{i:03d}" for i in range(5)]
+    assert not pipeline._thread.is_alive()
+
+
+def test_close_stops_a_producer_blocked_on_a_full_queue():
+    pipeline = ParsePipeline(uploads(50), max_buffered=2)
+    first = next(iter(pipeline))
+    assert first.id == "customer_calls_000"
+
+    pipeline.close()
+
+    assert not pipeline._thread.is_alive()
+    assert len(pipeline.timings) < 50
+
+
+def test_close_after_level_2_fails():
+    def reply(request):
+        raise ValueError("Level 2 failed")
+
+    pipeline = ParsePipeline(uploads(50), max_buffered=2).start()
+    synthesizer = Synthesizer("test-key", client=FakeClient(reply), token_estimator=TokenEstimator(path=None))
+    try:
+        with pytest.raises(ValueError, match="Level 2 failed"):
+            synthesizer.run(pipeline, [])
+    finally:
+        pipeline.close()
+
+    assert not pipeline._thread.is_alive()
@@ -0,0 +1,78 @@
+"""plan_run pricing and Level 3 sizing against what Synthesizer actually sends."""
+
+import pytest
+
+from config import PRICE_PER_MTOK
+from lib.cache import InsightCache
+from lib.planner import plan_run, _cost
+from lib.prompts import LEVEL_2_SYSTEM, LEVEL_3_SYSTEM
+from lib.synthesizer import Synthesizer
+from lib.tokens import TokenEstimator, level_3_encoding_key
+
+from fakes import FakeClient, make_sources, pyramid_reply, request_text
+
+COMPACT = {"level_3": "compact"}
+
+
+def test_requests_put_the_data_between_task_and_output_format():
+    client = FakeClient(pyramid_reply)
+    Synthesizer("test-key", client=client, token_estimator=TokenEstimator(path=None)).run(make_sources(6), [])
+
+    for request in client.messages.requests:
+        text = request_text(request)
+        assert "cache_control" not in str(request)
+        assert text.rstrip().endswith("</output_format>")
+    level_2 = next(r for r in client.messages.requests if r["system"][0]["text"] == LEVEL_2_SYSTEM)
+    assert request_text(level_2).index("<source") < request_text(level_2).index("<output_format>")
+
+
+def test_all_input_is_priced_at_the_input_rate():
+    level_2 = plan_run(make_sources(30), estimator=TokenEstimator(path=None)).stages["level_2"]
+    assert level_2.cost_usd == pytest.approx(
+        (level_2.input_tokens * PRICE_PER_MTOK["input"] + level_2.output_tokens * PRICE_PER_MTOK["output"]) / 1e6
+    )
+    assert _cost(1000, 0) == pytest.approx(1000 * PRICE_PER_MTOK["input"] / 1e6)
+
+
+def _level_3_request_tokens(client, estimator) -> int:
+    requests = [r for r in client.messages.requests if r["system"][0]["text"] == LEVEL_3_SYSTEM]
+    assert len(requests) == 1
+    return estimator.count(LEVEL_3_SYSTEM + request_text(requests[0]))
+
+
+def test_level_3_from_cached_insights_matches_synthesizer(tmp_path):
+    sources = make_sources(40)
+    cache = InsightCache(path=str(tmp_path / "insights.db"))
+    estimator = TokenEstimator(path=None)
+    client = FakeClient(pyramid_reply)
+    Synthesizer(
+        "test-key", client=client, insight_cache=cache, token_estimator=estimator,
+        prompt_encoding=COMPACT, precluster=True,
+    ).run(sources, [])
+    sent = _level_3_request_tokens(client, estimator)
+
+    plan = plan_run(sources, estimator=estimator, insight_cache=cache, prompt_encoding=COMPACT, precluster=True)
+    assert plan.stages["level_2"].calls == 0
+    assert plan.stages["level_3"].calls == 1
+    assert plan.stages["level_3"].input_tokens == pytest.approx(sent, rel=0.02)
+
+    # Without clustering and compact encoding the same insights take more room
+    plain = plan_run(sources, estimator=estimator, insight_cache=cache, prompt_encoding={"level_3": "xml"},
+                     precluster=False)
+    assert plain.stages["level_3"].input_tokens > plan.stages["level_3"].input_tokens
+
+
+def test_level_3_without_cache_uses_calibrated_encoding_scale():
+    sources = make_sources(40)
+    estimator = TokenEstimator(path=None)
+    before = plan_run(sources, estimator=estimator, prompt_encoding=COMPACT, precluster=True)
+
+    Synthesizer(
+        "test-key", client=FakeClient(pyramid_reply), token_estimator=estimator,
+        prompt_encoding=COMPACT, precluster=True,
+    ).run(sources, [])
+    scale = estimator.level_3_scale_for(level_3_encoding_key("compact", True))
+    after = plan_run(sources, estimator=estimator, prompt_encoding=COMPACT, precluster=True)
+
+    assert scale < 0.62
+    assert after.stages["level_3"].input_tokens < before.stages["level_3"].input_tokens
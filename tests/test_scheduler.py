@@ -0,0 +1,263 @@
+"""RequestScheduler: token buckets, and retries against a local fake server."""
+
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import anthropic
+import pytest
+
+from lib.scheduler import RequestScheduler, TokenBucket
+from lib.synthesizer import Synthesizer
+from lib.tokens import TokenEstimator
+
+MESSAGE = {
+    "id": "msg_test", "type": "message", "role": "assistant", "model": "test",
+    "content": [{"type": "text", "text": "[]"}],
+    "stop_reason": "end_turn", "stop_sequence": None,
+    "usage": {"input_tokens": 10, "output_tokens": 5},
+}
+
+
+class FakeClock:
+    """clock/sleep pair: sleeping advances the clock and is recorded."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeServer:
+    """Local HTTP server answering POST /v1/messages from a script.
+
+    Each script entry is (status, headers); the last one repeats. A 200
+    returns MESSAGE, anything else an API error body.
+    """
+
+    def __init__(self, script: list[tuple[int, dict]]):
+        self.script = list(script)
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                status, headers = server.script[min(server.requests, len(server.script) - 1)]
+                server.requests += 1
+                body = MESSAGE if status == 200 else {
+                    "type": "error", "error": {"type": "rate_limit_error", "message": "slow down"},
+                }
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+
+    def client(self) -> anthropic.Anthropic:
+        return anthropic.Anthropic(api_key="test-key", base_url=self.url, max_retries=0)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*script):
+        server = FakeServer(script)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def scheduler(clock: FakeClock, **kwargs) -> RequestScheduler:
+    kwargs.setdefault("base_delay", 1.0)
+    kwargs.setdefault("max_delay", 60.0)
+    return RequestScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def create(client):
+    return lambda: client.messages.create(
+        model="test", max_tokens=10, messages=[{"role": "user", "content": "hi"}],
+    )
+
+
+# ----- Token buckets -----
+
+def test_bucket_serves_within_capacity_without_waiting():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock, clock.sleep)
+    for _ in range(60):
+        bucket.acquire(1)
+    assert clock.sleeps == []
+
+
+def test_bucket_waits_for_refill_when_empty():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock, clock.sleep)   # one token per second
+    bucket.acquire(60)
+    bucket.acquire(3)
+    assert sum(clock.sleeps) == pytest.approx(3.0)
+
+
+def test_oversized_request_waits_for_a_full_bucket_not_forever():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock, clock.sleep)
+    bucket.acquire(30)
+    bucket.acquire(500)
+    assert sum(clock.sleeps) == pytest.approx(30.0)
+
+
+def test_debit_overdraft_delays_the_next_acquire():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock, clock.sleep)
+    bucket.acquire(60)
+    bucket.debit(30)
+    bucket.acquire(1)
+    assert sum(clock.sleeps) == pytest.approx(31.0)
+
+
+def test_scheduler_enforces_requests_per_minute():
+    clock = FakeClock()
+    calls = scheduler(clock, rpm=2)
+    for _ in range(4):
+        calls.call(lambda: None, 0)
+    # Two requests are free, each further one waits 30s for its token
+    assert sum(clock.sleeps) == pytest.approx(60.0)
+
+
+def output_of(tokens: int):
+    return lambda: SimpleNamespace(usage=SimpleNamespace(output_tokens=tokens))
+
+
+def test_output_overdraft_makes_the_next_call_wait():
+    clock = FakeClock()
+    calls = scheduler(clock, output_tpm=100)
+    calls.call(output_of(150), 10)
+    assert clock.sleeps == []
+    calls.call(output_of(0), 10)
+    # 50 tokens overdrawn at 100 per minute
+    assert sum(clock.sleeps) == pytest.approx(30.0)
+
+
+def test_estimated_output_is_reserved_before_each_attempt():
+    clock = FakeClock()
+    calls = scheduler(clock, output_tpm=100)
+    calls.call(output_of(60), 10, estimated_output_tokens=60)
+    calls.call(output_of(60), 10, estimated_output_tokens=60)
+    assert sum(clock.sleeps) == pytest.approx(12.0)
+
+
+def test_unused_output_reservation_is_returned():
+    clock = FakeClock()
+    calls = scheduler(clock, output_tpm=100)
+    calls.call(output_of(10), 10, estimated_output_tokens=90)
+    calls.call(output_of(10), 10, estimated_output_tokens=90)
+    assert clock.sleeps == []
+
+
+# ----- Retries against a local server -----
+
+def test_429_honors_retry_after(serve):
+    server = serve((429, {"retry-after": "7"}), (429, {"retry-after": "7"}), (200, {}))
+    clock = FakeClock()
+    calls = scheduler(clock, base_delay=0.5)
+
+    response = calls.call(create(server.client()), 10)
+
+    assert response.content[0].text == "[]"
+    assert server.requests == 3
+    assert calls.retries == 2
+    retry_sleeps = [s for s in clock.sleeps if s >= 7]
+    assert len(retry_sleeps) == 2
+    assert all(7 <= s <= 7.5 for s in retry_sleeps)
+
+
+def test_retry_after_ms_is_capped_at_max_delay(serve):
+    server = serve((429, {"retry-after-ms": "250"}), (529, {"retry-after": "600"}), (200, {}))
+    clock = FakeClock()
+    calls = scheduler(clock, base_delay=0.1, max_delay=20)
+
+    calls.call(create(server.client()), 10)
+
+    assert 0.25 <= clock.sleeps[0] <= 0.35
+    assert 20 <= clock.sleeps[1] <= 20.1
+
+
+def test_server_errors_back_off_exponentially_with_jitter(serve):
+    server = serve((500, {}), (503, {}), (529, {}), (200, {}))
+    clock = FakeClock()
+    calls = scheduler(clock, base_delay=1.0)
+
+    calls.call(create(server.client()), 10)
+
+    assert server.requests == 4
+    for attempt, delay in enumerate(clock.sleeps):
+        assert 0 <= delay <= 2 ** attempt
+
+
+def test_client_errors_are_not_retried(serve):
+    server = serve((400, {}))
+    clock = FakeClock()
+
+    with pytest.raises(anthropic.BadRequestError):
+        scheduler(clock).call(create(server.client()), 10)
+    assert server.requests == 1
+
+
+def test_gives_up_after_max_attempts(serve):
+    server = serve((429, {"retry-after": "1"}))
+    clock = FakeClock()
+
+    with pytest.raises(anthropic.RateLimitError):
+        scheduler(clock, max_attempts=3).call(create(server.client()), 10)
+    assert server.requests == 3
+
+
+def test_connection_errors_are_retried():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    client = anthropic.Anthropic(api_key="test-key", base_url=f"http://127.0.0.1:{port}", max_retries=0)
+    clock = FakeClock()
+    calls = scheduler(clock, max_attempts=3)
+
+    with pytest.raises(anthropic.APIConnectionError):
+        calls.call(create(client), 10)
+    assert calls.retries == 2
+
+
+def test_synthesizer_call_is_retried_as_one_request(serve):
+    server = serve((429, {"retry-after": "1"}), (200, {}))
+    clock = FakeClock()
+    synthesizer = Synthesizer(
+        "test-key", client=server.client(), scheduler=scheduler(clock),
+        token_estimator=TokenEstimator(path=None),
+    )
+
+    assert synthesizer._call_claude("system", "instructions", "context") == "[]"
+    assert server.requests == 2